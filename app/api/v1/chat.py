@@ -1,8 +1,11 @@
 """聊天API"""
-from fastapi import APIRouter, Depends
+import json
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.chat import ChatRequest, ChatResponse, ApiResponse
 from app.services.chat import chat_service
+from app.services.concurrency import ServerBusyError
 from app.core.database import get_db
 
 router = APIRouter(prefix="/chat", tags=["聊天"])
@@ -27,6 +30,12 @@ async def chat(
             message="success",
             data=result.dict()
         )
+    except ServerBusyError:
+        return ApiResponse(
+            code=503,
+            message="服务繁忙，请稍后重试",
+            data=None
+        )
     except Exception as e:
         return ApiResponse(
             code=500,
@@ -34,3 +43,40 @@ async def chat(
             data=None
         )
 
+
+
+def _format_sse(event: str, data: dict) -> str:
+    """格式化为Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    http_request: Request
+):
+    """流式问答接口（Server-Sent Events）
+    
+    事件：
+    - meta: 来源、置信度、相关问题等元数据（首个事件）
+    - token: 生成的文本片段
+    - done: 生成结束（含对话ID、意图、耗时）
+    - error: 处理失败
+    """
+    async def event_stream():
+        async for event, data in chat_service.chat_stream(
+            message=request.message,
+            session_id=request.session_id,
+            user_id=request.user_id,
+            is_disconnected=http_request.is_disconnected
+        ):
+            yield _format_sse(event, data)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # 禁用Nginx缓冲，保证逐token推送
+        }
+    )
@@ -1,17 +1,25 @@
 """知识库管理API"""
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete as sql_delete
-from typing import List
+from typing import List, Optional
 from app.schemas.knowledge import KnowledgeCreate, KnowledgeUpdate, KnowledgeResponse
 from app.schemas.chat import ApiResponse
 from app.models import Knowledge
 from app.services.embedding import embedding_service
 from app.services.milvus import milvus_service
+from app.services.ingestion import ingestion_service, SUPPORTED_EXTENSIONS
+from app.core.config import get_settings
 from app.core.database import get_db
 from loguru import logger
 
 router = APIRouter(prefix="/knowledge", tags=["知识库"])
+settings = get_settings()
+
+# 上传文件落盘时每次读取的字节数
+UPLOAD_READ_SIZE = 1024 * 1024
 
 
 @router.post("", response_model=ApiResponse)
@@ -59,6 +67,78 @@ async def create_knowledge(
         )
 
 
+@router.post("/upload", response_model=ApiResponse)
+async def upload_document(
+    file: UploadFile = File(..., description="文档文件（txt/md/pdf）"),
+    category: Optional[str] = Form(None, description="分类"),
+    source: Optional[str] = Form(None, description="来源（默认使用文件名）")
+):
+    """上传文档并导入知识库
+    
+    文档会被分块、批量向量化后写入知识库，导入在后台执行，
+    通过返回的job_id查询进度。
+    """
+    filename = file.filename or "document.txt"
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        return ApiResponse(
+            code=400,
+            message=f"不支持的文件类型: {ext}，支持: {', '.join(sorted(SUPPORTED_EXTENSIONS))}",
+            data=None
+        )
+    
+    # 分块写入临时文件，不在内存中保留整个文档
+    fd, tmp_path = tempfile.mkstemp(prefix="ingest_", suffix=ext)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while True:
+                block = await file.read(UPLOAD_READ_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > settings.INGEST_MAX_FILE_SIZE:
+                    raise ValueError(f"文件超过大小限制（{settings.INGEST_MAX_FILE_SIZE // 1024 // 1024}MB）")
+                tmp.write(block)
+    except Exception as e:
+        os.remove(tmp_path)
+        logger.error(f"接收上传文件失败: {e}")
+        return ApiResponse(
+            code=400,
+            message=f"上传失败: {str(e)}",
+            data=None
+        )
+    finally:
+        await file.close()
+    
+    job = ingestion_service.start_job(tmp_path, filename, category=category, source=source)
+    logger.info(f"文档导入任务已创建: job_id={job['job_id']}, 文件={filename}, 大小={size}字节")
+    
+    return ApiResponse(
+        code=200,
+        message="导入任务已创建",
+        data=job
+    )
+
+
+@router.get("/upload/{job_id}", response_model=ApiResponse)
+async def get_upload_job(job_id: str):
+    """查询文档导入任务进度"""
+    job = ingestion_service.get_job(job_id)
+    if not job:
+        return ApiResponse(
+            code=404,
+            message="导入任务不存在",
+            data=None
+        )
+    
+    return ApiResponse(
+        code=200,
+        message="success",
+        data=job
+    )
+
+
 @router.get("/{knowledge_id}", response_model=ApiResponse)
 async def get_knowledge(
     knowledge_id: int,
@@ -0,0 +1,21 @@
+"""运行指标API"""
+from fastapi import APIRouter
+from app.schemas.chat import ApiResponse
+from app.core.metrics import metrics
+
+router = APIRouter(prefix="/metrics", tags=["监控"])
+
+
+@router.get("", response_model=ApiResponse)
+async def get_metrics():
+    """获取运行指标
+    
+    - **counters**: 累计计数（如拒绝数、超时数）
+    - **histograms**: 数值分布（如排队等待耗时，单位毫秒）
+    - **sources**: 实时状态（如在途请求数、队列深度）
+    """
+    return ApiResponse(
+        code=200,
+        message="success",
+        data=metrics.snapshot()
+    )
@@ -0,0 +1,53 @@
+"""同步代码调用协程的桥接 - 供LangChain同步工具等无法await的调用方使用"""
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+
+# 应用主事件循环（由应用启动时注册）
+_app_loop: Optional[asyncio.AbstractEventLoop] = None
+# 未注册主事件循环时（脚本等场景）使用的常驻后台事件循环
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def register_app_loop(loop: asyncio.AbstractEventLoop):
+    """注册应用主事件循环
+
+    数据库连接池、Ollama调度器等异步资源绑定在主事件循环上，
+    同步调用方提交的协程需在主事件循环中执行才能复用这些资源。
+    """
+    global _app_loop
+    _app_loop = loop
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_background_loop.run_forever,
+                name="async_bridge",
+                daemon=True
+            ).start()
+        return _background_loop
+
+
+def run_sync(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """在同步代码中执行协程并等待结果
+
+    协程提交到主事件循环（已注册且在运行时）或常驻后台事件循环执行，
+    不会为每次调用新建事件循环。
+
+    Raises:
+        RuntimeError: 在目标事件循环所在线程中调用（同步等待会造成死锁，应改用异步接口）
+    """
+    loop = _app_loop if _app_loop is not None and _app_loop.is_running() else _get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("不能在事件循环线程中同步等待协程，请使用异步接口")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
@@ -29,6 +29,7 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: str = "redis_password_2024"
     REDIS_DB: int = 0
+    REDIS_SOCKET_TIMEOUT: float = 1.0  # Redis连接/读写超时（秒），缓存不可用时快速失败
     
     @property
     def REDIS_URL(self) -> str:
@@ -41,9 +42,46 @@ class Settings(BaseSettings):
     
     # Ollama配置
     OLLAMA_BASE_URL: str = "http://localhost:11434"
-    OLLAMA_MODEL: str = "qwen3:8b"  # 对话模型
+    OLLAMA_BASE_URLS: list = []  # 多个Ollama节点（JSON列表），为空时只使用OLLAMA_BASE_URL
+    OLLAMA_MODEL: str = "qwen3:8b"  # 对话模型（大模型）
+    OLLAMA_SMALL_MODEL: str = ""  # 小模型（闲聊、意图识别、知识库改写，如 qwen3:1.7b，需先 ollama pull），留空则全部使用大模型
     OLLAMA_EMBEDDING_MODEL: str = "nomic-embed-text"  # Embedding模型
     OLLAMA_TIMEOUT: int = 60
+    OLLAMA_NUM_CTX: int = 8192  # 上下文窗口（需容纳系统提示词+会话历史+本轮上下文）
+    
+    # Ollama节点健康检查
+    OLLAMA_HEALTH_CHECK_INTERVAL: float = 10.0  # 健康检查间隔（秒）
+    OLLAMA_HEALTH_CHECK_SLOW: float = 3.0  # 健康检查超过该耗时（秒）视为节点异常
+    OLLAMA_EJECT_FAILURES: int = 3  # 请求连续失败该次数后摘除节点
+    OLLAMA_EJECT_SECONDS: float = 30.0  # 摘除后至少经过该时间，健康检查通过才重新加入
+    
+    # Ollama请求调度（优先级 + 背压）
+    OLLAMA_MAX_INFLIGHT: int = 4  # 同时发往Ollama的请求数（生成+向量化，多节点时为所有节点合计，建议为各节点OLLAMA_NUM_PARALLEL之和）
+    # 优先级类别：weight=加权公平排队权重，max_inflight=本类别并发上限，
+    # max_queue=最大排队数（超出立即返回"服务繁忙"），queue_timeout=排队超时（秒，None为不超时）
+    OLLAMA_PRIORITY_CLASSES: dict = {
+        "interactive": {"weight": 8, "max_inflight": 4, "max_queue": 16, "queue_timeout": 30.0},  # 在线问答
+        "agent": {"weight": 4, "max_inflight": 2, "max_queue": 16, "queue_timeout": 30.0},  # Agent推理步骤
+        "intent": {"weight": 2, "max_inflight": 1, "max_queue": 32, "queue_timeout": 30.0},  # 意图识别
+        "background": {"weight": 1, "max_inflight": 1, "max_queue": 1000, "queue_timeout": None},  # 文档导入/批量向量化
+    }
+    
+    # 模型路由（大/小模型分流，两个模型需同时常驻，注意显存）
+    MODEL_ROUTING_ENABLED: bool = False  # 是否启用模型路由（需同时配置 OLLAMA_SMALL_MODEL）
+    MODEL_ROUTING_SIMPLE_MAX_CHARS: int = 20  # 无上下文且不超过该长度的问题视为简单问题
+    MODEL_ROUTING_COMPLEX_MIN_CHARS: int = 80  # 超过该长度的问题视为复杂问题
+    MODEL_ROUTING_LARGE_QUEUE_THRESHOLD: int = 4  # 大模型在途+排队请求数达到该值时，非复杂问题分流到小模型
+    
+    # LLM生成温度
+    LLM_TEMPERATURE_KNOWLEDGE_BASE: float = 0.3  # 知识库模式（严格基于知识库，低随机性）
+    LLM_TEMPERATURE_GENERAL: float = 0.7  # 通用AI模式
+    
+    # LLM响应缓存（Redis）
+    RESPONSE_CACHE_ENABLED: bool = True  # 是否启用响应缓存
+    RESPONSE_CACHE_TTL: int = 24 * 3600  # 缓存有效期（秒）
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000  # 最大缓存条数，超出时淘汰最早写入的条目
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = 32 * 1024  # 单条缓存大小上限（字节）
+    RESPONSE_CACHE_MAX_TEMPERATURE: float = 0.3  # 温度高于该值的请求不缓存
     
     # Embedding配置
     EMBEDDING_DIMENSION: int = 768  # nomic-embed-text的embedding维度
@@ -58,17 +96,61 @@ class Settings(BaseSettings):
     CONFIDENCE_THRESHOLD_WEB_SEARCH: float = 0.2  # 启用网络搜索的置信度阈值
     MAX_CONTEXT_TURNS: int = 5  # 最大上下文轮数
     SESSION_TIMEOUT: int = 1800  # 会话超时时间(秒)
+    SESSION_HISTORY_TOKEN_BUDGET: int = 3000  # 会话历史token预算
     SIMILAR_QUESTIONS_COUNT: int = 3  # 推荐相似问题数量
+    PREGENERATED_ANSWER_MIN_SCORE: float = 0.85  # 最佳匹配置信度达到该值时直接返回预生成答案（不调用LLM）
+    
+    # 上下文打包配置（token预算）
+    CONTEXT_TOKEN_BUDGET_KNOWLEDGE_BASE: int = 800  # 知识库模式上下文token预算
+    CONTEXT_TOKEN_BUDGET_GENERAL_AI: int = 400  # 通用AI模式上下文token预算（低相关度，少放）
+    CONTEXT_TOKEN_BUDGET_WEB_SEARCH: int = 600  # 网络搜索模式上下文token预算
+    CONTEXT_DEDUP_THRESHOLD: float = 0.8  # 片段重叠度超过该值视为重复
+    
+    # 意图识别配置
+    INTENT_MODEL_PATH: str = "data/intent_classifier.json"  # 本地意图分类模型文件（由scripts/train_intent_classifier.py生成）
+    INTENT_CONFIDENCE_THRESHOLD: float = 0.8  # 本地分类置信度低于该值时回退到LLM识别
+    INTENT_DETECTION_MODE: str = "sync"  # sync=响应前识别意图；deferred=对话先以intent=NULL保存，由后台任务批量标注
+    INTENT_LABEL_INTERVAL: float = 30.0  # 后台标注轮询间隔（秒）
+    INTENT_LABEL_BATCH_SIZE: int = 200  # 每轮最多标注的对话数
+    INTENT_LABEL_PROMPT_SIZE: int = 20  # LLM标注时每次请求包含的问题数
+    
+    # 文档导入配置
+    INGEST_CHUNK_SIZE: int = 500  # 分块长度（字符）
+    INGEST_CHUNK_OVERLAP: int = 80  # 相邻分块重叠长度（字符）
+    INGEST_BATCH_SIZE: int = 16  # 每批向量化/写入的分块数
+    INGEST_MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 上传文件大小上限（字节）
     
     # LangChain Agent 配置
     ENABLE_AGENT: bool = True  # 是否启用Agent模式
     AGENT_MAX_ITERATIONS: int = 5  # Agent最大迭代次数
     AGENT_MAX_EXECUTION_TIME: int = 60  # Agent最大执行时间（秒）
-    AGENT_VERBOSE: bool = True  # 是否显示Agent思考过程
+    AGENT_VERBOSE: bool = False  # 是否将Agent思考过程写入日志
+    AGENT_WARMUP: bool = True  # 启动时是否在后台预先构建Agent（否则在首次请求时构建）
+    AGENT_SEMANTIC_THRESHOLD: float = 0.7  # 问题与Agent示例问题的语义匹配度达到该值才参与路由
+    AGENT_ROUTE_CACHE_SIZE: int = 2048  # 路由结果缓存条数（按规范化后的问题缓存）
+    AGENT_FAST_PATH_ENABLED: bool = True  # 计算、日期时间类问题是否直接回答（跳过Agent）
+    AGENT_TRACE_RECENT: int = 20  # 指标接口中保留的最近Agent执行记录数（每步LLM/工具耗时）
+    AGENT_TRACE_STORE: bool = False  # 是否把Agent执行记录随对话历史一起保存
+    
+    # 离线维基百科配置
+    WIKI_INDEX_PATH: str = "data/wiki_zh.db"  # 离线维基百科索引路径（scripts/build_wiki_index.py 生成），文件不存在时查询在线维基百科
+    WIKI_TOP_K: int = 2  # 每次查询返回的词条数
+    WIKI_MAX_CHARS: int = 500  # 工具返回内容的最大长度
+    WIKI_VECTOR_SEARCH: bool = False  # 是否对全文检索结果按向量相似度重排（需建索引时使用 --vectors）
     
     # 和风天气 API 配置
     QWEATHER_API_KEY: str = ""  # 和风天气 API Key（免费版，需注册获取）
     QWEATHER_API_HOST: str = ""  # 和风天气 API Host（在控制台中查看）
+    WEATHER_HTTP_TIMEOUT: float = 10.0  # 天气API请求超时（秒）
+    WEATHER_LOCATION_LIST: str = ""  # 和风天气城市列表CSV路径（官方China-City-List格式），为空使用内置常用城市列表
+    WEATHER_NOW_CACHE_TTL: int = 600  # 实时天气缓存时间（秒），与和风天气实时数据的更新间隔一致
+    WEATHER_FORECAST_CACHE_TTL: int = 3600  # 天气预报缓存时间（秒）
+    WEATHER_MAX_CITIES: int = 5  # 一次问题最多查询的城市数
+    WEATHER_MULTI_CITY_TIMEOUT: float = 5.0  # 多城市查询的等待时间（秒），超时的城市先返回其余城市的结果
+    WEATHER_PREFETCH_ENABLED: bool = False  # 是否后台预取热门城市天气（需配置 QWEATHER_API_KEY）
+    WEATHER_PREFETCH_INTERVAL: int = 60  # 预取检查间隔（秒），缓存剩余时间不足一个间隔的城市会被刷新（每项约每 TTL-间隔/2 秒刷新一次）
+    WEATHER_PREFETCH_TOP_N: int = 3  # 预取的热门城市数（免费额度每天1000次：每个城市每天约 152次实时(86400/570) + 25次预报(86400/3570)，3个城市约530次）
+    WEATHER_PREFETCH_LOOKBACK_DAYS: int = 7  # 统计热门城市的对话时间范围（天）
     
     # CORS配置
     CORS_ORIGINS: list = ["*"]
@@ -0,0 +1,86 @@
+"""运行时指标收集"""
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict
+
+
+class _Histogram:
+    """简单直方图：累计计数/总和/最大值 + 最近样本的分位数"""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def snapshot(self) -> Dict:
+        ordered = sorted(self.recent)
+
+        def percentile(p: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50": round(percentile(0.5), 2),
+            "p95": round(percentile(0.95), 2),
+            "max": round(self.max, 2),
+        }
+
+
+class MetricsRegistry:
+    """指标注册表
+
+    - counter: 累计计数
+    - histogram: 耗时等数值分布
+    - source: 实时状态（如队列深度），在快照时调用回调获取
+    """
+
+    # 分位数计算使用的最近样本数
+    HISTOGRAM_WINDOW = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._histograms: Dict[str, _Histogram] = {}
+        self._sources: Dict[str, Callable[[], Dict]] = {}
+
+    def incr(self, name: str, value: int = 1):
+        """累加计数器"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """记录一个数值样本"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram(self.HISTOGRAM_WINDOW)
+            histogram.observe(value)
+
+    def register_source(self, name: str, source: Callable[[], Dict]):
+        """注册实时状态回调"""
+        self._sources[name] = source
+
+    def snapshot(self) -> Dict:
+        """获取所有指标的快照"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {name: h.snapshot() for name, h in self._histograms.items()}
+        return {
+            "counters": counters,
+            "histograms": histograms,
+            "sources": {name: source() for name, source in self._sources.items()},
+        }
+
+
+# 全局实例
+metrics = MetricsRegistry()
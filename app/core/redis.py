@@ -0,0 +1,18 @@
+"""Redis连接管理"""
+from redis import asyncio as aioredis
+from .config import get_settings
+
+settings = get_settings()
+
+# 创建异步客户端（内部为连接池，首次使用时才建立连接）
+redis_client = aioredis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+)
+
+
+def get_redis() -> aioredis.Redis:
+    """获取Redis客户端"""
+    return redis_client
@@ -1,10 +1,17 @@
 """FastAPI主应用"""
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 from contextlib import asynccontextmanager
 from app.core.config import get_settings
 from app.core.logger import setup_logger
+from app.core.async_bridge import register_app_loop
 from app.api.v1 import api_router
+from app.services.ollama_pool import ollama_pool
+from app.services.intent_labeler import intent_labeler
+from app.services.tools.weather_tool import get_weather_tool
+from app.services.weather_prefetcher import weather_prefetcher
+from app.services.agents.registry import components
 
 settings = get_settings()
 logger = setup_logger()
@@ -20,9 +27,29 @@ async def lifespan(app: FastAPI):
     logger.info(f"API文档: http://{settings.API_HOST}:{settings.API_PORT}/docs")
     logger.info("=" * 50)
     
+    # 同步工具提交的协程在主事件循环中执行，复用数据库连接池等异步资源
+    register_app_loop(asyncio.get_running_loop())
+    
+    # 启动Ollama节点健康检查
+    ollama_pool.start()
+    # 延迟意图识别模式下启动后台标注任务
+    if settings.INTENT_DETECTION_MODE == "deferred":
+        intent_labeler.start()
+    # 后台预热 Agent（构建 LLM、工具和 Agent，计算语义路由向量）
+    if settings.ENABLE_AGENT and settings.AGENT_WARMUP:
+        components.start_warmup(["agent_manager"])
+    # 预取热门城市天气
+    if settings.WEATHER_PREFETCH_ENABLED and settings.QWEATHER_API_KEY:
+        weather_prefetcher.start()
+    
     yield
     
     # 关闭时执行
+    await components.stop()
+    await intent_labeler.stop()
+    await weather_prefetcher.stop()
+    await ollama_pool.stop()
+    await get_weather_tool().close()
     logger.info(f"{settings.APP_NAME} 已关闭")
 
 
@@ -1,5 +1,6 @@
 """对话历史模型"""
 from sqlalchemy import Column, Integer, String, Text, Float, TIMESTAMP, ForeignKey
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -18,6 +19,7 @@ class Conversation(Base):
     knowledge_id = Column(Integer, ForeignKey("knowledge_base.id"), comment="关联的知识库ID")
     feedback = Column(Integer, default=0, comment="用户反馈：-1-不满意 0-未评价 1-满意")
     response_time = Column(Integer, comment="响应时间(毫秒)")
+    agent_trace = Column(JSONB, comment="Agent执行记录（每步LLM/工具调用耗时，AGENT_TRACE_STORE=True时保存）")
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), comment="创建时间")
     
     def __repr__(self):
@@ -1,4 +1,5 @@
 """知识库模型"""
+import hashlib
 from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, ARRAY, BigInteger
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -18,6 +19,20 @@ class Knowledge(Base):
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
     status = Column(Integer, default=1, comment="状态：0-草稿 1-已发布")
     source = Column(String(200), comment="来源")
+    polished_answer = Column(Text, comment="预生成的润色答案")
+    polished_hash = Column(String(64), comment="生成润色答案时问题+答案的哈希（与当前内容不一致说明已过期）")
+    polished_version = Column(Integer, default=0, comment="润色答案版本号（每次重新生成加1）")
+    polished_at = Column(TIMESTAMP(timezone=True), comment="润色答案生成时间")
+    
+    def content_hash(self) -> str:
+        """问题+答案的内容哈希"""
+        return hashlib.sha256(f"{self.question}\n{self.answer}".encode("utf-8")).hexdigest()
+    
+    def current_polished_answer(self):
+        """与当前问题/答案一致的润色答案，未生成或已过期时返回None"""
+        if self.polished_answer and self.polished_hash == self.content_hash():
+            return self.polished_answer
+        return None
     
     def __repr__(self):
         return f"<Knowledge(id={self.id}, question='{self.question[:30]}...')>"
@@ -26,6 +26,7 @@ class ChatResponse(BaseModel):
     related_questions: List[str] = Field(default_factory=list, description="相关问题")
     intent: Optional[str] = Field(None, description="识别的意图")
     answer_source: str = Field(default="knowledge_base", description="答案来源：knowledge_base(知识库) 或 general_ai(通用AI)")
+    prompt_tokens: Optional[int] = Field(None, description="本次请求的提示词token数")
 
 
 class ApiResponse(BaseModel):
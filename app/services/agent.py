@@ -4,14 +4,13 @@ LangChain Agent 服务
 from typing import List, Dict, Optional
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.prompts import PromptTemplate
-from langchain_community.llms import Ollama
 from langchain.tools import Tool
-from langchain_community.tools import DuckDuckGoSearchRun, WikipediaQueryRun
-from langchain_community.utilities import WikipediaAPIWrapper
 from loguru import logger
 
 from app.core.config import get_settings
-from app.services.tools import get_all_tools
+from app.services.concurrency import ServerBusyError
+from app.services.agents.registry import components
+from app.services.agents.tracing import TracingCallbackHandler
 
 settings = get_settings()
 
@@ -21,13 +20,8 @@ class AgentService:
     
     def __init__(self):
         """初始化 Agent"""
-        # 初始化 LLM（使用标准 Ollama LLM）
-        self.llm = Ollama(
-            base_url=settings.OLLAMA_BASE_URL,
-            model=settings.OLLAMA_MODEL,
-            temperature=0.7,
-            num_predict=2048,  # 最大输出token数
-        )
+        # 初始化 LLM（与通用 Agent 共享的、经调度器排队的 Ollama LLM）
+        self.llm = components.get("llm")
         
         # 初始化工具
         self.tools = self._init_tools()
@@ -39,9 +33,9 @@ class AgentService:
         self.agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,  # 显示思考过程
-            max_iterations=5,  # 最大迭代次数
-            max_execution_time=60,  # 最大执行时间（秒）
+            verbose=False,  # 思考过程由回调写入日志（AGENT_VERBOSE）
+            max_iterations=settings.AGENT_MAX_ITERATIONS,  # 最大迭代次数
+            max_execution_time=settings.AGENT_MAX_EXECUTION_TIME,  # 最大执行时间（秒）
             handle_parsing_errors=True,  # 处理解析错误
             early_stopping_method="generate",  # 达到限制时强制生成回答
             return_intermediate_steps=True,  # 返回中间步骤
@@ -50,79 +44,24 @@ class AgentService:
         logger.info(f"✅ Agent 初始化完成，加载了 {len(self.tools)} 个工具")
     
     def _init_tools(self) -> List[Tool]:
-        """初始化所有工具"""
+        """初始化所有工具（工具实例与其他 Agent 共享）"""
         tools = []
         
         # 1. 自定义工具（知识库、日期时间、计算器）
-        custom_tools = get_all_tools()
+        custom_tools = components.get("custom_tools")
         tools.extend(custom_tools)
         logger.info(f"  - 加载自定义工具: {len(custom_tools)} 个")
         
         # 2. 网络搜索工具（DuckDuckGo - 免费，带错误处理）
         try:
-            from langchain.tools import Tool
-            
-            def safe_duckduckgo_search(query: str) -> str:
-                """安全的 DuckDuckGo 搜索，带错误处理"""
-                try:
-                    from duckduckgo_search import DDGS
-                    import time
-                    
-                    # 添加延迟避免频率限制
-                    time.sleep(1)
-                    
-                    with DDGS() as ddgs:
-                        results = list(ddgs.text(query, max_results=3))
-                        
-                    if results:
-                        formatted = []
-                        for r in results:
-                            formatted.append(f"标题: {r.get('title', 'N/A')}\n内容: {r.get('body', 'N/A')}\n链接: {r.get('href', 'N/A')}")
-                        return "\n\n".join(formatted)
-                    else:
-                        return "未找到搜索结果。"
-                        
-                except Exception as e:
-                    error_msg = str(e)
-                    if "Ratelimit" in error_msg or "202" in error_msg:
-                        return "搜索服务暂时繁忙（频率限制），请稍后再试。建议：1) 稍等片刻后重试 2) 使用更具体的关键词 3) 尝试其他信息源。"
-                    else:
-                        return f"网络搜索暂时不可用：{error_msg}。建议使用其他方式获取信息。"
-            
-            search_tool = Tool(
-                name="网络搜索",
-                func=safe_duckduckgo_search,
-                description="""
-                在互联网上搜索最新信息。
-                适用于：实时新闻、天气、股票价格、最新事件等需要网络查询的问题。
-                输入：搜索关键词
-                输出：搜索结果摘要
-                注意：如果遇到频率限制，建议使用其他工具或告知用户稍后重试。
-                """
-            )
-            tools.append(search_tool)
+            tools.append(components.get("search_tool"))
             logger.info("  - 加载 DuckDuckGo 搜索工具（带容错）")
         except Exception as e:
             logger.warning(f"  - DuckDuckGo 工具加载失败: {e}")
         
-        # 3. 维基百科工具（免费）
+        # 3. 维基百科工具（与通用 Agent 共享）
         try:
-            wikipedia_wrapper = WikipediaAPIWrapper(
-                lang="zh",
-                top_k_results=2,
-                doc_content_chars_max=2000
-            )
-            wiki_tool = WikipediaQueryRun(
-                api_wrapper=wikipedia_wrapper,
-                name="维基百科",
-                description="""
-                查询维基百科获取百科知识。
-                适用于：历史事件、人物传记、科学概念、地理信息等百科类问题。
-                输入：要查询的主题
-                输出：维基百科条目内容
-                """
-            )
-            tools.append(wiki_tool)
+            tools.append(components.get("wikipedia_tool"))
             logger.info("  - 加载维基百科工具")
         except Exception as e:
             logger.warning(f"  - 维基百科工具加载失败: {e}")
@@ -184,7 +123,8 @@ Thought: {agent_scratchpad}"""
     async def chat(
         self, 
         message: str, 
-        chat_history: Optional[List[Dict]] = None
+        chat_history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None
     ) -> Dict:
         """
         Agent 聊天
@@ -192,21 +132,25 @@ Thought: {agent_scratchpad}"""
         Args:
             message: 用户消息
             chat_history: 对话历史（暂不使用）
+            session_id: 会话ID（用作执行记录的 trace_id）
             
         Returns:
             {
                 "answer": "回答内容",
                 "tool_used": "使用的工具",
-                "confidence": 置信度
+                "confidence": 置信度,
+                "trace": 每步LLM/工具调用的耗时记录
             }
         """
+        tracer = TracingCallbackHandler("AgentService", trace_id=session_id)
         try:
             logger.info(f"[Agent] 收到问题: {message}")
             
             # 执行 Agent (React agent 不需要 chat_history 参数)
-            response = await self.agent_executor.ainvoke({
-                "input": message
-            })
+            response = await self.agent_executor.ainvoke(
+                {"input": message},
+                config={"callbacks": components.get("callbacks") + [tracer]}
+            )
             
             answer = response.get("output", "抱歉，我无法回答这个问题。")
             
@@ -233,16 +177,22 @@ Thought: {agent_scratchpad}"""
                 "answer": answer,
                 "tools_used": tools_used,
                 "answer_source": answer_source,
-                "confidence": confidence
+                "confidence": confidence,
+                "trace": tracer.summary()
             }
             
+        except ServerBusyError:
+            # LLM 排队已满或等待超时，交由接口层返回503
+            tracer.summary()
+            raise
         except Exception as e:
             logger.error(f"[Agent] 执行失败: {e}")
             return {
                 "answer": f"抱歉，处理您的问题时出现错误：{str(e)}",
                 "tools_used": [],
                 "answer_source": "error",
-                "confidence": 0.0
+                "confidence": 0.0,
+                "trace": tracer.summary()
             }
     
     def _determine_source(self, tools_used: List[str]) -> str:
@@ -259,14 +209,7 @@ Thought: {agent_scratchpad}"""
             return "general_ai"
 
 
-# 全局 Agent 实例
-agent_service: Optional[AgentService] = None
-
-
 def get_agent_service() -> AgentService:
-    """获取 Agent 服务实例（单例）"""
-    global agent_service
-    if agent_service is None:
-        agent_service = AgentService()
-    return agent_service
+    """获取 Agent 服务实例（单例，由组件注册表构建）"""
+    return components.get("agent_service")
 
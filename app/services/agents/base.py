@@ -12,6 +12,12 @@ from loguru import logger
 class BaseAgent(ABC):
     """Agent 基类"""
     
+    # 示例问题（用于语义路由，为空则只使用 can_handle 规则判断）
+    examples: List[str] = []
+    
+    # 路由关键词（非空时由 AgentManager 的共享关键词自动机统一匹配，不再调用 can_handle）
+    keywords: List[str] = []
+    
     def __init__(self, name: str, description: str):
         """
         初始化 Agent
@@ -39,13 +45,19 @@ class BaseAgent(ABC):
         pass
     
     @abstractmethod
-    async def chat(self, message: str, chat_history: Optional[List[Dict]] = None) -> Dict:
+    async def chat(
+        self,
+        message: str,
+        chat_history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None
+    ) -> Dict:
         """
         处理聊天请求
         
         Args:
             message: 用户消息
             chat_history: 对话历史
+            session_id: 会话ID（用作执行记录的 trace_id，便于与接口日志关联）
             
         Returns:
             {
@@ -57,6 +69,20 @@ class BaseAgent(ABC):
         """
         pass
     
+    def keyword_confidence(self, hits: int) -> float:
+        """
+        根据命中的关键词数计算置信度
+        
+        Args:
+            hits: 命中的关键词数
+            
+        Returns:
+            置信度 0-1（未命中为 0）
+        """
+        if hits <= 0:
+            return 0.0
+        return min(0.9, 0.6 + hits * 0.15)
+    
     def get_info(self) -> Dict:
         """获取 Agent 信息"""
         return {
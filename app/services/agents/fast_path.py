@@ -0,0 +1,135 @@
+"""
+快速通道
+
+四则运算、日期时间这类问题不需要 LLM 推理，
+在路由到 Agent 之前用预编译的模式识别，直接计算并套用模板回答，
+省去 Agent 的 Thought/Action/Final Answer 多轮 LLM 调用。
+"""
+
+import re
+import datetime
+from typing import Dict, Optional
+from loguru import logger
+
+from app.core.metrics import metrics
+from app.services.math_eval import safe_eval
+
+# 中文运算符与全角符号 → 表达式符号
+_OPERATOR_WORDS = [
+    ("乘以", "*"), ("除以", "/"), ("加上", "+"), ("减去", "-"),
+    ("加", "+"), ("减", "-"), ("乘", "*"), ("除", "/"),
+    ("×", "*"), ("÷", "/"), ("＋", "+"), ("－", "-"), ("＊", "*"), ("／", "/"),
+    ("（", "("), ("）", ")"), ("的平方", "^2"), ("的立方", "^3"),
+]
+
+# 算式问题："3*7+2等于多少"、"计算 (1+2)*3"、"2^10=?"
+_CALC_PATTERN = re.compile(
+    r"^(?P<prefix>(?:请|帮我|麻烦)?(?:计算|算一下|算算|算)一?下?)?[:：\s]*"
+    r"(?P<expr>(?:\d+(?:\.\d+)?|sqrt|abs|round|log10|log|sin|cos|tan|exp|pi|[-+*/()^%.\s])+?)"
+    r"\s*(?P<ask>(?:=|＝|等于|是)?\s*(?:多少|几|啥|什么)|=|＝|等于)?\s*[?？。]*$"
+)
+
+# 算式中至少包含一个运算（避免把"2024"之类的纯数字当作算式）
+_HAS_OPERATION = re.compile(r"[\d)]\s*[-+*/^%]\s*[-\d(a-z]|^(?:sqrt|abs|round|log10|log|sin|cos|tan|exp)\(")
+
+# 只含数字和 -/. 的文本可能是日期、电话号码（如"2024-10-18"），需明确在问计算结果
+_AMBIGUOUS_EXPRESSION = re.compile(r"^[\d\-/.]+$")
+
+# 日期时间问题："今天星期几"、"明天几号"、"现在几点"
+_DAY_WORDS = {"前天": -2, "昨天": -1, "今天": 0, "今日": 0, "明天": 1, "明日": 1, "后天": 2}
+_DATE_PATTERN = re.compile(
+    r"^(?:请问)?(?P<day>前天|昨天|今天|今日|明天|明日|后天)(?:是)?"
+    r"(?P<ask>(?:星期|周|礼拜)几|几号|几月几[号日]|(?:的)?日期|什么日子|几月几[号日](?:星期|周)几)"
+    r"[啊呀呢吗]*[?？。]*$"
+)
+_TIME_PATTERN = re.compile(
+    r"^(?:请问)?(?:现在|当前|此刻)(?:是)?(?:几点(?:了|钟)?|(?:的)?时间|什么时间|几点几分)[啊呀呢吗]*[?？。]*$"
+)
+
+_WEEKDAYS = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+
+
+def _normalize(message: str) -> str:
+    """统一中文运算符与全角符号，去掉空白"""
+    text = "".join(message.split())
+    for word, symbol in _OPERATOR_WORDS:
+        text = text.replace(word, symbol)
+    return text
+
+
+def _format_number(value) -> str:
+    """格式化计算结果（整数不带小数点，小数最多保留10位有效数字）"""
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return f"{value:.10g}"
+    return str(value)
+
+
+class FastPath:
+    """快速通道：识别并直接回答计算、日期时间问题"""
+
+    def answer(self, message: str) -> Optional[Dict]:
+        """
+        尝试直接回答
+
+        Args:
+            message: 用户消息
+
+        Returns:
+            与 Agent 相同格式的回答；不属于快速通道的问题返回 None
+        """
+        text = _normalize(message)
+        result = self._calculate(text) or self._date_time(text)
+        if result:
+            metrics.incr(f"fast_path.{result['answer_source']}")
+            logger.info(f"⚡ 快速通道回答: {message} → {result['answer_source']}")
+        return result
+
+    def _calculate(self, text: str) -> Optional[Dict]:
+        """算式问题"""
+        match = _CALC_PATTERN.match(text)
+        if not match:
+            return None
+        expression = match.group("expr").strip()
+        if not _HAS_OPERATION.search(expression):
+            return None
+        if _AMBIGUOUS_EXPRESSION.match(expression) and not (match.group("prefix") or match.group("ask")):
+            return None
+        try:
+            answer = f"{expression} = {_format_number(safe_eval(expression))}"
+        except ZeroDivisionError:
+            answer = f"{expression} 无法计算：除数不能为 0。"
+        except (ValueError, OverflowError, TypeError) as e:
+            # 识别为算式但无法安全计算或格式化，交给 Agent 处理
+            logger.debug(f"[快速通道] 无法计算 {expression}: {e}")
+            return None
+        return {
+            "answer": answer,
+            "answer_source": "calculator",
+            "confidence": 1.0,
+            "tools_used": ["计算器"]
+        }
+
+    def _date_time(self, text: str) -> Optional[Dict]:
+        """日期、星期、时间问题"""
+        now = datetime.datetime.now()
+        match = _DATE_PATTERN.match(text)
+        if match:
+            day = match.group("day")
+            date = now + datetime.timedelta(days=_DAY_WORDS[day])
+            answer = f"{day}是{date.strftime('%Y年%m月%d日')}，{_WEEKDAYS[date.weekday()]}。"
+        elif _TIME_PATTERN.match(text):
+            answer = f"现在是{now.strftime('%H:%M')}（{now.strftime('%Y年%m月%d日')}，{_WEEKDAYS[now.weekday()]}）。"
+        else:
+            return None
+        return {
+            "answer": answer,
+            "answer_source": "datetime",
+            "confidence": 1.0,
+            "tools_used": ["日期时间查询"]
+        }
+
+
+# 全局实例
+fast_path = FastPath()
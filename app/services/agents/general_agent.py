@@ -5,20 +5,18 @@
 使用 LangChain + Ollama + 多种工具
 """
 
-import datetime
 from typing import List, Dict, Optional
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.prompts import PromptTemplate
-from langchain_community.llms import Ollama
 from langchain.tools import Tool
-from langchain_community.tools import WikipediaQueryRun
-from langchain_community.utilities import WikipediaAPIWrapper
+from langchain_core.language_models.llms import BaseLLM
 from loguru import logger
-import time
 
 from .base import BaseAgent
+from .registry import components
+from .tracing import TracingCallbackHandler
 from app.core.config import get_settings
-from app.services.custom_tools import get_all_tools
+from app.services.concurrency import ServerBusyError
 
 settings = get_settings()
 
@@ -26,20 +24,20 @@ settings = get_settings()
 class GeneralAgent(BaseAgent):
     """通用 Agent（使用 LangChain）"""
     
-    def __init__(self):
-        """初始化通用 Agent"""
+    def __init__(self, llm: Optional[BaseLLM] = None):
+        """
+        初始化通用 Agent
+        
+        Args:
+            llm: LangChain LLM（默认使用共享的、经调度器排队的 Ollama）
+        """
         super().__init__(
             name="通用助手",
             description="处理知识库查询、计算、百科等通用问题"
         )
         
         # 初始化 LLM
-        self.llm = Ollama(
-            base_url=settings.OLLAMA_BASE_URL,
-            model=settings.OLLAMA_MODEL,
-            temperature=0.7,
-            num_predict=2048,
-        )
+        self.llm = llm or components.get("llm")
         
         # 初始化工具
         self.tools = self._init_tools()
@@ -49,9 +47,9 @@ class GeneralAgent(BaseAgent):
         self.agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,
-            max_iterations=5,
-            max_execution_time=60,
+            verbose=False,  # 思考过程由回调写入日志（AGENT_VERBOSE）
+            max_iterations=settings.AGENT_MAX_ITERATIONS,
+            max_execution_time=settings.AGENT_MAX_EXECUTION_TIME,
             handle_parsing_errors=True,
             early_stopping_method="generate",
             return_intermediate_steps=True,
@@ -60,33 +58,11 @@ class GeneralAgent(BaseAgent):
         logger.info(f"✅ {self.name} 初始化完成，加载了 {len(self.tools)} 个工具")
     
     def _init_tools(self) -> List[Tool]:
-        """初始化所有工具"""
-        tools = []
-        
-        # 1. 自定义工具（知识库、日期时间、计算器）
-        custom_tools = get_all_tools()
-        tools.extend(custom_tools)
-        logger.info(f"  - 加载自定义工具: {len(custom_tools)} 个")
+        """获取工具（与其他 Agent 共享同一组工具实例）"""
+        tools = list(components.get("custom_tools"))
         
-        # 2. 维基百科工具
         try:
-            wikipedia_wrapper = WikipediaAPIWrapper(
-                lang="zh",
-                top_k_results=2,
-                doc_content_chars_max=500
-            )
-            wikipedia_tool = WikipediaQueryRun(
-                name="维基百科",
-                api_wrapper=wikipedia_wrapper,
-                description="""
-                查询维基百科获取百科知识。
-                适用于：历史事件、人物介绍、科学概念、地理信息等百科类问题。
-                输入：查询关键词（中文）
-                输出：维基百科词条摘要
-                """
-            )
-            tools.append(wikipedia_tool)
-            logger.info("  - 加载维基百科工具")
+            tools.append(components.get("wikipedia_tool"))
         except Exception as e:
             logger.warning(f"  - 维基百科工具加载失败: {e}")
         
@@ -143,16 +119,24 @@ Thought: {agent_scratchpad}"""
     async def chat(
         self,
         message: str,
-        chat_history: Optional[List[Dict]] = None
+        chat_history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None
     ) -> Dict:
         """
         使用 LangChain Agent 处理聊天
+        
+        使用 ainvoke 异步执行：LLM 调用为异步请求，同步工具在线程池中执行，
+        推理过程中不阻塞事件循环，多个 Agent 对话可在同一进程内并发进行。
         """
         logger.info(f"[通用Agent] 收到问题: {message}")
         
+        tracer = TracingCallbackHandler(self.name, trace_id=session_id)
         try:
             # 调用 Agent
-            result = self.agent_executor.invoke({"input": message})
+            result = await self.agent_executor.ainvoke(
+                {"input": message},
+                config={"callbacks": components.get("callbacks") + [tracer]}
+            )
             
             # 提取回答
             answer = result.get("output", "抱歉，我无法回答这个问题。")
@@ -166,34 +150,38 @@ Thought: {agent_scratchpad}"""
                         tool_name = getattr(action, "tool", "未知工具")
                         tools_used.append(tool_name)
             
+            trace = tracer.summary()
             logger.info(f"[通用Agent] 使用工具: {tools_used}")
             logger.info(f"[通用Agent] 回答: {answer[:100]}...")
+            logger.info(
+                f"[通用Agent] 耗时: {trace['total_ms']}ms（LLM {trace['llm_calls']}次 {trace['llm_ms']}ms，"
+                f"工具 {trace['tool_calls']}次 {trace['tool_ms']}ms）"
+            )
             
             return {
                 "answer": answer,
                 "answer_source": "general_agent",
                 "confidence": 0.8,
-                "tools_used": tools_used
+                "tools_used": tools_used,
+                "trace": trace
             }
         
+        except ServerBusyError:
+            # LLM 排队已满或等待超时，交由接口层返回503
+            tracer.summary()
+            raise
         except Exception as e:
             logger.error(f"[通用Agent] 执行失败: {e}")
             return {
                 "answer": "抱歉，处理您的问题时出现了错误，请稍后重试。",
                 "answer_source": "error",
                 "confidence": 0.0,
-                "tools_used": []
+                "tools_used": [],
+                "trace": tracer.summary()
             }
 
 
-# 单例
-_general_agent_instance: Optional[GeneralAgent] = None
-
-
 def get_general_agent() -> GeneralAgent:
-    """获取通用 Agent 单例"""
-    global _general_agent_instance
-    if _general_agent_instance is None:
-        _general_agent_instance = GeneralAgent()
-    return _general_agent_instance
+    """获取通用 Agent 单例（由组件注册表构建）"""
+    return components.get("general_agent")
 
@@ -0,0 +1,100 @@
+"""
+关键词匹配器
+
+把所有 Agent 的关键词编译成一个 Aho-Corasick 自动机，
+一次扫描消息即可得到每个 Agent 命中的关键词数，
+路由耗时与 Agent 数量、关键词数量无关。
+"""
+
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class KeywordMatcher:
+    """多模式关键词匹配（Aho-Corasick 自动机）"""
+
+    def __init__(self):
+        # 待编译的关键词: (归属, 关键词)
+        self._patterns: List[Tuple[str, str]] = []
+        # 状态转移表、失配指针、各状态命中的关键词下标
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Set[int]] = [set()]
+        self._dirty = False
+
+    def add(self, owner: str, keywords: Iterable[str]):
+        """
+        添加关键词（下次匹配前重新编译）
+
+        Args:
+            owner: 关键词归属（Agent 名称）
+            keywords: 关键词列表（不区分大小写）
+        """
+        for keyword in keywords:
+            if keyword:
+                self._patterns.append((owner, keyword.lower()))
+        self._dirty = True
+
+    def build(self):
+        """编译自动机"""
+        goto: List[Dict[str, int]] = [{}]
+        output: List[Set[int]] = [set()]
+
+        # 1. 构建关键词字典树
+        for index, (_, keyword) in enumerate(self._patterns):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(set())
+                state = next_state
+            output[state].add(index)
+
+        # 2. 按层序计算失配指针（第一层指向根），并合并失配状态的命中关键词
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                output[next_state] |= output[fail[next_state]]
+
+        self._goto, self._fail, self._output = goto, fail, output
+        self._dirty = False
+
+    def count(self, message: str) -> Dict[str, int]:
+        """
+        扫描一次消息，统计各归属命中的关键词数（同一关键词只计一次）
+
+        Args:
+            message: 用户消息
+
+        Returns:
+            {归属: 命中关键词数}，未命中的归属不出现
+        """
+        if self._dirty:
+            self.build()
+
+        goto, fail, output = self._goto, self._fail, self._output
+        matched: Set[int] = set()
+        state = 0
+        for char in message.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                matched |= output[state]
+
+        hits: Dict[str, int] = {}
+        for index in matched:
+            owner = self._patterns[index][0]
+            hits[owner] = hits.get(owner, 0) + 1
+        return hits
@@ -3,14 +3,28 @@ Agent 管理器
 
 负责：
 1. 注册和管理所有 Agent
-2. 根据问题自动路由到合适的 Agent
+2. 根据问题自动路由到合适的 Agent（规则判断 + 语义匹配）
+   计算、日期时间类问题由快速通道直接回答，不经过 Agent
 3. 如果没有专业 Agent，使用通用 Agent
 """
 
-from typing import Dict, List, Optional
+import re
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
 
 from .base import BaseAgent
+from .fast_path import fast_path
+from .keyword_matcher import KeywordMatcher
+from .semantic_router import SemanticRouter
+from app.core.config import get_settings
+from app.services.embedding import embedding_service
+
+settings = get_settings()
+
+# 首尾标点
+_TRIM_PATTERN = re.compile(r"^[\s\W_]+|[\s\W_]+$")
 
 
 class AgentManager:
@@ -20,6 +34,12 @@ class AgentManager:
         """初始化 Agent 管理器"""
         self.agents: List[BaseAgent] = []
         self.default_agent: Optional[BaseAgent] = None
+        self.semantic_router = SemanticRouter()
+        # 所有 Agent 的关键词编译为一个自动机，一次扫描得到各 Agent 的命中数
+        self.keyword_matcher = KeywordMatcher()
+        # 路由结果缓存（LRU）：规范化问题 → Agent
+        self._route_cache: "OrderedDict[str, BaseAgent]" = OrderedDict()
+        self.route_cache_size = settings.AGENT_ROUTE_CACHE_SIZE
         logger.info("🔧 Agent Manager 初始化完成")
     
     def register_agent(self, agent: BaseAgent, is_default: bool = False):
@@ -33,85 +53,171 @@ class AgentManager:
         self.agents.append(agent)
         if is_default:
             self.default_agent = agent
+        if agent.keywords:
+            self.keyword_matcher.add(agent.name, agent.keywords)
+            self.keyword_matcher.build()
+        self.semantic_router.set_agents(self.agents)
+        self._route_cache.clear()
         logger.info(f"📝 注册 Agent: {agent.name} (默认={is_default})")
     
-    async def route(self, message: str) -> BaseAgent:
+    async def route(self, message: str, embedding: Optional[List[float]] = None) -> BaseAgent:
         """
         路由到合适的 Agent
         
+        声明了关键词的 Agent 由共享关键词自动机一次扫描打分，
+        其余 Agent 的规则判断（can_handle）与语义匹配并发执行，
+        每个 Agent 取两者中较高的置信度；路由结果按规范化后的问题缓存
+        （语义匹配或规则判断失败时的降级结果不缓存，下次重新判断）。
+        
         Args:
             message: 用户消息
+            embedding: 问题向量（调用方已计算时传入，避免重复向量化）
             
         Returns:
             最合适的 Agent
         """
+        key = self._normalize(message)
+        cached = self._route_cache.get(key)
+        if cached is not None:
+            self._route_cache.move_to_end(key)
+            logger.debug(f"[路由] 命中缓存: {cached.name}")
+            return cached
+        
+        agent, complete = await self._select(message, embedding)
+        if complete:
+            self._route_cache[key] = agent
+            if len(self._route_cache) > self.route_cache_size:
+                self._route_cache.popitem(last=False)
+        return agent
+    
+    async def _select(self, message: str, embedding: Optional[List[float]] = None) -> Tuple[BaseAgent, bool]:
+        """
+        计算各 Agent 的置信度并选择最合适的 Agent
+        
+        Returns:
+            (Agent, 是否所有判断都成功完成)
+        """
+        keyword_hits = self.keyword_matcher.count(message)
+        rule_agents = [agent for agent in self.agents if not agent.keywords]
+        rule_results, semantic_scores = await asyncio.gather(
+            asyncio.gather(
+                *(agent.can_handle(message) for agent in rule_agents),
+                return_exceptions=True
+            ),
+            self._semantic_scores(message, embedding)
+        )
+        rule_by_agent = dict(zip((agent.name for agent in rule_agents), rule_results))
+        complete = semantic_scores is not None
+        semantic_scores = semantic_scores or {}
+        
         best_agent = None
         best_confidence = 0.0
         
-        # 遍历所有 Agent，找到最合适的
         for agent in self.agents:
-            try:
-                can_handle, confidence = await agent.can_handle(message)
-                logger.debug(f"[路由] {agent.name}: can_handle={can_handle}, confidence={confidence:.2f}")
-                
-                if can_handle and confidence > best_confidence:
-                    best_agent = agent
-                    best_confidence = confidence
-            except Exception as e:
-                logger.error(f"[路由] {agent.name} 判断失败: {e}")
+            if agent.keywords:
+                confidence = agent.keyword_confidence(keyword_hits.get(agent.name, 0))
+                result = (confidence > 0, confidence)
+            else:
+                result = rule_by_agent[agent.name]
+            if isinstance(result, Exception):
+                logger.error(f"[路由] {agent.name} 判断失败: {result}")
+                can_handle, confidence = False, 0.0
+                complete = False
+            else:
+                can_handle, confidence = result
+            semantic = semantic_scores.get(agent.name, 0.0)
+            logger.debug(f"[路由] {agent.name}: can_handle={can_handle}, confidence={confidence:.2f}, semantic={semantic:.2f}")
+            
+            if not can_handle:
+                confidence = 0.0
+            confidence = max(confidence, semantic)
+            if confidence > best_confidence:
+                best_agent = agent
+                best_confidence = confidence
         
         # 如果找到了专业 Agent
         if best_agent and best_confidence > 0.5:  # 阈值 0.5
             logger.info(f"🎯 路由到专业 Agent: {best_agent.name} (置信度={best_confidence:.2f})")
-            return best_agent
+            return best_agent, complete
         
         # 否则使用默认 Agent
         if self.default_agent:
             logger.info(f"🔄 使用默认 Agent: {self.default_agent.name}")
-            return self.default_agent
+            return self.default_agent, complete
         
         # 如果没有默认 Agent，返回第一个
         if self.agents:
             logger.warning(f"⚠️  没有默认 Agent，使用第一个: {self.agents[0].name}")
-            return self.agents[0]
+            return self.agents[0], complete
         
         raise RuntimeError("没有可用的 Agent")
     
-    async def chat(self, message: str, chat_history: Optional[List[Dict]] = None) -> Dict:
+    async def _semantic_scores(self, message: str, embedding: Optional[List[float]] = None) -> Optional[Dict[str, float]]:
+        """语义匹配分数（向量化失败时返回 None，仅使用规则判断）"""
+        if not self.semantic_router.agents:
+            return {}
+        try:
+            if embedding is None:
+                embedding = await embedding_service.get_embedding(message)
+            return await self.semantic_router.score(embedding)
+        except Exception as e:
+            logger.warning(f"[路由] 语义匹配失败，仅使用规则判断: {e}")
+            return None
+    
+    @staticmethod
+    def _normalize(message: str) -> str:
+        """规范化问题（用作路由缓存键）：去除空白和首尾标点，统一小写"""
+        return _TRIM_PATTERN.sub("", "".join(message.split()).lower())
+    
+    async def chat(
+        self,
+        message: str,
+        chat_history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None,
+        embedding: Optional[List[float]] = None
+    ) -> Dict:
         """
         处理聊天请求（自动路由）
         
         Args:
             message: 用户消息
             chat_history: 对话历史
+            session_id: 会话ID（传给 Agent 关联执行记录）
+            embedding: 问题向量（已计算时传入，语义路由直接复用）
             
         Returns:
             聊天响应
         """
+        # 计算、日期时间问题直接回答（无需 LLM）
+        if settings.AGENT_FAST_PATH_ENABLED:
+            result = fast_path.answer(message)
+            if result:
+                result["agent_name"] = "快速通道"
+                return result
+        
         # 路由到合适的 Agent
-        agent = await self.route(message)
+        agent = await self.route(message, embedding)
         
         # 调用 Agent 处理
-        result = await agent.chat(message, chat_history)
+        result = await agent.chat(message, chat_history, session_id=session_id)
         
         # 添加 Agent 信息
         result["agent_name"] = agent.name
         
         return result
     
+    async def warmup(self):
+        """预先计算语义路由向量（启动预热时调用）"""
+        if self.semantic_router.agents:
+            await self.semantic_router.build()
+    
     def list_agents(self) -> List[Dict]:
         """列出所有已注册的 Agent"""
         return [agent.get_info() for agent in self.agents]
 
 
-# 全局单例
-_agent_manager: Optional[AgentManager] = None
-
-
 def get_agent_manager() -> AgentManager:
-    """获取全局 Agent Manager"""
-    global _agent_manager
-    if _agent_manager is None:
-        _agent_manager = AgentManager()
-    return _agent_manager
+    """获取全局 Agent Manager（由组件注册表构建，已注册全部 Agent）"""
+    from .registry import components
+    return components.get("agent_manager")
 
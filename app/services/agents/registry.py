@@ -0,0 +1,217 @@
+"""
+Agent 组件注册表
+
+LLM、工具、Agent 按名称注册构建函数，首次使用时才构建，之后全局共享同一实例：
+- 导入模块时不再构建 Agent，服务启动更快
+- 多个 Agent 共用同一个 LLM 客户端和工具实例
+- 启动后可在后台预热，第一个请求无需等待构建
+"""
+
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+class ComponentRegistry:
+    """组件注册表（线程安全，构建函数中可以获取其他组件）"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._warmup_task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """注册组件构建函数"""
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        """获取组件（首次获取时构建）"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                logger.info(f"[组件] 构建 {name}")
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    async def aget(self, name: str) -> Any:
+        """在事件循环中获取组件（尚未构建时在线程中构建，不阻塞事件循环）"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        return await asyncio.to_thread(self.get, name)
+
+    def is_built(self, name: str) -> bool:
+        """组件是否已构建"""
+        return name in self._instances
+
+    async def warmup(self, names: List[str]):
+        """预先构建组件，并调用组件的 warmup()（如计算语义路由向量）"""
+        for name in names:
+            try:
+                component = await self.aget(name)
+                if hasattr(component, "warmup"):
+                    await component.warmup()
+            except Exception as e:
+                # 预热失败不影响启动，首次使用时会再次尝试
+                logger.warning(f"[组件] 预热 {name} 失败: {e}")
+
+    def start_warmup(self, names: List[str]):
+        """在后台预热组件（在事件循环中调用）"""
+        if self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(self.warmup(names), name="component_warmup")
+
+    async def stop(self):
+        """停止未完成的预热"""
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+            try:
+                await self._warmup_task
+            except asyncio.CancelledError:
+                pass
+            self._warmup_task = None
+
+
+def _build_llm():
+    """共享的 Agent LLM（经调度器排队的 Ollama）"""
+    from .scheduled_ollama import ScheduledOllama
+    return ScheduledOllama(
+        base_url=settings.OLLAMA_BASE_URL,
+        model=settings.OLLAMA_MODEL,
+        temperature=settings.LLM_TEMPERATURE_GENERAL,
+        num_predict=2048,  # 最大输出token数
+    )
+
+
+def _build_custom_tools():
+    """自定义工具（知识库、日期时间、计算器）"""
+    from app.services.custom_tools import get_all_tools
+    return get_all_tools()
+
+
+_WIKIPEDIA_DESCRIPTION = """
+        查询维基百科获取百科知识。
+        适用于：历史事件、人物介绍、科学概念、地理信息等百科类问题。
+        输入：查询关键词（中文）
+        输出：维基百科词条摘要
+        """
+
+
+def _build_wikipedia_tool():
+    """维基百科工具（优先使用离线索引，索引不存在时查询在线维基百科）"""
+    from langchain.tools import Tool
+    from app.services.tools.wiki_index import WikiIndex
+
+    if Path(settings.WIKI_INDEX_PATH).exists():
+        index = WikiIndex(settings.WIKI_INDEX_PATH)
+        return Tool(
+            name="维基百科",
+            func=index.run,
+            coroutine=index.arun,
+            description=_WIKIPEDIA_DESCRIPTION
+        )
+
+    logger.warning(f"未找到离线维基百科索引 {settings.WIKI_INDEX_PATH}，使用在线维基百科")
+    from langchain_community.tools import WikipediaQueryRun
+    from langchain_community.utilities import WikipediaAPIWrapper
+    return WikipediaQueryRun(
+        name="维基百科",
+        api_wrapper=WikipediaAPIWrapper(
+            lang="zh",
+            top_k_results=settings.WIKI_TOP_K,
+            doc_content_chars_max=settings.WIKI_MAX_CHARS
+        ),
+        description=_WIKIPEDIA_DESCRIPTION
+    )
+
+
+def _safe_duckduckgo_search(query: str) -> str:
+    """安全的 DuckDuckGo 搜索，带错误处理"""
+    try:
+        from duckduckgo_search import DDGS
+        import time
+        
+        # 添加延迟避免频率限制
+        time.sleep(1)
+        
+        with DDGS() as ddgs:
+            results = list(ddgs.text(query, max_results=3))
+            
+        if results:
+            formatted = []
+            for r in results:
+                formatted.append(f"标题: {r.get('title', 'N/A')}\n内容: {r.get('body', 'N/A')}\n链接: {r.get('href', 'N/A')}")
+            return "\n\n".join(formatted)
+        else:
+            return "未找到搜索结果。"
+            
+    except Exception as e:
+        error_msg = str(e)
+        if "Ratelimit" in error_msg or "202" in error_msg:
+            return "搜索服务暂时繁忙（频率限制），请稍后再试。建议：1) 稍等片刻后重试 2) 使用更具体的关键词 3) 尝试其他信息源。"
+        else:
+            return f"网络搜索暂时不可用：{error_msg}。建议使用其他方式获取信息。"
+
+
+def _build_search_tool():
+    """网络搜索工具（DuckDuckGo - 免费，带错误处理）"""
+    from langchain.tools import Tool
+    return Tool(
+        name="网络搜索",
+        func=_safe_duckduckgo_search,
+        description="""
+        在互联网上搜索最新信息。
+        适用于：实时新闻、天气、股票价格、最新事件等需要网络查询的问题。
+        输入：搜索关键词
+        输出：搜索结果摘要
+        注意：如果遇到频率限制，建议使用其他工具或告知用户稍后重试。
+        """
+    )
+
+
+def _build_callbacks():
+    """Agent 回调（AGENT_VERBOSE=True 时把思考过程写入日志）"""
+    from .tracing import LoggingCallbackHandler
+    return [LoggingCallbackHandler()] if settings.AGENT_VERBOSE else []
+
+
+def _build_general_agent():
+    from .general_agent import GeneralAgent
+    return GeneralAgent()
+
+
+def _build_agent_service():
+    from app.services.agent import AgentService
+    return AgentService()
+
+
+def _build_agent_manager():
+    """Agent Manager（注册专业 Agent 和兜底的通用 Agent）"""
+    from .manager import AgentManager
+    from .weather_agent import get_weather_agent
+
+    manager = AgentManager()
+    manager.register_agent(get_weather_agent())  # 天气专家
+    manager.register_agent(components.get("general_agent"), is_default=True)  # 通用 Agent（默认/兜底）
+    logger.info(f"✅ Agent Manager 已初始化，注册了 {len(manager.list_agents())} 个 Agent")
+    return manager
+
+
+# 全局组件注册表
+components = ComponentRegistry()
+components.register("llm", _build_llm)
+components.register("custom_tools", _build_custom_tools)
+components.register("wikipedia_tool", _build_wikipedia_tool)
+components.register("search_tool", _build_search_tool)
+components.register("callbacks", _build_callbacks)
+components.register("general_agent", _build_general_agent)
+components.register("agent_service", _build_agent_service)
+components.register("agent_manager", _build_agent_manager)
@@ -0,0 +1,37 @@
+"""
+经优先级调度器排队、由后端池选择节点的 LangChain Ollama LLM
+
+Agent 的每一步推理都是一次 Ollama 调用，与在线问答共用 Ollama 并发名额，
+按 agent 优先级排队，避免 Agent 推理挤占在线问答。
+"""
+
+from typing import Any, List, Optional
+from langchain_community.llms import Ollama
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.outputs import LLMResult
+
+from app.services.concurrency import ollama_scheduler
+from app.services.ollama_pool import ollama_pool
+
+
+class ScheduledOllama(Ollama):
+    """异步调用（ainvoke）经调度器排队并由后端池选择节点的 Ollama LLM
+
+    同步调用（invoke）无法等待异步调度器，直接访问 base_url。
+    """
+
+    priority: str = "agent"
+
+    async def _agenerate(  # type: ignore[override]
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        images: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        async with ollama_scheduler.slot(self.priority), ollama_pool.backend(self.model) as backend:
+            llm = self if backend.url == self.base_url else self.model_copy(update={"base_url": backend.url})
+            return await Ollama._agenerate(
+                llm, prompts, stop=stop, images=images, run_manager=run_manager, **kwargs
+            )
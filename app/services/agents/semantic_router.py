@@ -0,0 +1,85 @@
+"""
+语义路由
+
+预先计算每个 Agent 的描述和示例问题的向量，
+路由时问题向量与全部示例做一次矩阵乘法，得到各 Agent 的语义匹配分数。
+"""
+
+import asyncio
+import numpy as np
+from typing import Dict, List, Optional
+from loguru import logger
+
+from .base import BaseAgent
+from app.core.config import get_settings
+from app.services.embedding import embedding_service
+
+settings = get_settings()
+
+# nomic-embed-text 的基线相似度（与知识库检索一致）
+_BASELINE = 0.58
+
+
+class SemanticRouter:
+    """基于向量相似度的 Agent 路由"""
+    
+    def __init__(self):
+        self.threshold = settings.AGENT_SEMANTIC_THRESHOLD
+        self.agents: List[BaseAgent] = []
+        # 全部示例向量 (n, dim)，及每行所属的 Agent 下标
+        self.matrix: Optional[np.ndarray] = None
+        self.owners: Optional[np.ndarray] = None
+        self._dirty = True
+        self._lock = asyncio.Lock()
+    
+    def set_agents(self, agents: List[BaseAgent]):
+        """设置参与语义路由的 Agent（有示例问题的 Agent），下次打分前重新计算向量"""
+        self.agents = [agent for agent in agents if agent.examples]
+        self._dirty = True
+    
+    async def build(self):
+        """计算所有 Agent 描述和示例问题的向量"""
+        async with self._lock:
+            if not self._dirty:
+                return
+            texts, owners = [], []
+            for index, agent in enumerate(self.agents):
+                for text in [agent.description, *agent.examples]:
+                    texts.append(text)
+                    owners.append(index)
+            if texts:
+                embeddings = await embedding_service.get_embeddings_batch(texts, priority="interactive")
+                self.matrix = np.asarray(embeddings, dtype=np.float32)
+                self.owners = np.asarray(owners)
+            else:
+                self.matrix = None
+                self.owners = None
+            self._dirty = False
+            logger.info(f"[语义路由] 已计算 {len(texts)} 条示例向量，覆盖 {len(self.agents)} 个 Agent")
+    
+    async def score(self, embedding: List[float]) -> Dict[str, float]:
+        """
+        计算问题与各 Agent 的语义匹配分数
+        
+        Args:
+            embedding: 问题向量（已归一化）
+            
+        Returns:
+            {Agent名称: 置信度 0-1}，仅包含达到阈值的 Agent
+        """
+        if self._dirty:
+            await self.build()
+        if self.matrix is None:
+            return {}
+        
+        similarities = self.matrix @ np.asarray(embedding, dtype=np.float32)
+        # 每个 Agent 取与其示例的最高相似度，并按基线映射到 [0, 1]
+        best = np.full(len(self.agents), -1.0, dtype=np.float32)
+        np.maximum.at(best, self.owners, similarities)
+        normalized = np.clip((best - _BASELINE) / (1.0 - _BASELINE), 0.0, 1.0)
+        
+        return {
+            agent.name: float(score)
+            for agent, score in zip(self.agents, normalized)
+            if score >= self.threshold
+        }
@@ -0,0 +1,184 @@
+"""
+Agent 执行过程记录
+
+- LoggingCallbackHandler: 把 Agent 的每一步（工具调用、观察结果、最终回答）写入日志，
+  替代 AgentExecutor(verbose=True) 直接打印到标准输出
+- TracingCallbackHandler: 记录每次 LLM/工具调用的耗时、token 数和错误，写入运行时指标
+"""
+
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from loguru import logger
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+settings = get_settings()
+
+# 日志中观察结果的最大长度
+_MAX_OBSERVATION_CHARS = 200
+
+# 输出解析失败时 AgentExecutor 回灌错误提示使用的工具名
+_PARSE_ERROR_TOOL = "_Exception"
+
+
+class LoggingCallbackHandler(BaseCallbackHandler):
+    """把 Agent 的思考过程写入日志（AGENT_VERBOSE=True 时启用）"""
+
+    # 只写日志，直接在回调线程/事件循环中执行，无需切换到线程池
+    run_inline = True
+
+    def on_agent_action(self, action: AgentAction, **kwargs: Any) -> Any:
+        logger.info(f"[Agent过程] Action: {action.tool}, Input: {action.tool_input}")
+
+    def on_tool_end(self, output: Any, **kwargs: Any) -> Any:
+        text = str(output)
+        if len(text) > _MAX_OBSERVATION_CHARS:
+            text = text[:_MAX_OBSERVATION_CHARS] + "..."
+        logger.info(f"[Agent过程] Observation: {text}")
+
+    def on_tool_error(self, error: BaseException, **kwargs: Any) -> Any:
+        logger.warning(f"[Agent过程] 工具出错: {error}")
+
+    def on_agent_finish(self, finish: AgentFinish, **kwargs: Any) -> Any:
+        output: Dict = finish.return_values
+        logger.info(f"[Agent过程] Final Answer: {str(output.get('output', ''))[:_MAX_OBSERVATION_CHARS]}")
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """记录一次 Agent 执行中每一步的耗时（每个请求新建一个实例）
+
+    - LLM 调用：耗时（含调度器排队）、prompt/completion token 数
+    - 工具调用：耗时、结果长度、错误
+    - 输出解析失败：LangChain 以 "_Exception" 工具回灌错误提示，单独计数
+
+    每一步同时写入全局指标（GET /api/v1/metrics）和日志（带 trace_id，默认为会话ID，可与接口日志关联），
+    执行结束后 summary() 返回本次请求的完整记录。
+    """
+
+    # 只做计时和计数，直接在事件循环中执行
+    run_inline = True
+
+    def __init__(self, agent_name: str, trace_id: Optional[str] = None):
+        self.agent_name = agent_name
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.spans: List[Dict] = []
+        self._start = time.perf_counter()
+        self._running: Dict[UUID, Dict] = {}
+
+    def _begin(self, run_id: UUID, span: Dict):
+        span["start_ms"] = round((time.perf_counter() - self._start) * 1000, 1)
+        self._running[run_id] = span
+
+    def _end(self, run_id: UUID) -> Optional[Dict]:
+        span = self._running.pop(run_id, None)
+        if span is None:
+            return None
+        elapsed = (time.perf_counter() - self._start) * 1000
+        span["duration_ms"] = round(elapsed - span["start_ms"], 1)
+        self.spans.append(span)
+        return span
+
+    def _log(self, span: Dict):
+        detail = ", ".join(f"{k}={v}" for k, v in span.items() if k not in ("type", "name", "start_ms"))
+        logger.info(f"[Agent追踪] trace={self.trace_id} {span['type']}:{span['name']} {detail}")
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> Any:
+        self._begin(run_id, {"type": "llm", "name": "llm", "prompt_chars": sum(len(p) for p in prompts)})
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> Any:
+        span = self._end(run_id)
+        if span is None:
+            return
+        prompt_tokens, completion_tokens = _token_usage(response)
+        span["prompt_tokens"] = prompt_tokens
+        span["completion_tokens"] = completion_tokens
+        metrics.observe("agent.llm_ms", span["duration_ms"])
+        if prompt_tokens is not None:
+            metrics.incr("agent.llm_prompt_tokens", prompt_tokens)
+        if completion_tokens is not None:
+            metrics.incr("agent.llm_completion_tokens", completion_tokens)
+        self._log(span)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        span = self._end(run_id)
+        if span is None:
+            return
+        span["error"] = str(error)[:_MAX_OBSERVATION_CHARS]
+        metrics.incr("agent.llm_errors")
+        self._log(span)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> Any:
+        name = serialized.get("name") or kwargs.get("name") or "未知工具"
+        span_type = "parse_error" if name == _PARSE_ERROR_TOOL else "tool"
+        self._begin(run_id, {"type": span_type, "name": name, "input_chars": len(str(input_str))})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> Any:
+        span = self._end(run_id)
+        if span is None:
+            return
+        span["output_chars"] = len(str(output))
+        if span["type"] == "parse_error":
+            metrics.incr("agent.parse_errors")
+        else:
+            metrics.observe(f"agent.tool.{span['name']}_ms", span["duration_ms"])
+        self._log(span)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        span = self._end(run_id)
+        if span is None:
+            return
+        span["error"] = str(error)[:_MAX_OBSERVATION_CHARS]
+        metrics.observe(f"agent.tool.{span['name']}_ms", span["duration_ms"])
+        metrics.incr(f"agent.tool.{span['name']}.errors")
+        self._log(span)
+
+    def summary(self) -> Dict:
+        """本次执行的汇总与各步骤明细，同时记入最近执行记录"""
+        llm_spans = [s for s in self.spans if s["type"] == "llm"]
+        tool_spans = [s for s in self.spans if s["type"] == "tool"]
+        total_ms = round((time.perf_counter() - self._start) * 1000, 1)
+        trace = {
+            "trace_id": self.trace_id,
+            "agent": self.agent_name,
+            "total_ms": total_ms,
+            "llm_calls": len(llm_spans),
+            "llm_ms": round(sum(s["duration_ms"] for s in llm_spans), 1),
+            "prompt_tokens": sum(s.get("prompt_tokens") or 0 for s in llm_spans),
+            "completion_tokens": sum(s.get("completion_tokens") or 0 for s in llm_spans),
+            "tool_calls": len(tool_spans),
+            "tool_ms": round(sum(s["duration_ms"] for s in tool_spans), 1),
+            "parse_errors": sum(1 for s in self.spans if s["type"] == "parse_error"),
+            "spans": self.spans,
+        }
+        metrics.observe("agent.total_ms", total_ms)
+        metrics.observe("agent.llm_calls", len(llm_spans))
+        _recent_traces.append(trace)
+        return trace
+
+
+def _token_usage(response: LLMResult) -> Tuple[Optional[int], Optional[int]]:
+    """从 LLM 返回中读取 token 数（Ollama 在 generation_info 中返回 prompt_eval_count/eval_count）"""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens"), usage.get("completion_tokens")
+    prompt_tokens = completion_tokens = None
+    for generations in response.generations:
+        for generation in generations:
+            info = generation.generation_info or {}
+            if "prompt_eval_count" in info:
+                prompt_tokens = (prompt_tokens or 0) + info["prompt_eval_count"]
+            if "eval_count" in info:
+                completion_tokens = (completion_tokens or 0) + info["eval_count"]
+    return prompt_tokens, completion_tokens
+
+
+# 最近的 Agent 执行记录（在指标接口中查看）
+_recent_traces: Deque[Dict] = deque(maxlen=settings.AGENT_TRACE_RECENT)
+metrics.register_source("agent.recent_traces", lambda: {"traces": list(_recent_traces)})
@@ -3,15 +3,48 @@
 
 负责处理所有与天气相关的查询
 支持工具链串联：日期时间 → 地点解析 → 天气查询
+同时询问多个城市时并发查询，合并为一个对比回答
 """
 
 import re
+import asyncio
 import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
 
 from .base import BaseAgent
+from .keyword_matcher import KeywordMatcher
+from app.core.config import get_settings
 from app.services.tools.weather_tool import get_weather_tool
+from app.services.tools.gazetteer import gazetteer, Location
+
+settings = get_settings()
+
+# 地名词典未命中时的城市名模式（需要市/区/县/镇后缀）
+_CITY_PATTERNS = [
+    # 匹配"XX市"、"XX区"、"XX县"的完整形式
+    re.compile(r"([\u4e00-\u9fa5]{2,10}?(?:市|区|县|镇))(?:的)?(?:天气|气温|温度|实时)"),
+    # 兜底：匹配中文城市名
+    re.compile(r"([\u4e00-\u9fa5]{2,8}?(?:市|区|县|镇))"),
+]
+
+# 多日预报的说法 → 天数（按顺序匹配）
+_FORECAST_SPANS = [
+    (("未来一周", "未来7天", "未来七天", "这周", "本周", "一周"), 7),
+    (("未来三天", "未来3天", "这几天", "最近几天", "未来几天"), 3),
+]
+
+# 单日的说法 → 距今天的天数（"大后天"需在"后天"之前匹配）
+_DAY_OFFSETS = [
+    (("大后天",), 3),
+    (("后天",), 2),
+    (("明天", "明日"), 1),
+]
+
+_DAY_NAMES = {0: "今天", 1: "明天", 2: "后天", 3: "大后天"}
+
+# 城市名中需要清理的常见修饰词
+_EXCLUDE_WORDS = ["今天", "明天", "现在", "怎么样", "如何", "多少", "实时", "最新"]
 
 
 class WeatherAgent(BaseAgent):
@@ -23,6 +56,18 @@ class WeatherAgent(BaseAgent):
         "刮风", "风力", "湿度", "降雨", "降水", "雾霾", "空气",
         "穿什么", "需要带伞", "热不热", "冷不冷"
     ]
+    keywords = WEATHER_KEYWORDS
+    
+    # 示例问题（语义路由）
+    examples = [
+        "北京今天天气怎么样",
+        "明天上海会下雨吗",
+        "杭州现在多少度",
+        "出门需要带伞吗",
+        "这周末天气适合出去玩吗",
+        "今天穿什么衣服合适",
+        "广州最近空气质量如何",
+    ]
     
     def __init__(self):
         """初始化天气 Agent"""
@@ -31,6 +76,10 @@ class WeatherAgent(BaseAgent):
             description="专门处理天气查询相关的问题"
         )
         
+        # 单独调用 can_handle 时使用的关键词自动机（路由时由 AgentManager 统一匹配）
+        self.keyword_matcher = KeywordMatcher()
+        self.keyword_matcher.add(self.name, self.keywords)
+        
         # 加载天气工具
         self.weather_tool = get_weather_tool()
         self.tools = [self.weather_tool]
@@ -42,14 +91,12 @@ class WeatherAgent(BaseAgent):
         Returns:
             (是否能处理, 置信度)
         """
-        message_lower = message.lower()
-        
-        # 检查是否包含天气关键词
-        keyword_count = sum(1 for keyword in self.WEATHER_KEYWORDS if keyword in message_lower)
+        # 检查是否包含天气关键词（一次扫描）
+        keyword_count = self.keyword_matcher.count(message).get(self.name, 0)
         
         if keyword_count > 0:
             # 根据关键词数量计算置信度
-            confidence = min(0.9, 0.6 + keyword_count * 0.15)
+            confidence = self.keyword_confidence(keyword_count)
             logger.debug(f"[天气Agent] 匹配关键词数={keyword_count}, 置信度={confidence:.2f}")
             return True, confidence
         
@@ -65,35 +112,76 @@ class WeatherAgent(BaseAgent):
         Returns:
             城市名称或 None
         """
-        # 常见城市模式（优化版）
-        city_patterns = [
-            # 匹配"XX市"、"XX区"、"XX县"的完整形式
-            r"([\u4e00-\u9fa5]{2,10}?(?:市|区|县|镇))(?:的)?(?:天气|气温|温度|实时)",
-            # 匹配省市区组合，如"北京市通州区"
-            r"([\u4e00-\u9fa5]{2,6}?(?:省|市)[\u4e00-\u9fa5]{2,6}?(?:市|区|县))",
-            # 匹配"天气"等关键词后的城市名
-            r"(?:天气|气温|温度).*?([\u4e00-\u9fa5]{2,8}?)(?:市|区|县|镇|的|呢|吗|？)",
-            # 兜底：匹配中文城市名（需要市/区/县/镇）
-            r"([\u4e00-\u9fa5]{2,8}?(?:市|区|县|镇))",
-        ]
-        
-        for pattern in city_patterns:
-            match = re.search(pattern, message)
+        location = self.extract_location(message)
+        if location:
+            return location.name
+        return self._match_city_pattern(message)
+    
+    def _match_city_pattern(self, message: str) -> Optional[str]:
+        """词典中没有的地名（如乡镇），按行政区划后缀匹配，由天气工具查询城市ID"""
+        for pattern in _CITY_PATTERNS:
+            match = pattern.search(message)
             if match:
                 city = match.group(1)
-                # 过滤一些常见的非城市词和修饰词
-                exclude_words = ["今天", "明天", "现在", "怎么样", "如何", "多少", "实时", "最新"]
                 # 清理city中可能包含的修饰词
-                for word in exclude_words:
+                for word in _EXCLUDE_WORDS:
                     city = city.replace(word, "")
                 city = city.strip()
                 
-                if city and city not in exclude_words:
+                if city and city not in _EXCLUDE_WORDS:
                     logger.info(f"[地点解析] 提取城市: {city}")
                     return city
         
         return None
     
+    def extract_location(self, message: str) -> Optional[Location]:
+        """
+        从消息中提取地名词典中的地点（一次扫描，最长匹配）
+        
+        Args:
+            message: 用户消息
+            
+        Returns:
+            地点（含 Location ID）或 None
+        """
+        location = gazetteer.extract(message)
+        if location:
+            logger.info(f"[地点解析] 词典匹配: {location.name} (ID: {location.id})")
+        return location
+    
+    def extract_locations(self, message: str) -> List[Location]:
+        """
+        从消息中提取提到的所有地点（如"北京和上海明天天气"）
+        
+        Args:
+            message: 用户消息
+            
+        Returns:
+            地点列表（最多 WEATHER_MAX_CITIES 个）
+        """
+        locations = gazetteer.extract_all(message)[:settings.WEATHER_MAX_CITIES]
+        if locations:
+            logger.info(f"[地点解析] 词典匹配: {[location.name for location in locations]}")
+        return locations
+    
+    def extract_time_range(self, message: str) -> Tuple[int, int]:
+        """
+        提取查询的日期范围
+        
+        Args:
+            message: 用户消息
+            
+        Returns:
+            (起始日期距今天的天数, 天数)，如 明天 → (1, 1)，未来一周 → (0, 7)
+        """
+        for words, days in _FORECAST_SPANS:
+            if any(word in message for word in words):
+                return 0, days
+        for words, offset in _DAY_OFFSETS:
+            if any(word in message for word in words):
+                return offset, 1
+        return 0, 1
+    
     def extract_time_context(self, message: str) -> str:
         """
         提取时间上下文
@@ -104,29 +192,26 @@ class WeatherAgent(BaseAgent):
         Returns:
             时间描述
         """
-        now = datetime.datetime.now()
-        
-        # 检查是否询问明天
-        if "明天" in message or "明日" in message:
-            tomorrow = now + datetime.timedelta(days=1)
-            return f"明天（{tomorrow.strftime('%Y年%m月%d日')}）"
-        
-        # 检查是否询问后天
-        if "后天" in message:
-            day_after = now + datetime.timedelta(days=2)
-            return f"后天（{day_after.strftime('%Y年%m月%d日')}）"
+        offset, days = self.extract_time_range(message)
+        if days > 1:
+            return f"未来{days}天"
         
-        # 默认今天
-        return f"今天（{now.strftime('%Y年%m月%d日')}）"
+        date = datetime.datetime.now() + datetime.timedelta(days=offset)
+        return f"{_DAY_NAMES[offset]}（{date.strftime('%Y年%m月%d日')}）"
     
-    async def chat(self, message: str, chat_history: Optional[List[Dict]] = None) -> Dict:
+    async def chat(
+        self,
+        message: str,
+        chat_history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None
+    ) -> Dict:
         """
         处理天气查询（工具链串联）
         
         工具链：
         1. 提取时间上下文
         2. 提取地点信息
-        3. 调用天气 API
+        3. 调用天气 API（今天查实时天气，其他日期查逐日预报）
         4. 生成友好回答
         """
         tools_used = []
@@ -137,9 +222,18 @@ class WeatherAgent(BaseAgent):
             tools_used.append("时间解析")
             logger.info(f"[工具链-1] 时间上下文: {time_context}")
             
-            # 步骤 2: 提取城市名称
-            city = self.extract_city(message)
+            # 步骤 2: 提取城市名称（词典命中时直接得到城市ID）
+            locations = self.extract_locations(message)
             tools_used.append("地点解析")
+            offset, days = self.extract_time_range(message)
+            
+            if len(locations) > 1:
+                # 多个城市：并发查询并合并为对比回答
+                tools_used.append("天气API")
+                return await self._compare_weather(locations, offset, days, time_context, tools_used)
+            
+            location = locations[0] if locations else None
+            city = location.name if location else self._match_city_pattern(message)
             
             if not city:
                 return {
@@ -153,23 +247,13 @@ class WeatherAgent(BaseAgent):
             
             # 步骤 3: 调用天气工具
             tools_used.append("天气API")
-            weather_result = await self.weather_tool.get_weather_now(city)
+            weather_result = await self._query_weather(
+                city, location.id if location else None, offset, days, time_context
+            )
             
             if weather_result["success"]:
-                # 步骤 4: 生成友好回答
-                w = weather_result
-                answer = f"""{time_context}{city}的天气情况如下：
-
-🌡️ **温度**：{w['temperature']}（体感 {w['feels_like']}）
-🌤️  **天气**：{w['weather']}
-💨 **风力**：{w['wind_dir']} {w['wind_scale']}级
-💧 **湿度**：{w['humidity']}
-👁️  **能见度**：{w['visibility']}
-
-数据更新时间：{w['update_time']}"""
-                
                 return {
-                    "answer": answer,
+                    "answer": weather_result["answer"],
                     "answer_source": "weather_api",
                     "confidence": 0.95,
                     "tools_used": tools_used,
@@ -192,6 +276,132 @@ class WeatherAgent(BaseAgent):
                 "confidence": 0.3,
                 "tools_used": tools_used
             }
+    
+    async def _query_weather(
+        self,
+        city: str,
+        location_id: Optional[str],
+        offset: int,
+        days: int,
+        time_context: str
+    ) -> Dict:
+        """
+        查询天气并生成回答（结果中的 answer 字段）
+        
+        Args:
+            city: 城市名称
+            location_id: Location ID（未知时为 None）
+            offset: 起始日期距今天的天数
+            days: 天数
+            time_context: 时间描述
+        """
+        # 步骤 4: 生成友好回答
+        if offset == 0 and days == 1:
+            result = await self.weather_tool.get_weather_now(city, location_id=location_id)
+            if result["success"]:
+                w = result
+                result["answer"] = f"""{time_context}{city}的天气情况如下：
+
+🌡️ **温度**：{w['temperature']}（体感 {w['feels_like']}）
+🌤️  **天气**：{w['weather']}
+💨 **风力**：{w['wind_dir']} {w['wind_scale']}级
+💧 **湿度**：{w['humidity']}
+👁️  **能见度**：{w['visibility']}
+
+数据更新时间：{w['update_time']}"""
+            return result
+        
+        result = await self.weather_tool.get_forecast(city, days=offset + days, location_id=location_id)
+        if not result["success"]:
+            return result
+        daily = result["daily"] = result["daily"][offset:offset + days]
+        if not daily:
+            return {"success": False, "message": "暂无该日期的天气预报"}
+        
+        if days == 1:
+            d = daily[0]
+            result["answer"] = f"""{time_context}{city}的天气预报：
+
+🌤️  **天气**：白天{d['weather_day']}，夜间{d['weather_night']}
+🌡️ **温度**：{d['temp_min']} ~ {d['temp_max']}
+💨 **风力**：{d['wind_dir']} {d['wind_scale']}级
+💧 **湿度**：{d['humidity']}
+🌧️ **降水量**：{d['precip']}
+
+数据更新时间：{result['update_time']}"""
+        else:
+            lines = [
+                f"- {d['date']}：{d['weather_day']}转{d['weather_night']}，{d['temp_min']} ~ {d['temp_max']}，{d['wind_dir']} {d['wind_scale']}级"
+                for d in daily
+            ]
+            result["answer"] = f"{city}{time_context}的天气预报：\n\n" + "\n".join(lines) + f"\n\n数据更新时间：{result['update_time']}"
+        return result
+    
+    async def _compare_weather(
+        self,
+        locations: List[Location],
+        offset: int,
+        days: int,
+        time_context: str,
+        tools_used: List[str]
+    ) -> Dict:
+        """
+        并发查询多个城市的天气，合并为一个对比回答
+        
+        超过 WEATHER_MULTI_CITY_TIMEOUT 仍未返回的城市标记为超时，先返回其余城市的结果
+        （进行中的上游请求不会取消，完成后写入缓存供下次使用）。
+        """
+        tasks = [
+            asyncio.create_task(self._query_weather(location.name, location.id, offset, days, time_context))
+            for location in locations
+        ]
+        _, pending = await asyncio.wait(tasks, timeout=settings.WEATHER_MULTI_CITY_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        
+        lines = []
+        results = {}
+        for location, task in zip(locations, tasks):
+            if task in pending:
+                lines.append(f"- {location.name}：查询超时，请稍后再试")
+                continue
+            if task.exception() is not None:
+                logger.error(f"[天气Agent] {location.name} 查询失败: {task.exception()}")
+                lines.append(f"- {location.name}：查询失败")
+                continue
+            result = task.result()
+            if not result["success"]:
+                lines.append(f"- {location.name}：查询失败（{result.get('message', '')}）")
+                continue
+            results[location.name] = result
+            lines.append(self._summary_line(location.name, result, offset, days))
+        
+        logger.info(f"[工具链-3] 多城市查询: 成功{len(results)}/{len(locations)}")
+        update_time = next((r["update_time"] for r in results.values()), "")
+        answer = f"{time_context}各城市天气对比：\n\n" + "\n".join(lines)
+        if update_time:
+            answer += f"\n\n数据更新时间：{update_time}"
+        
+        return {
+            "answer": answer,
+            "answer_source": "weather_api" if results else "weather_agent",
+            "confidence": 0.95 if len(results) == len(locations) else (0.8 if results else 0.5),
+            "tools_used": tools_used,
+            "weather_data": results
+        }
+    
+    @staticmethod
+    def _summary_line(city: str, result: Dict, offset: int, days: int) -> str:
+        """对比回答中一个城市的天气摘要"""
+        if offset == 0 and days == 1:
+            w = result
+            return f"- {city}：{w['weather']}，{w['temperature']}（体感 {w['feels_like']}），{w['wind_dir']} {w['wind_scale']}级，湿度 {w['humidity']}"
+        if days == 1:
+            d = result["daily"][0]
+            return f"- {city}：白天{d['weather_day']}，夜间{d['weather_night']}，{d['temp_min']} ~ {d['temp_max']}，{d['wind_dir']} {d['wind_scale']}级"
+        return f"- {city}：" + "；".join(
+            f"{d['date'][5:]} {d['weather_day']} {d['temp_min']} ~ {d['temp_max']}" for d in result["daily"]
+        )
 
 
 # 单例
@@ -0,0 +1,98 @@
+"""LLM响应缓存 - 相同模型/消息/生成参数的请求直接返回已缓存的结果"""
+import json
+import time
+import hashlib
+from typing import Dict, List, Optional
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.core.redis import get_redis
+from loguru import logger
+
+settings = get_settings()
+
+
+class ResponseCache:
+    """LLM响应缓存（Redis）
+
+    - 缓存键为 (接口, 模型, 完整消息列表, 生成参数) 的sha256，任一内容不同即不命中
+    - 每条缓存设置TTL；超过单条大小上限的结果不缓存
+    - 以有序集合记录写入时间，条目数超过上限时淘汰最早写入的条目
+    - Redis不可用时跳过缓存，并在一段时间内不再尝试，不影响正常生成
+    """
+
+    KEY_PREFIX = "llm:resp:"
+    INDEX_KEY = "llm:resp:index"
+    # Redis出错后暂停使用缓存的时间（秒）
+    RETRY_INTERVAL = 30
+
+    def __init__(self):
+        self.enabled = settings.RESPONSE_CACHE_ENABLED
+        self.ttl = settings.RESPONSE_CACHE_TTL
+        self.max_entries = settings.RESPONSE_CACHE_MAX_ENTRIES
+        self.max_entry_bytes = settings.RESPONSE_CACHE_MAX_ENTRY_BYTES
+        self.max_temperature = settings.RESPONSE_CACHE_MAX_TEMPERATURE
+        self._disabled_until = 0.0
+
+    def cacheable(self, options: Dict) -> bool:
+        """是否允许缓存（温度过高时输出随机性大，不缓存）"""
+        return (
+            self.enabled
+            and time.time() >= self._disabled_until
+            and options.get("temperature", 1.0) <= self.max_temperature
+        )
+
+    @classmethod
+    def make_key(cls, endpoint: str, model: str, messages: List[Dict[str, str]], options: Dict) -> str:
+        """生成缓存键"""
+        payload = json.dumps(
+            {"endpoint": endpoint, "model": model, "messages": messages, "options": options},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return cls.KEY_PREFIX + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """读取缓存，未命中或出错时返回None"""
+        try:
+            raw = await get_redis().get(key)
+        except Exception as e:
+            self._on_error("读取", e)
+            return None
+        if raw is None:
+            metrics.incr("llm_cache.misses")
+            return None
+        metrics.incr("llm_cache.hits")
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Dict):
+        """写入缓存（超过单条大小上限时跳过）"""
+        raw = json.dumps(value, ensure_ascii=False)
+        if len(raw.encode("utf-8")) > self.max_entry_bytes:
+            metrics.incr("llm_cache.oversized")
+            return
+        try:
+            redis = get_redis()
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, raw, ex=self.ttl)
+                pipe.zadd(self.INDEX_KEY, {key: time.time()})
+                # 移除索引中已过期的条目
+                pipe.zremrangebyscore(self.INDEX_KEY, 0, time.time() - self.ttl)
+                pipe.zcard(self.INDEX_KEY)
+                *_, size = await pipe.execute()
+            if size > self.max_entries:
+                evicted = await redis.zpopmin(self.INDEX_KEY, size - self.max_entries)
+                if evicted:
+                    await redis.delete(*(k for k, _ in evicted))
+                    metrics.incr("llm_cache.evictions")
+            metrics.incr("llm_cache.stores")
+        except Exception as e:
+            self._on_error("写入", e)
+
+    def _on_error(self, action: str, error: Exception):
+        metrics.incr("llm_cache.errors")
+        self._disabled_until = time.time() + self.RETRY_INTERVAL
+        logger.warning(f"LLM响应缓存{action}失败，{self.RETRY_INTERVAL}秒内跳过缓存: {error}")
+
+
+# 创建全局实例
+response_cache = ResponseCache()
@@ -1,41 +1,34 @@
 """问答业务逻辑服务"""
 import uuid
 import time
-from typing import Dict, List, Optional
+import asyncio
+import importlib.util
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models import Knowledge, Conversation
 from app.schemas.chat import ChatResponse
 from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import metrics
 from .embedding import embedding_service
 from .milvus import milvus_service
 from .llm import llm_service
 from .search import search_service
+from .context_packer import context_packer
+from .intent import intent_service
+from .session import session_store
+from .pipeline import StageGraph, spawn_background
+from .concurrency import ServerBusyError
+from .agents.registry import components
 from loguru import logger
 
 settings = get_settings()
 
-# 动态导入 Agent Manager（如果启用）
-AGENT_MANAGER_AVAILABLE = False
-try:
-    from .agents import AgentManager, get_agent_manager
-    from .agents.general_agent import get_general_agent
-    from .agents.weather_agent import get_weather_agent
-    
-    # 初始化 Agent Manager
-    agent_manager = get_agent_manager()
-    
-    # 注册专业 Agent
-    agent_manager.register_agent(get_weather_agent())  # 天气专家
-    
-    # 注册通用 Agent（作为默认/兜底）
-    agent_manager.register_agent(get_general_agent(), is_default=True)
-    
-    AGENT_MANAGER_AVAILABLE = True
-    logger.info("✅ Agent Manager 已初始化，注册了 {} 个 Agent".format(len(agent_manager.list_agents())))
-except ImportError as e:
-    agent_manager = None
-    logger.warning(f"⚠️  Agent Manager 不可用: {e}")
+# Agent 依赖是否可用（只检查是否安装；Agent Manager 在首次使用或启动预热时构建）
+AGENT_MANAGER_AVAILABLE = settings.ENABLE_AGENT and importlib.util.find_spec("langchain") is not None
+if not AGENT_MANAGER_AVAILABLE:
+    logger.warning("⚠️  Agent Manager 不可用（未启用或未安装 langchain）")
 
 
 class ChatService:
@@ -94,35 +87,34 @@ class ChatService:
         try:
             logger.info(f"[Agent模式] 处理问题: {message}")
             
-            # 1. 使用 Agent Manager 自动路由并处理
-            result = await agent_manager.chat(message)
+            # 1. 问题只向量化一次，Agent 语义路由与意图识别共用；两者相互独立，并发执行
+            agent_manager = await components.aget("agent_manager")
+            graph = StageGraph("agent_chat")
+            graph.add("embed", lambda r: self._embed_or_none(message))
+            graph.add("agent", lambda r: agent_manager.chat(message, session_id=session_id, embedding=r["embed"]), deps=["embed"])
+            graph.add("intent", lambda r: intent_service.resolve(message, r["embed"]), deps=["embed"])
+            results = await graph.run()
             
+            result = results["agent"]
+            intent = results["intent"]
             answer = result["answer"]
             answer_source = result["answer_source"]
             confidence = result["confidence"]
             tools_used = result.get("tools_used", [])
             agent_name = result.get("agent_name", "未知")
             
-            # 2. 识别意图
-            intent = await llm_service.detect_intent(message)
-            
-            # 3. 保存对话历史
+            # 2. 响应返回后再保存对话历史（Agent 模式下没有直接的 knowledge_id）
             response_time = int((time.time() - start_time) * 1000)
             if db:
-                conversation = Conversation(
-                    session_id=session_id,
-                    user_id=user_id,
-                    user_message=message,
-                    bot_response=answer,
-                    intent=intent,
-                    confidence=confidence,
-                    knowledge_id=None,  # Agent 模式下没有直接的 knowledge_id
-                    response_time=response_time
+                conversation = self._build_conversation(
+                    session_id, user_id, message, answer, answer_source,
+                    intent, confidence, [], response_time
                 )
-                db.add(conversation)
-                await db.commit()
+                if settings.AGENT_TRACE_STORE:
+                    conversation.agent_trace = result.get("trace")
+                self._save_conversation_later(conversation)
             
-            # 4. 构建响应
+            # 3. 构建响应
             response = ChatResponse(
                 session_id=session_id,
                 answer=answer,
@@ -134,8 +126,12 @@ class ChatService:
             )
             
             logger.info(f"[Agent模式] 完成: agent={agent_name}, session={session_id}, 耗时={response_time}ms, 工具={tools_used}, 来源={answer_source}")
+            logger.debug(f"[Agent模式] 阶段耗时: {graph.summary()}")
             return response
             
+        except ServerBusyError:
+            # 与普通问答一致，服务繁忙交由接口层返回503
+            raise
         except Exception as e:
             logger.error(f"[Agent模式] 处理失败: {e}")
             # 返回默认错误响应
@@ -148,6 +144,241 @@ class ChatService:
                 answer_source="error"
             )
     
+    async def _retrieve(
+        self,
+        message: str,
+        db: AsyncSession,
+        question_embedding: Optional[List[float]] = None
+    ) -> Dict:
+        """检索回答所需的上下文（知识库优先，置信度过低时走网络搜索）
+        
+        Args:
+            message: 用户消息
+            db: 数据库会话
+            question_embedding: 问题向量（已计算时传入）
+            
+        Returns:
+            {
+                "mode": 回答模式（knowledge_base / general_ai / web_search）,
+                "context": 按token预算打包后的上下文,
+                "confidence": 置信度,
+                "sources": 来源列表,
+                "related_questions": 相关问题,
+                "embedding": 问题向量（供意图识别复用）,
+                "polished_answer": 可直接返回的预生成答案（最佳匹配置信度足够高时）
+            }
+        """
+        # 1. 获取问题的向量表示
+        if question_embedding is None:
+            question_embedding = await embedding_service.get_embedding(message)
+        
+        # 2. 在Milvus中搜索相似问题
+        matches = await milvus_service.search(question_embedding, top_k=5)
+        
+        # 判断是否需要网络搜索（无匹配或置信度极低）
+        use_web_search = False
+        if not matches:
+            use_web_search = True
+        else:
+            # 计算初步置信度
+            raw_score = float(matches[0][1]) if matches else 0.0
+            baseline = 0.58
+            if raw_score < baseline:
+                preliminary_confidence = 0.0
+            else:
+                preliminary_confidence = (raw_score - baseline) / (1.0 - baseline)
+            
+            # 如果置信度太低，启用网络搜索
+            if preliminary_confidence < settings.CONFIDENCE_THRESHOLD_WEB_SEARCH:
+                use_web_search = True
+                logger.info(f"置信度过低({preliminary_confidence:.2%})，启用网络搜索")
+        
+        if use_web_search:
+            # 使用SearXNG网络搜索
+            search_results = await search_service.search(
+                message, 
+                max_results=settings.SEARXNG_MAX_RESULTS
+            )
+            
+            if search_results:
+                # 基于搜索结果回答（按网络搜索模式的token预算打包）
+                packed = context_packer.pack(
+                    search_service.to_passages(search_results), mode="web_search"
+                )
+                logger.info(f"使用网络搜索回答，找到{len(search_results)}条结果")
+                return {
+                    "mode": "web_search",
+                    "context": packed["context"],
+                    "confidence": 0.1,  # 网络搜索给一个固定的低置信度
+                    "sources": [{
+                        "title": r["title"],
+                        "url": r["url"],
+                        "similarity": 0.0
+                    } for r in search_results],
+                    "related_questions": [],
+                    "embedding": question_embedding,
+                    "polished_answer": None
+                }
+            
+            # 网络搜索也失败，使用通用AI
+            return {
+                "mode": "general_ai",
+                "context": "",
+                "confidence": 0.0,
+                "sources": [],
+                "related_questions": [],
+                "embedding": question_embedding,
+                "polished_answer": None
+            }
+        
+        # 3. 从数据库获取知识详情
+        knowledge_ids = [match[0] for match in matches]
+        result = await db.execute(
+            select(Knowledge).where(
+                Knowledge.id.in_(knowledge_ids),
+                Knowledge.status == 1
+            )
+        )
+        knowledge_list = result.scalars().all()
+        
+        # 构建知识库映射
+        knowledge_map = {k.id: k for k in knowledge_list}
+        
+        # 4. 计算置信度（使用最高的相似度作为置信度）
+        # IP（内积）分数：考虑模型的基线相似度（约0.58）
+        raw_score = float(matches[0][1]) if matches else 0.0
+        baseline = 0.58  # nomic-embed-text的基线相似度
+        if raw_score < baseline:
+            confidence = 0.0
+        else:
+            # 将[baseline, 1.0]映射到[0, 1]
+            confidence = (raw_score - baseline) / (1.0 - baseline)
+        
+        # 5. 构建上下文（按相关度排序、去重，在回答模式的token预算内打包）
+        passages = []
+        for kid, score in matches:
+            if kid in knowledge_map:
+                k = knowledge_map[kid]
+                # IP（内积）分数：考虑基线相似度
+                raw = float(score)
+                normalized_score = max(0.0, (raw - baseline) / (1.0 - baseline)) if raw >= baseline else 0.0
+                passages.append({
+                    "text": f"问题：{k.question}\n答案：{k.answer}",
+                    "score": normalized_score,
+                    "id": k.id,
+                    "question": k.question
+                })
+        
+        mode = llm_service.answer_mode(confidence)
+        packed = context_packer.pack(passages, mode=mode)
+        
+        # 最佳匹配置信度足够高且有未过期的预生成答案时，直接返回该答案
+        polished_answer = None
+        top = knowledge_map.get(matches[0][0])
+        if top is not None and confidence >= settings.PREGENERATED_ANSWER_MIN_SCORE:
+            polished_answer = top.current_polished_answer()
+        
+        # 6. 获取相关问题推荐
+        related_questions = [
+            knowledge_map[kid].question 
+            for kid, _ in matches[1:4] 
+            if kid in knowledge_map
+        ]
+        
+        return {
+            "mode": mode,
+            "context": packed["context"],
+            "confidence": confidence,
+            "sources": [{
+                "id": p["id"],
+                "question": p["question"],
+                "similarity": p["score"]
+            } for p in packed["kept"]],
+            "related_questions": related_questions,
+            "embedding": question_embedding,
+            "polished_answer": polished_answer
+        }
+    
+    async def _embed_or_none(self, message: str) -> Optional[List[float]]:
+        """向量化问题（失败时返回None，由路由/意图识别各自降级处理）"""
+        try:
+            return await embedding_service.get_embedding(message)
+        except ServerBusyError:
+            raise
+        except Exception as e:
+            logger.warning(f"[Agent模式] 问题向量化失败: {e}")
+            return None
+    
+    def _build_conversation(
+        self,
+        session_id: str,
+        user_id: Optional[str],
+        message: str,
+        answer: str,
+        answer_source: str,
+        intent: Optional[str],
+        confidence: float,
+        sources: List[dict],
+        response_time: int
+    ) -> Conversation:
+        """构建对话历史记录"""
+        # 只有来自知识库的答案才有knowledge_id
+        knowledge_id = None
+        if answer_source == "knowledge_base" and sources and "id" in sources[0]:
+            knowledge_id = sources[0]["id"]
+        
+        return Conversation(
+            session_id=session_id,
+            user_id=user_id,
+            user_message=message,
+            bot_response=answer,
+            intent=intent,
+            confidence=confidence,
+            knowledge_id=knowledge_id,
+            response_time=response_time
+        )
+    
+    async def _generate(
+        self,
+        message: str,
+        retrieval: Dict,
+        session_id: str
+    ) -> tuple[str, str, Dict[str, int]]:
+        """基于检索结果生成答案（网络搜索结果按低置信度处理，携带会话历史）"""
+        if retrieval["polished_answer"]:
+            return self._serve_polished(message, retrieval["polished_answer"], session_id)
+        
+        answer, answer_source, usage = await llm_service.generate_answer(
+            message,
+            retrieval["context"],
+            confidence=retrieval["confidence"] if retrieval["mode"] != "web_search" else 0.0,
+            session_id=session_id,
+            intent=intent_service.confident_local(retrieval["embedding"])
+        )
+        if retrieval["mode"] == "web_search":
+            answer_source = "web_search"  # 标记为网络搜索
+        return answer, answer_source, usage
+    
+    def _serve_polished(
+        self,
+        message: str,
+        answer: str,
+        session_id: str
+    ) -> tuple[str, str, Dict[str, int]]:
+        """直接返回预生成答案（不调用LLM，仍计入会话历史）"""
+        session_store.append(session_id, message, answer)
+        metrics.incr("chat.pregenerated")
+        return answer, "knowledge_base", {"prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+    
+    def _save_conversation_later(self, conversation: Conversation):
+        """在后台保存对话历史，不占用响应时间"""
+        async def save():
+            async with AsyncSessionLocal() as db:
+                db.add(conversation)
+                await db.commit()
+        
+        spawn_background(save(), name="save_conversation")
+    
     async def chat_legacy(
         self,
         message: str,
@@ -173,153 +404,48 @@ class ChatService:
             session_id = str(uuid.uuid4())
         
         try:
-            # 1. 获取问题的向量表示
-            question_embedding = await embedding_service.get_embedding(message)
-            
-            # 2. 在Milvus中搜索相似问题
-            matches = await milvus_service.search(question_embedding, top_k=5)
-            
-            # 判断是否需要网络搜索（无匹配或置信度极低）
-            use_web_search = False
-            if not matches:
-                use_web_search = True
-            else:
-                # 计算初步置信度
-                raw_score = float(matches[0][1]) if matches else 0.0
-                baseline = 0.58
-                if raw_score < baseline:
-                    preliminary_confidence = 0.0
-                else:
-                    preliminary_confidence = (raw_score - baseline) / (1.0 - baseline)
-                
-                # 如果置信度太低，启用网络搜索
-                if preliminary_confidence < settings.CONFIDENCE_THRESHOLD_WEB_SEARCH:
-                    use_web_search = True
-                    logger.info(f"置信度过低({preliminary_confidence:.2%})，启用网络搜索")
+            # 阶段图：向量化完成后，检索→生成 与 意图识别 两条分支并发执行
+            graph = StageGraph("chat")
+            graph.add("embed", lambda r: embedding_service.get_embedding(message))
+            graph.add("retrieve", lambda r: self._retrieve(message, db, r["embed"]), deps=["embed"])
+            graph.add("generate", lambda r: self._generate(message, r["retrieve"], session_id), deps=["retrieve"])
+            # 意图识别复用问题向量做本地分类
+            graph.add("intent", lambda r: intent_service.resolve(message, r["embed"]), deps=["embed"])
+            results = await graph.run()
             
-            if use_web_search:
-                # 使用SearXNG网络搜索
-                search_results = await search_service.search(
-                    message, 
-                    max_results=settings.SEARXNG_MAX_RESULTS
-                )
-                
-                if search_results:
-                    # 基于搜索结果生成答案
-                    search_context = search_service.format_search_context(search_results)
-                    answer, answer_source = await llm_service.generate_answer(
-                        message, search_context, confidence=0.0
-                    )
-                    answer_source = "web_search"  # 标记为网络搜索
-                    confidence = 0.1  # 网络搜索给一个固定的低置信度
-                    sources = [{
-                        "title": r["title"],
-                        "url": r["url"],
-                        "similarity": 0.0
-                    } for r in search_results]
-                    related_questions = []
-                    logger.info(f"使用网络搜索回答，找到{len(search_results)}条结果")
-                else:
-                    # 网络搜索也失败，使用通用AI
-                    answer, answer_source = await llm_service.generate_answer(
-                        message, "", confidence=0.0
-                    )
-                    confidence = 0.0
-                    sources = []
-                    related_questions = []
-            else:
-                # 3. 从数据库获取知识详情
-                knowledge_ids = [match[0] for match in matches]
-                result = await db.execute(
-                    select(Knowledge).where(
-                        Knowledge.id.in_(knowledge_ids),
-                        Knowledge.status == 1
-                    )
-                )
-                knowledge_list = result.scalars().all()
-                
-                # 构建知识库映射
-                knowledge_map = {k.id: k for k in knowledge_list}
-                
-                # 4. 构建上下文
-                context_parts = []
-                sources = []
-                for kid, score in matches[:3]:  # 取前3个最相关的
-                    if kid in knowledge_map:
-                        k = knowledge_map[kid]
-                        context_parts.append(f"问题：{k.question}\n答案：{k.answer}")
-                        # IP（内积）分数：考虑基线相似度
-                        baseline = 0.58
-                        raw = float(score)
-                        normalized_score = max(0.0, (raw - baseline) / (1.0 - baseline)) if raw >= baseline else 0.0
-                        sources.append({
-                            "id": k.id,
-                            "question": k.question,
-                            "similarity": normalized_score
-                        })
-                
-                context = "\n\n".join(context_parts)
-                
-                # 5. 计算置信度（使用最高的相似度作为置信度）
-                # IP（内积）分数：考虑模型的基线相似度（约0.58）
-                raw_score = float(matches[0][1]) if matches else 0.0
-                baseline = 0.58  # nomic-embed-text的基线相似度
-                if raw_score < baseline:
-                    confidence = 0.0
-                else:
-                    # 将[baseline, 1.0]映射到[0, 1]
-                    confidence = (raw_score - baseline) / (1.0 - baseline)
-                
-                # 6. 使用LLM生成答案（根据置信度自动调整策略）
-                answer, answer_source = await llm_service.generate_answer(
-                    message, context, confidence=confidence
-                )
-                
-                # 7. 获取相关问题推荐
-                related_questions = [
-                    knowledge_map[kid].question 
-                    for kid, _ in matches[1:4] 
-                    if kid in knowledge_map
-                ]
+            retrieval = results["retrieve"]
+            answer, answer_source, usage = results["generate"]
+            intent = results["intent"]
+            confidence = retrieval["confidence"]
+            sources = retrieval["sources"]
             
-            # 8. 识别意图
-            intent = await llm_service.detect_intent(message)
-            
-            # 9. 保存对话历史
+            # 响应返回后再保存对话历史
             response_time = int((time.time() - start_time) * 1000)
             if db:
-                # 只有来自知识库的答案才有knowledge_id
-                knowledge_id = None
-                if answer_source == "knowledge_base" and sources and "id" in sources[0]:
-                    knowledge_id = sources[0]["id"]
-                
-                conversation = Conversation(
-                    session_id=session_id,
-                    user_id=user_id,
-                    user_message=message,
-                    bot_response=answer,
-                    intent=intent,
-                    confidence=confidence,
-                    knowledge_id=knowledge_id,
-                    response_time=response_time
-                )
-                db.add(conversation)
-                await db.commit()
+                self._save_conversation_later(self._build_conversation(
+                    session_id, user_id, message, answer, answer_source,
+                    intent, confidence, sources, response_time
+                ))
             
-            # 10. 构建响应
+            # 构建响应
             response = ChatResponse(
                 session_id=session_id,
                 answer=answer,
                 confidence=confidence,
                 sources=sources,
-                related_questions=related_questions,
+                related_questions=retrieval["related_questions"],
                 intent=intent,
-                answer_source=answer_source
+                answer_source=answer_source,
+                prompt_tokens=usage["prompt_tokens"]
             )
             
-            logger.info(f"问答完成: session={session_id}, 耗时={response_time}ms, 置信度={confidence:.2f}, 来源={answer_source}")
+            logger.info(f"问答完成: session={session_id}, 耗时={response_time}ms, 置信度={confidence:.2f}, 来源={answer_source}, prompt_tokens={usage['prompt_tokens']}")
+            logger.debug(f"阶段耗时: {graph.summary()}")
             return response
             
+        except ServerBusyError:
+            # 服务繁忙交由接口层快速返回，不作为系统错误处理
+            raise
         except Exception as e:
             logger.error(f"问答处理失败: {e}")
             # 返回默认错误响应
@@ -331,6 +457,118 @@ class ChatService:
                 related_questions=[],
                 answer_source="error"
             )
+    
+    async def _polished_stream(self, message: str, answer: str, session_id: str) -> AsyncIterator[Dict]:
+        """以流式分片格式返回预生成答案"""
+        answer, answer_source, usage = self._serve_polished(message, answer, session_id)
+        yield {"content": answer, "done": False}
+        yield {"content": "", "done": True, "answer_source": answer_source, "usage": usage}
+    
+    async def chat_stream(
+        self,
+        message: str,
+        session_id: str = None,
+        user_id: str = None,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[Tuple[str, dict]]:
+        """流式处理聊天请求（知识库检索 + 逐token生成）
+        
+        事件顺序：meta（来源、置信度等元数据） → token（多次） → done；出错时为 error。
+        生成结束后保存对话历史；客户端断开时中止生成，不保存。
+        
+        Args:
+            message: 用户消息
+            session_id: 会话ID
+            user_id: 用户ID
+            is_disconnected: 检测客户端是否已断开的回调
+            
+        Yields:
+            (事件名, 事件数据)
+        """
+        start_time = time.time()
+        
+        # 生成会话ID
+        if not session_id:
+            session_id = str(uuid.uuid4())
+        
+        intent_task: Optional[asyncio.Task] = None
+        try:
+            # 流式响应在请求处理函数返回后才执行，使用独立的数据库会话
+            async with AsyncSessionLocal() as db:
+                retrieval = await self._retrieve(message, db)
+            confidence = retrieval["confidence"]
+            sources = retrieval["sources"]
+            answer_source = retrieval["mode"]
+            
+            yield "meta", {
+                "session_id": session_id,
+                "confidence": confidence,
+                "sources": sources,
+                "related_questions": retrieval["related_questions"],
+                "answer_source": answer_source
+            }
+            
+            # 意图识别与生成并发执行
+            intent_task = asyncio.create_task(
+                intent_service.resolve(message, retrieval["embedding"])
+            )
+            
+            answer_parts = []
+            usage = {}
+            if retrieval["polished_answer"]:
+                stream = self._polished_stream(message, retrieval["polished_answer"], session_id)
+            else:
+                stream = llm_service.stream_answer(
+                    message,
+                    retrieval["context"],
+                    confidence=confidence if answer_source != "web_search" else 0.0,
+                    session_id=session_id,
+                    intent=intent_service.confident_local(retrieval["embedding"])
+                )
+            try:
+                async for chunk in stream:
+                    if is_disconnected and await is_disconnected():
+                        logger.info(f"[流式] 客户端已断开，中止生成: session={session_id}")
+                        return
+                    if chunk["done"]:
+                        usage = chunk["usage"]
+                        break
+                    answer_parts.append(chunk["content"])
+                    yield "token", {"content": chunk["content"]}
+            finally:
+                # 关闭Ollama流式连接，断开时服务端随之停止生成
+                await stream.aclose()
+            
+            answer = "".join(answer_parts)
+            intent = await intent_task
+            response_time = int((time.time() - start_time) * 1000)
+            
+            async with AsyncSessionLocal() as db:
+                conversation = self._build_conversation(
+                    session_id, user_id, message, answer, answer_source,
+                    intent, confidence, sources, response_time
+                )
+                db.add(conversation)
+                await db.commit()
+                conversation_id = conversation.id
+            
+            yield "done", {
+                "conversation_id": conversation_id,
+                "intent": intent,
+                "response_time": response_time,
+                "prompt_tokens": usage.get("prompt_tokens")
+            }
+            logger.info(f"[流式] 问答完成: session={session_id}, 耗时={response_time}ms, 置信度={confidence:.2f}, 来源={answer_source}")
+            
+        except ServerBusyError:
+            yield "error", {"code": 503, "message": "服务繁忙，请稍后重试。"}
+        except Exception as e:
+            logger.error(f"[流式] 问答处理失败: {e}")
+            yield "error", {"code": 500, "message": "抱歉，系统出现错误，请稍后重试。"}
+        finally:
+            # 出错或客户端断开时取消尚未完成的意图识别，避免遗留后台LLM/Embedding调用
+            if intent_task is not None and not intent_task.done():
+                intent_task.cancel()
 
 
 # 创建全局实例
@@ -0,0 +1,168 @@
+"""并发控制 - Ollama请求的优先级调度（加权公平排队 + 背压）"""
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from loguru import logger
+
+settings = get_settings()
+
+
+class ServerBusyError(Exception):
+    """服务繁忙（排队已满或等待超时）"""
+    pass
+
+
+class _PriorityClass:
+    """优先级类别的调度状态"""
+
+    def __init__(
+        self,
+        name: str,
+        weight: float,
+        max_inflight: int,
+        max_queue: int,
+        queue_timeout: Optional[float]
+    ):
+        self.name = name
+        self.weight = weight
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.queue: Deque[asyncio.Future] = deque()
+        self.inflight = 0
+        # 加权公平排队的虚拟完成时间
+        self.finish_tag = 0.0
+
+    def eligible(self) -> bool:
+        """有排队请求且未达到本类别并发上限"""
+        return bool(self.queue) and self.inflight < self.max_inflight
+
+
+class PriorityScheduler:
+    """优先级调度器
+
+    所有发往Ollama的请求（对话生成、意图识别、向量化、Agent推理）共用一个调度器：
+    - 全局最多 max_inflight 个请求同时执行
+    - 每个优先级类别有独立的权重、并发上限、排队上限和排队超时
+    - 有空闲名额时按加权公平排队选择类别：每放行一个请求，该类别的虚拟时间增加 1/权重，
+      虚拟时间最小的类别优先，高权重类别获得更多名额，低权重类别也不会饿死
+    - 排队已满或等待超时时抛出 ServerBusyError
+    """
+
+    def __init__(self, name: str, max_inflight: int, classes: Dict[str, Dict]):
+        self.name = name
+        self.max_inflight = max_inflight
+        self.classes = {
+            class_name: _PriorityClass(
+                class_name,
+                weight=config["weight"],
+                max_inflight=config.get("max_inflight", max_inflight),
+                max_queue=config.get("max_queue", 0),
+                queue_timeout=config.get("queue_timeout")
+            )
+            for class_name, config in classes.items()
+        }
+        self.inflight = 0
+        self.virtual_time = 0.0
+        metrics.register_source(f"{name}.scheduler", self.snapshot)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive") -> AsyncIterator[None]:
+        """按优先级获取一个执行名额
+
+        Args:
+            priority: 优先级类别（interactive/agent/intent/background）
+
+        Raises:
+            ServerBusyError: 本类别排队已满或等待超时
+        """
+        cls = self.classes[priority]
+        if len(cls.queue) >= cls.max_queue and not self._has_capacity(cls):
+            metrics.incr(f"{self.name}.{priority}.rejected")
+            logger.warning(f"[{self.name}] {priority} 排队已满({len(cls.queue)}/{cls.max_queue})，拒绝请求")
+            raise ServerBusyError(f"{self.name} 服务繁忙，请稍后重试")
+
+        start = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        cls.queue.append(waiter)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=cls.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 超时/取消的同时已被放行，归还名额
+                self._release(cls)
+            else:
+                waiter.cancel()
+                if waiter in cls.queue:
+                    cls.queue.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.incr(f"{self.name}.{priority}.timeouts")
+                logger.warning(f"[{self.name}] {priority} 排队超时({cls.queue_timeout}s)，拒绝请求")
+                raise ServerBusyError(f"{self.name} 排队超时，请稍后重试")
+            raise
+
+        metrics.observe(f"{self.name}.{priority}.wait_ms", (time.perf_counter() - start) * 1000)
+        try:
+            yield
+        finally:
+            self._release(cls)
+
+    def _has_capacity(self, cls: _PriorityClass) -> bool:
+        """当前是否可以立即放行该类别的请求"""
+        return self.inflight < self.max_inflight and cls.inflight < cls.max_inflight
+
+    def _dispatch(self):
+        """有空闲名额时，按虚拟完成时间从小到大放行排队请求"""
+        while self.inflight < self.max_inflight:
+            candidates = [cls for cls in self.classes.values() if cls.eligible()]
+            if not candidates:
+                return
+            cls = min(
+                candidates,
+                key=lambda c: max(self.virtual_time, c.finish_tag) + 1.0 / c.weight
+            )
+            waiter = cls.queue.popleft()
+            if waiter.done():
+                # 已取消的等待者
+                continue
+            start_tag = max(self.virtual_time, cls.finish_tag)
+            cls.finish_tag = start_tag + 1.0 / cls.weight
+            self.virtual_time = start_tag
+            cls.inflight += 1
+            self.inflight += 1
+            waiter.set_result(None)
+
+    def _release(self, cls: _PriorityClass):
+        cls.inflight -= 1
+        self.inflight -= 1
+        self._dispatch()
+
+    def snapshot(self) -> Dict:
+        """当前状态"""
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "classes": {
+                name: {
+                    "inflight": cls.inflight,
+                    "max_inflight": cls.max_inflight,
+                    "queue_depth": len(cls.queue),
+                    "max_queue": cls.max_queue,
+                    "weight": cls.weight,
+                }
+                for name, cls in self.classes.items()
+            },
+        }
+
+
+# 创建全局实例（所有Ollama请求共用）
+ollama_scheduler = PriorityScheduler(
+    "ollama",
+    max_inflight=settings.OLLAMA_MAX_INFLIGHT,
+    classes=settings.OLLAMA_PRIORITY_CLASSES
+)
@@ -0,0 +1,181 @@
+"""上下文打包服务 - 按token预算组装LLM上下文"""
+import re
+from typing import Dict, List, Optional
+from app.core.config import get_settings
+from loguru import logger
+
+settings = get_settings()
+
+# 中日韩字符（qwen分词器下约1字1token）
+_CJK_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿　-〿＀-￯]")
+# 非CJK部分：英文单词/数字串 与 单个标点
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+
+# 每条消息的固定开销（角色标记、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数
+
+    不依赖具体分词器：CJK字符按1个token计，英文单词按长度每4个字符约1个token，
+    标点按1个token计。对qwen/llama系列模型偏保守（略高估）。
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    rest = _CJK_PATTERN.sub(" ", text)
+    tokens = cjk_count
+    for word in _WORD_PATTERN.findall(rest):
+        tokens += max(1, (len(word) + 3) // 4)
+    return tokens
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    """估算消息列表的token总数"""
+    return sum(
+        estimate_tokens(m.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+        for m in messages
+    )
+
+
+class ContextPacker:
+    """上下文打包器
+
+    将检索到的片段（知识库条目、搜索结果）按相关度排序、去重，
+    在指定回答模式的token预算内拼装为上下文，超出部分按相关度截断。
+    """
+
+    # 去重使用的字符n-gram长度
+    SHINGLE_SIZE = 3
+    # 截断后剩余token少于该值时不再放入残缺片段
+    MIN_TRUNCATED_TOKENS = 32
+
+    def __init__(self):
+        self.budgets = {
+            "knowledge_base": settings.CONTEXT_TOKEN_BUDGET_KNOWLEDGE_BASE,
+            "general_ai": settings.CONTEXT_TOKEN_BUDGET_GENERAL_AI,
+            "web_search": settings.CONTEXT_TOKEN_BUDGET_WEB_SEARCH,
+        }
+        self.dedup_threshold = settings.CONTEXT_DEDUP_THRESHOLD
+
+    def get_budget(self, mode: str) -> int:
+        """获取回答模式对应的token预算"""
+        return self.budgets.get(mode, settings.CONTEXT_TOKEN_BUDGET_GENERAL_AI)
+
+    def _shingles(self, text: str) -> set:
+        """生成字符n-gram集合（忽略空白和标点差异）"""
+        normalized = re.sub(r"\W+", "", text.lower())
+        n = self.SHINGLE_SIZE
+        if len(normalized) <= n:
+            return {normalized} if normalized else set()
+        return {normalized[i:i + n] for i in range(len(normalized) - n + 1)}
+
+    def _is_duplicate(self, shingles: set, kept: List[set]) -> bool:
+        """判断片段是否与已保留片段高度重叠
+
+        使用包含度（交集 / 较小集合）而非Jaccard，
+        这样短片段被长片段完整包含时也会被识别为重复。
+        """
+        if not shingles:
+            return True
+        for other in kept:
+            if not other:
+                continue
+            overlap = len(shingles & other) / min(len(shingles), len(other))
+            if overlap >= self.dedup_threshold:
+                return True
+        return False
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """按token预算截断文本（二分查找截断位置，预留省略号的1个token）"""
+        max_tokens -= 1
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if estimate_tokens(text[:mid]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo].rstrip() + "…"
+
+    def pack(
+        self,
+        passages: List[Dict],
+        mode: str,
+        budget: Optional[int] = None
+    ) -> Dict:
+        """在token预算内打包上下文
+
+        Args:
+            passages: 片段列表 [{"text": "", "score": 0.0, ...}]
+            mode: 回答模式（knowledge_base / general_ai / web_search）
+            budget: 自定义预算（默认按模式取配置）
+
+        Returns:
+            {
+                "context": 拼装后的上下文,
+                "tokens": 上下文token数,
+                "budget": 使用的预算,
+                "kept": 保留的片段列表（按相关度排序）,
+                "dropped": 因重复或超预算被丢弃的片段数
+            }
+        """
+        budget = budget if budget is not None else self.get_budget(mode)
+        separator_tokens = estimate_tokens("\n\n")
+
+        ordered = sorted(passages, key=lambda p: p.get("score", 0.0), reverse=True)
+
+        kept = []
+        kept_shingles: List[set] = []
+        used_tokens = 0
+        dropped = 0
+
+        for index, passage in enumerate(ordered):
+            text = (passage.get("text") or "").strip()
+            shingles = self._shingles(text)
+            if self._is_duplicate(shingles, kept_shingles):
+                dropped += 1
+                continue
+
+            cost = estimate_tokens(text) + (separator_tokens if kept else 0)
+            remaining = budget - used_tokens
+
+            if cost > remaining:
+                # 预算不足：尝试截断放入最后一个片段，之后的片段全部丢弃
+                available = remaining - (separator_tokens if kept else 0)
+                if available >= self.MIN_TRUNCATED_TOKENS:
+                    text = self._truncate(text, available)
+                    kept.append({**passage, "text": text, "truncated": True})
+                    used_tokens += estimate_tokens(text) + (separator_tokens if len(kept) > 1 else 0)
+                else:
+                    dropped += 1
+                dropped += len(ordered) - index - 1
+                break
+
+            kept.append(passage)
+            kept_shingles.append(shingles)
+            used_tokens += cost
+
+        context = "\n\n".join(p["text"].strip() for p in kept)
+
+        if dropped:
+            logger.debug(f"上下文打包: 模式={mode}, 保留{len(kept)}段, 丢弃{dropped}段, {used_tokens}/{budget} tokens")
+
+        return {
+            "context": context,
+            "tokens": estimate_tokens(context),
+            "budget": budget,
+            "kept": kept,
+            "dropped": dropped,
+        }
+
+
+# 创建全局实例
+context_packer = ContextPacker()
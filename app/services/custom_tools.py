@@ -3,14 +3,16 @@ LangChain 自定义工具定义
 """
 from typing import Optional, Type
 from langchain.tools import BaseTool
-from langchain.callbacks.manager import CallbackManagerForToolRun
+from langchain.callbacks.manager import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
 from pydantic import BaseModel, Field
 from loguru import logger
 
 from app.services.milvus import milvus_service
 from app.services.embedding import embedding_service
 from app.models.knowledge import Knowledge
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal
+from app.core.async_bridge import run_sync
+from app.services.math_eval import safe_eval
 from sqlalchemy import select
 
 
@@ -30,73 +32,71 @@ class KnowledgeBaseTool(BaseTool):
     """
     args_schema: Type[BaseModel] = KnowledgeBaseInput
     
-    def _run(
-        self, 
+    async def _arun(
+        self,
         query: str,
-        run_manager: Optional[CallbackManagerForToolRun] = None
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None
     ) -> str:
-        """同步执行（LangChain 要求）"""
+        """异步执行（复用应用的数据库连接池、向量化和Milvus服务）"""
         try:
             logger.info(f"[知识库工具] 查询: {query}")
             
             # 1. 获取问题向量
-            import asyncio
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            question_embedding = loop.run_until_complete(
-                embedding_service.get_embedding(query)
-            )
+            question_embedding = await embedding_service.get_embedding(query, priority="agent")
             
             # 2. 在 Milvus 中搜索
-            matches = loop.run_until_complete(
-                milvus_service.search(question_embedding, top_k=3)
-            )
+            matches = await milvus_service.search(question_embedding, top_k=3)
             
             if not matches:
                 return "知识库中未找到相关信息。"
             
             # 3. 获取知识详情
             knowledge_ids = [match[0] for match in matches]
-            
-            # 使用同步数据库连接
-            from app.core.database import SessionLocal
-            db = SessionLocal()
-            try:
-                result = db.execute(
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
                     select(Knowledge).where(
                         Knowledge.id.in_(knowledge_ids),
                         Knowledge.status == 1
                     )
                 )
                 knowledge_list = result.scalars().all()
-                
-                # 构建知识库映射
-                knowledge_map = {k.id: k for k in knowledge_list}
-                
-                # 4. 构建结果
-                results = []
-                for kid, score in matches:
-                    if kid in knowledge_map:
-                        k = knowledge_map[kid]
-                        # 计算标准化相似度
-                        baseline = 0.58
-                        raw = float(score)
-                        normalized_score = max(0.0, (raw - baseline) / (1.0 - baseline)) if raw >= baseline else 0.0
-                        
-                        if normalized_score >= 0.2:  # 只返回相关度较高的
-                            results.append(f"问题：{k.question}\n答案：{k.answer}\n相似度：{normalized_score:.2%}")
-                
-                if results:
-                    return "\n\n".join(results)
-                else:
-                    return "知识库中未找到足够相关的信息。"
-            finally:
-                db.close()
+            
+            # 构建知识库映射
+            knowledge_map = {k.id: k for k in knowledge_list}
+            
+            # 4. 构建结果
+            results = []
+            for kid, score in matches:
+                if kid in knowledge_map:
+                    k = knowledge_map[kid]
+                    # 计算标准化相似度
+                    baseline = 0.58
+                    raw = float(score)
+                    normalized_score = max(0.0, (raw - baseline) / (1.0 - baseline)) if raw >= baseline else 0.0
+                    
+                    if normalized_score >= 0.2:  # 只返回相关度较高的
+                        results.append(f"问题：{k.question}\n答案：{k.answer}\n相似度：{normalized_score:.2%}")
+            
+            if results:
+                return "\n\n".join(results)
+            else:
+                return "知识库中未找到足够相关的信息。"
                 
         except Exception as e:
             logger.error(f"[知识库工具] 查询失败: {e}")
             return f"查询知识库时出错: {str(e)}"
+    
+    def _run(
+        self, 
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None
+    ) -> str:
+        """同步执行（LangChain 要求）：在应用事件循环或常驻后台事件循环中执行 _arun"""
+        try:
+            return run_sync(self._arun(query))
+        except RuntimeError as e:
+            logger.error(f"[知识库工具] 查询失败: {e}")
+            return f"查询知识库时出错: {str(e)}"
 
 
 class CalculatorInput(BaseModel):
@@ -115,6 +115,14 @@ class CalculatorTool(BaseTool):
     """
     args_schema: Type[BaseModel] = CalculatorInput
     
+    async def _arun(
+        self,
+        expression: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None
+    ) -> str:
+        """异步执行（计算量小，直接在事件循环中完成，无需切换到线程池）"""
+        return self._run(expression)
+    
     def _run(
         self,
         expression: str,
@@ -122,23 +130,13 @@ class CalculatorTool(BaseTool):
     ) -> str:
         """执行计算"""
         try:
-            import math
             import re
             
-            # 安全的数学函数
-            safe_dict = {
-                'abs': abs, 'round': round,
-                'sqrt': math.sqrt, 'pow': math.pow,
-                'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
-                'log': math.log, 'log10': math.log10,
-                'exp': math.exp, 'pi': math.pi, 'e': math.e,
-            }
-            
             # 清理表达式
-            expression = re.sub(r'[^0-9+\-*/().a-z ]', '', expression.lower())
+            expression = re.sub(r'[^0-9+\-*/().a-z ^%]', '', expression.lower())
             
-            # 计算
-            result = eval(expression, {"__builtins__": {}}, safe_dict)
+            # 计算（解析为AST后只允许数字、运算符和白名单中的数学函数）
+            result = safe_eval(expression)
             return f"计算结果：{result}"
             
         except Exception as e:
@@ -161,6 +159,14 @@ class DateTimeTool(BaseTool):
     """
     args_schema: Type[BaseModel] = DateTimeInput
     
+    async def _arun(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None
+    ) -> str:
+        """异步执行（直接在事件循环中完成，无需切换到线程池）"""
+        return self._run(query)
+    
     def _run(
         self,
         query: str,
@@ -1,8 +1,9 @@
 """Embedding服务 - 文本向量化"""
-import ollama
 import numpy as np
 from typing import List
 from app.core.config import get_settings
+from .concurrency import ollama_scheduler
+from .ollama_pool import ollama_pool
 from loguru import logger
 
 settings = get_settings()
@@ -13,7 +14,9 @@ class EmbeddingService:
     
     def __init__(self):
         self.model = settings.OLLAMA_EMBEDDING_MODEL
-        self.base_url = settings.OLLAMA_BASE_URL
+        # 请求经优先级调度器排队（与对话生成共用Ollama并发名额），由后端池选择节点
+        self.scheduler = ollama_scheduler
+        self.pool = ollama_pool
     
     def _normalize(self, embedding: List[float]) -> List[float]:
         """归一化向量（L2范数）
@@ -30,20 +33,22 @@ class EmbeddingService:
             return (arr / norm).tolist()
         return embedding
     
-    async def get_embedding(self, text: str) -> List[float]:
+    async def get_embedding(self, text: str, priority: str = "interactive") -> List[float]:
         """获取文本的向量表示（归一化）
         
         Args:
             text: 输入文本
+            priority: 调度优先级
             
         Returns:
             归一化后的向量列表
         """
         try:
-            response = ollama.embeddings(
-                model=self.model,
-                prompt=text
-            )
+            async with self.scheduler.slot(priority), self.pool.client(self.model) as client:
+                response = await client.embeddings(
+                    model=self.model,
+                    prompt=text
+                )
             embedding = response["embedding"]
             # 归一化向量，确保IP（内积）等同于余弦相似度
             return self._normalize(embedding)
@@ -51,20 +56,29 @@ class EmbeddingService:
             logger.error(f"获取embedding失败: {e}")
             raise
     
-    async def get_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+    async def get_embeddings_batch(self, texts: List[str], priority: str = "background") -> List[List[float]]:
         """批量获取文本向量
         
         Args:
             texts: 文本列表
+            priority: 调度优先级（默认按后台任务处理）
             
         Returns:
             向量列表的列表
         """
-        embeddings = []
-        for text in texts:
-            embedding = await self.get_embedding(text)
-            embeddings.append(embedding)
-        return embeddings
+        if not texts:
+            return []
+        try:
+            # /api/embed 支持一次请求传入多条文本，避免逐条往返
+            async with self.scheduler.slot(priority), self.pool.client(self.model) as client:
+                response = await client.embed(
+                    model=self.model,
+                    input=texts
+                )
+            return [self._normalize(embedding) for embedding in response["embeddings"]]
+        except Exception as e:
+            logger.error(f"批量获取embedding失败: {e}")
+            raise
 
 
 # 创建全局实例
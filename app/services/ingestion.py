@@ -0,0 +1,293 @@
+"""文档导入服务 - 流式分块、批量向量化并写入知识库"""
+import os
+import re
+import time
+import uuid
+import asyncio
+import itertools
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.models import Knowledge
+from .embedding import embedding_service
+from .milvus import milvus_service
+from loguru import logger
+
+settings = get_settings()
+
+# PDF解析为可选依赖
+try:
+    from pypdf import PdfReader
+    PDF_AVAILABLE = True
+except ImportError:
+    PdfReader = None
+    PDF_AVAILABLE = False
+
+SUPPORTED_EXTENSIONS = {".txt", ".md", ".markdown", ".pdf"}
+
+# 单次读取的最大行长度，防止无换行的超长文本一次性读入内存
+_MAX_LINE_LENGTH = 64 * 1024
+
+# 每次在线程中读取的行数
+_LINES_PER_READ = 256
+
+# 句子边界（优先在这些位置切分）
+_SENTENCE_END = re.compile(r"[。！？!?；;\n]")
+_MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+
+
+class TextChunker:
+    """流式文本分块器
+
+    逐行喂入文本，按句子边界切分为带重叠的片段。
+    Markdown标题会结束当前片段，并作为后续片段的标题。
+    """
+
+    def __init__(self, chunk_size: int, overlap: int):
+        self.chunk_size = chunk_size
+        self.overlap = min(overlap, chunk_size // 2)
+        self.heading: str = ""
+        self._buffer: str = ""
+        self._buffer_heading: str = ""
+
+    def feed(self, line: str) -> Iterator[Dict[str, str]]:
+        """喂入一行文本，产出已完成的片段"""
+        heading_match = _MARKDOWN_HEADING.match(line.strip())
+        if heading_match:
+            # 新章节：输出上一章节剩余内容（不与新章节重叠）
+            yield from self.flush()
+            self.heading = heading_match.group(2)
+            return
+
+        if not self._buffer:
+            self._buffer_heading = self.heading
+        self._buffer += line
+
+        while len(self._buffer) >= self.chunk_size:
+            cut = self._find_cut(self._buffer)
+            text = self._buffer[:cut].strip()
+            if text:
+                yield {"heading": self._buffer_heading, "text": text}
+            self._buffer = self._buffer[max(cut - self.overlap, 0):]
+
+    def flush(self) -> Iterator[Dict[str, str]]:
+        """输出缓冲区中剩余的文本"""
+        text = self._buffer.strip()
+        self._buffer = ""
+        if text:
+            yield {"heading": self._buffer_heading, "text": text}
+
+    def _find_cut(self, text: str) -> int:
+        """在 [chunk_size/2, chunk_size] 范围内寻找最后一个句子边界"""
+        window_start = self.chunk_size // 2
+        last = None
+        for match in _SENTENCE_END.finditer(text, window_start, self.chunk_size):
+            last = match.end()
+        return last or self.chunk_size
+
+
+class IngestionService:
+    """文档导入服务"""
+
+    # 内存中保留的任务数上限
+    MAX_JOBS = 100
+
+    def __init__(self):
+        self.chunk_size = settings.INGEST_CHUNK_SIZE
+        self.chunk_overlap = settings.INGEST_CHUNK_OVERLAP
+        self.batch_size = settings.INGEST_BATCH_SIZE
+        self.jobs: Dict[str, Dict] = {}
+        self._tasks = set()
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """获取导入任务状态"""
+        return self.jobs.get(job_id)
+
+    def start_job(
+        self,
+        file_path: str,
+        filename: str,
+        category: Optional[str] = None,
+        source: Optional[str] = None
+    ) -> Dict:
+        """创建导入任务并在后台执行
+
+        Args:
+            file_path: 已落盘的临时文件路径（任务结束后删除）
+            filename: 原始文件名
+            category: 知识分类
+            source: 来源（默认使用文件名）
+
+        Returns:
+            任务状态字典
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "filename": filename,
+            "status": "pending",
+            "bytes_total": os.path.getsize(file_path),
+            "bytes_read": 0,
+            "progress": 0.0,
+            "chunks_processed": 0,
+            "chunks_inserted": 0,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+        self.jobs[job_id] = job
+        self._evict_finished_jobs()
+
+        task = asyncio.create_task(
+            self._run_job(job, file_path, category, source or filename)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _evict_finished_jobs(self):
+        """超出上限时移除最早完成的任务"""
+        if len(self.jobs) <= self.MAX_JOBS:
+            return
+        finished = [j for j in self.jobs.values() if j["finished_at"]]
+        finished.sort(key=lambda j: j["finished_at"])
+        for job in finished[:len(self.jobs) - self.MAX_JOBS]:
+            self.jobs.pop(job["job_id"], None)
+
+    def _iter_lines(self, file_path: str, filename: str, job: Dict) -> Iterator[str]:
+        """流式读取文档，逐行产出文本"""
+        ext = os.path.splitext(filename)[1].lower()
+
+        if ext == ".pdf":
+            if not PDF_AVAILABLE:
+                raise RuntimeError("未安装pypdf，无法解析PDF文档")
+            reader = PdfReader(file_path)
+            total_pages = len(reader.pages)
+            for page_no, page in enumerate(reader.pages, 1):
+                text = page.extract_text() or ""
+                for line in text.splitlines(keepends=True):
+                    yield line
+                yield "\n"
+                # PDF按页估算进度
+                job["bytes_read"] = int(job["bytes_total"] * page_no / max(total_pages, 1))
+            return
+
+        with open(file_path, "r", encoding="utf-8-sig", errors="replace") as f:
+            while True:
+                line = f.readline(_MAX_LINE_LENGTH)
+                if not line:
+                    break
+                job["bytes_read"] += len(line.encode("utf-8"))
+                yield line
+
+    async def _aiter_lines(self, file_path: str, filename: str, job: Dict) -> AsyncIterator[str]:
+        """在线程中分批读取文档（文件读取和PDF解析不阻塞事件循环）"""
+        lines = self._iter_lines(file_path, filename, job)
+        while True:
+            block = await asyncio.to_thread(list, itertools.islice(lines, _LINES_PER_READ))
+            if not block:
+                return
+            for line in block:
+                yield line
+
+    async def _run_job(
+        self,
+        job: Dict,
+        file_path: str,
+        category: Optional[str],
+        source: str
+    ):
+        """执行导入任务：分块 → 批量向量化 → 批量写入Milvus与PostgreSQL"""
+        job["status"] = "running"
+        title = os.path.splitext(job["filename"])[0]
+        chunker = TextChunker(self.chunk_size, self.chunk_overlap)
+        batch: List[Dict[str, str]] = []
+
+        try:
+            if milvus_service is None:
+                raise RuntimeError("Milvus服务不可用")
+
+            async for line in self._aiter_lines(file_path, job["filename"], job):
+                for chunk in chunker.feed(line):
+                    batch.append(chunk)
+                    if len(batch) >= self.batch_size:
+                        await self._insert_batch(job, batch, title, category, source)
+                        batch = []
+            batch.extend(chunker.flush())
+            if batch:
+                await self._insert_batch(job, batch, title, category, source)
+
+            job["status"] = "completed"
+            job["bytes_read"] = job["bytes_total"]
+            logger.info(f"文档导入完成: {job['filename']}, 共{job['chunks_inserted']}个片段")
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            logger.error(f"文档导入失败: {job['filename']}, error={e}")
+        finally:
+            job["finished_at"] = time.time()
+            job["progress"] = round(job["bytes_read"] / max(job["bytes_total"], 1), 4)
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+    async def _insert_batch(
+        self,
+        job: Dict,
+        batch: List[Dict[str, str]],
+        title: str,
+        category: Optional[str],
+        source: str
+    ):
+        """向量化并写入一批片段（单个事务）"""
+        start_index = job["chunks_processed"]
+        questions = []
+        for i, chunk in enumerate(batch, start_index + 1):
+            label = f"{title} - {chunk['heading']}" if chunk["heading"] else title
+            questions.append(f"{label}（第{i}段）")
+
+        # 1. 批量向量化（带标题，提升检索相关性）
+        texts = [
+            f"{chunk['heading']}\n{chunk['text']}" if chunk["heading"] else chunk["text"]
+            for chunk in batch
+        ]
+        embeddings = await embedding_service.get_embeddings_batch(texts)
+
+        async with AsyncSessionLocal() as db:
+            milvus_ids = []
+            try:
+                # 2. 批量创建数据库记录（获取ID）
+                rows = [
+                    Knowledge(
+                        question=question,
+                        answer=chunk["text"],
+                        category=category,
+                        source=source,
+                        status=1
+                    )
+                    for question, chunk in zip(questions, batch)
+                ]
+                db.add_all(rows)
+                await db.flush()
+
+                # 3. 批量写入Milvus并回填milvus_id
+                milvus_ids = await milvus_service.insert_batch([row.id for row in rows], embeddings)
+                for row, milvus_id in zip(rows, milvus_ids):
+                    row.milvus_id = milvus_id
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                # 数据库写入失败时清理已插入的向量，避免孤立数据
+                if milvus_ids:
+                    await milvus_service.delete_batch(milvus_ids)
+                raise
+
+        job["chunks_processed"] += len(batch)
+        job["chunks_inserted"] += len(batch)
+        job["progress"] = round(job["bytes_read"] / max(job["bytes_total"], 1), 4)
+        logger.debug(f"文档导入进度: {job['filename']}, 已写入{job['chunks_inserted']}个片段, 进度={job['progress']:.0%}")
+
+
+# 创建全局实例
+ingestion_service = IngestionService()
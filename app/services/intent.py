@@ -0,0 +1,192 @@
+"""意图识别服务 - 基于问题向量的本地分类，低置信度时回退到LLM"""
+import os
+import json
+import time
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from .embedding import embedding_service
+from .llm import llm_service, INTENT_LABELS
+from loguru import logger
+
+settings = get_settings()
+
+
+class CentroidIntentClassifier:
+    """最近质心意图分类器
+
+    每个意图类别取训练样本（归一化向量）的均值作为质心，
+    预测时计算问题向量与各质心的余弦相似度，经softmax得到置信度。
+    """
+
+    # softmax温度：余弦相似度差异较小，需放大后再归一化
+    DEFAULT_TEMPERATURE = 0.05
+
+    def __init__(
+        self,
+        labels: List[str],
+        centroids: np.ndarray,
+        temperature: float = DEFAULT_TEMPERATURE,
+        meta: Optional[Dict] = None
+    ):
+        self.labels = labels
+        self.centroids = centroids
+        self.temperature = temperature
+        self.meta = meta or {}
+
+    @classmethod
+    def fit(
+        cls,
+        embeddings: np.ndarray,
+        labels: List[str],
+        temperature: float = DEFAULT_TEMPERATURE
+    ) -> "CentroidIntentClassifier":
+        """训练分类器
+
+        Args:
+            embeddings: 样本向量矩阵 (n, dim)，应已归一化
+            labels: 样本标签
+            temperature: softmax温度
+
+        Returns:
+            分类器
+        """
+        label_array = np.array(labels)
+        classes = [label for label in INTENT_LABELS if label in set(labels)]
+        centroids = []
+        for label in classes:
+            centroid = embeddings[label_array == label].mean(axis=0)
+            centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+        return cls(
+            classes,
+            np.vstack(centroids).astype(np.float32),
+            temperature,
+            meta={"samples": {label: int((label_array == label).sum()) for label in classes}}
+        )
+
+    def predict_proba(self, embeddings: np.ndarray) -> np.ndarray:
+        """计算各类别概率 (n, n_classes)"""
+        scores = embeddings @ self.centroids.T / self.temperature
+        scores -= scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, embedding: List[float]) -> Tuple[str, float]:
+        """预测单个问题的意图
+
+        Returns:
+            (意图类别, 置信度)
+        """
+        proba = self.predict_proba(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+        index = int(proba.argmax())
+        return self.labels[index], float(proba[index])
+
+    def save(self, path: str):
+        """保存模型到JSON文件"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "labels": self.labels,
+                "centroids": self.centroids.tolist(),
+                "temperature": self.temperature,
+                "meta": self.meta,
+            }, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "CentroidIntentClassifier":
+        """从JSON文件加载模型"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            data["labels"],
+            np.asarray(data["centroids"], dtype=np.float32),
+            data.get("temperature", cls.DEFAULT_TEMPERATURE),
+            data.get("meta")
+        )
+
+
+class IntentService:
+    """意图识别服务"""
+
+    def __init__(self):
+        self.threshold = settings.INTENT_CONFIDENCE_THRESHOLD
+        self.classifier: Optional[CentroidIntentClassifier] = None
+        self.load_model(settings.INTENT_MODEL_PATH)
+
+    def load_model(self, path: str):
+        """加载本地分类模型（文件不存在时仅使用LLM识别）"""
+        if not os.path.exists(path):
+            logger.info(f"未找到意图分类模型({path})，意图识别将使用LLM")
+            return
+        try:
+            self.classifier = CentroidIntentClassifier.load(path)
+            logger.info(f"已加载意图分类模型: {path}, 类别={self.classifier.labels}")
+        except Exception as e:
+            logger.error(f"加载意图分类模型失败: {e}")
+
+    def classify_local(self, embedding: List[float]) -> Optional[Tuple[str, float]]:
+        """仅使用本地分类器识别意图
+
+        Returns:
+            (意图类别, 置信度)，未加载模型时返回None
+        """
+        if self.classifier is None:
+            return None
+        return self.classifier.predict(embedding)
+
+    def confident_local(self, embedding: Optional[List[float]]) -> Optional[str]:
+        """本地分类器达到置信度阈值时返回意图，否则返回None（供模型路由等快速判断使用）"""
+        if embedding is None:
+            return None
+        try:
+            result = self.classify_local(embedding)
+        except Exception as e:
+            logger.warning(f"本地意图识别失败: {e}")
+            return None
+        if result is None or result[1] < self.threshold:
+            return None
+        return result[0]
+
+    async def resolve(self, message: str, embedding: Optional[List[float]] = None) -> Optional[str]:
+        """获取响应中返回的意图
+
+        同步模式下等同于detect；延迟模式下只使用本地分类器的高置信度结果（不调用LLM），
+        其余返回None，由后台标注任务补全。
+        """
+        if settings.INTENT_DETECTION_MODE == "deferred":
+            return self.confident_local(embedding)
+        return await self.detect(message, embedding)
+
+    async def detect(self, message: str, embedding: Optional[List[float]] = None) -> str:
+        """识别用户意图
+
+        优先使用本地分类器（复用已计算的问题向量），置信度不足时回退到LLM。
+
+        Args:
+            message: 用户消息
+            embedding: 问题向量（已计算时传入，避免重复向量化）
+
+        Returns:
+            意图类别
+        """
+        if self.classifier is not None:
+            try:
+                if embedding is None:
+                    embedding = await embedding_service.get_embedding(message)
+                start = time.perf_counter()
+                label, confidence = self.classifier.predict(embedding)
+                metrics.observe("intent.local_ms", (time.perf_counter() - start) * 1000)
+                if confidence >= self.threshold:
+                    metrics.incr("intent.local")
+                    return label
+                logger.debug(f"本地意图置信度不足({label}, {confidence:.2f})，回退到LLM")
+            except Exception as e:
+                logger.warning(f"本地意图识别失败，回退到LLM: {e}")
+
+        metrics.incr("intent.llm")
+        return await llm_service.detect_intent(message)
+
+
+# 创建全局实例
+intent_service = IntentService()
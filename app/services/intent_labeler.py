@@ -0,0 +1,127 @@
+"""后台意图标注 - 为intent为空的对话批量补全意图（不占用问答响应时间）"""
+import asyncio
+from typing import Dict, List, Optional
+from sqlalchemy import select, update
+from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import metrics
+from app.models import Conversation
+from .embedding import embedding_service
+from .intent import intent_service
+from .llm import llm_service
+from loguru import logger
+
+settings = get_settings()
+
+
+class IntentLabeler:
+    """后台意图标注任务
+
+    INTENT_DETECTION_MODE=deferred 时对话以 intent=NULL 保存，本任务定期：
+    1. 取出一批未标注的对话
+    2. 批量向量化后用本地分类器标注高置信度的问题
+    3. 其余问题每 INTENT_LABEL_PROMPT_SIZE 个合并为一次LLM请求标注
+    4. 一次批量UPDATE写回 conversation_history
+    """
+
+    def __init__(self):
+        self.interval = settings.INTENT_LABEL_INTERVAL
+        self.batch_size = settings.INTENT_LABEL_BATCH_SIZE
+        self.prompt_size = settings.INTENT_LABEL_PROMPT_SIZE
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        """标注一批对话
+
+        Returns:
+            本轮标注的对话数
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Conversation.id, Conversation.user_message)
+                .where(Conversation.intent.is_(None))
+                .order_by(Conversation.id)
+                .limit(self.batch_size)
+            )
+            rows = result.all()
+        if not rows:
+            return 0
+
+        intents = await self._label([row.user_message for row in rows])
+        updates = [
+            {"id": row.id, "intent": intent}
+            for row, intent in zip(rows, intents)
+            if intent is not None
+        ]
+        if updates:
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(Conversation), updates)
+                await db.commit()
+
+        metrics.incr("intent_labeler.labeled", len(updates))
+        logger.info(f"后台意图标注: 待标注{len(rows)}条，已标注{len(updates)}条")
+        return len(updates)
+
+    async def _label(self, messages: List[str]) -> List[Optional[str]]:
+        """识别一批问题的意图（本地分类器优先，其余合并请求LLM）"""
+        intents: List[Optional[str]] = [None] * len(messages)
+
+        if intent_service.classifier is not None:
+            embeddings = await embedding_service.get_embeddings_batch(messages)
+            for i, embedding in enumerate(embeddings):
+                intents[i] = intent_service.confident_local(embedding)
+
+        pending = [i for i, intent in enumerate(intents) if intent is None]
+        local_count = len(messages) - len(pending)
+        # 相同问题只请求一次
+        unique: Dict[str, List[int]] = {}
+        for i in pending:
+            unique.setdefault(messages[i], []).append(i)
+        questions = list(unique)
+
+        for start in range(0, len(questions), self.prompt_size):
+            chunk = questions[start:start + self.prompt_size]
+            try:
+                labels = await llm_service.detect_intents_batch(chunk)
+            except Exception as e:
+                # 本轮跳过，下一轮重试
+                logger.warning(f"后台意图标注LLM请求失败: {e}")
+                continue
+            for question, label in zip(chunk, labels):
+                for i in unique[question]:
+                    # 模型漏掉的问题归为"其他"，避免反复重试同一批
+                    intents[i] = label or "其他"
+
+        metrics.incr("intent_labeler.local", local_count)
+        return intents
+
+    async def _loop(self):
+        while True:
+            try:
+                labeled = await self.run_once()
+            except Exception as e:
+                logger.error(f"后台意图标注失败: {e}")
+                labeled = 0
+            # 本轮标注满一批说明还有积压，立即继续
+            if labeled < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+    def start(self):
+        """启动后台标注任务（在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="intent_labeler")
+            logger.info("后台意图标注任务已启动")
+
+    async def stop(self):
+        """停止后台标注任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# 创建全局实例
+intent_labeler = IntentLabeler()
@@ -1,112 +1,353 @@
 """LLM对话服务"""
+import re
 import ollama
-from typing import List, Dict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from app.core.config import get_settings
+from app.core.metrics import metrics
+from .context_packer import estimate_messages_tokens
+from .concurrency import ollama_scheduler
+from .ollama_pool import ollama_pool
+from .session import session_store
+from .cache import response_cache
+from .model_router import model_router
 from loguru import logger
 
 settings = get_settings()
 
+# 置信度达到该值时严格基于知识库回答
+KNOWLEDGE_BASE_CONFIDENCE = 0.6
+
+# 系统提示词（所有请求共用，保持不变以便命中提示词前缀缓存）
+SYSTEM_PROMPT = """你是一个专业的智能客服助手，既可以回答客服业务问题，也可以进行日常对话。
+
+回答规则：
+1. 用户消息中提供了知识库内容时，按消息中的要求使用知识库
+2. 知识库中没有相关内容时，使用你的通用知识友好地回答
+3. 回答要准确、自然、有帮助，保持简洁明了
+4. 保持专业但不失亲和力
+"""
+
+# 意图类别
+INTENT_LABELS = ["产品咨询", "售后服务", "订单查询", "投诉建议", "闲聊", "其他"]
+
+# qwen3等推理模型输出的思考过程
+_THINK_PATTERN = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+# 批量意图识别的输出行（"序号. 类别"）
+_NUMBERED_LINE_PATTERN = re.compile(r"^\s*(\d+)\s*[.、:：)）]\s*(.+?)\s*$", re.MULTILINE)
+
 
 class LLMService:
     """LLM对话服务类"""
     
     def __init__(self):
         self.model = settings.OLLAMA_MODEL
-        self.base_url = settings.OLLAMA_BASE_URL
+        # Ollama后端池（多节点负载均衡，每个节点一个共享的异步客户端）
+        self.pool = ollama_pool
+        # 所有Ollama请求经优先级调度器排队，在线问答优先于后台任务，排队满则快速失败
+        self.scheduler = ollama_scheduler
+        # 大/小模型路由，以及各模型在途+排队的请求数（用于负载分流）
+        self.router = model_router
+        self.pending: Dict[str, int] = {}
+        metrics.register_source("llm.pending", lambda: dict(self.pending))
     
-    async def generate_answer(
+    @asynccontextmanager
+    async def _slot(
+        self,
+        model: str,
+        priority: str,
+        affinity: Optional[str] = None
+    ) -> AsyncIterator[ollama.AsyncClient]:
+        """按优先级获取执行名额并选择Ollama节点，同时按模型统计在途+排队的请求数
+        
+        Args:
+            model: 模型名
+            priority: 调度优先级
+            affinity: 节点亲和键（session_id，同一会话尽量落在同一节点以复用前缀缓存）
+        """
+        self.pending[model] = self.pending.get(model, 0) + 1
+        try:
+            async with self.scheduler.slot(priority):
+                async with self.pool.client(model, affinity) as client:
+                    yield client
+        finally:
+            self.pending[model] -= 1
+    
+    def _route(self, question: str, context: str, answer_source: str, intent: Optional[str]) -> str:
+        """选择生成答案的模型"""
+        model, reason = self.router.route(
+            question,
+            answer_source,
+            intent=intent,
+            has_context=bool(context.strip()),
+            large_pending=self.pending.get(self.model, 0)
+        )
+        logger.debug(f"模型路由: {model} ({reason})")
+        return model
+    
+    @staticmethod
+    def answer_mode(confidence: float) -> str:
+        """根据置信度判断回答模式（knowledge_base 或 general_ai）"""
+        return "knowledge_base" if confidence >= KNOWLEDGE_BASE_CONFIDENCE else "general_ai"
+    
+    def _build_messages(
         self,
         question: str,
         context: str,
         history: List[Dict[str, str]] = None,
         confidence: float = 0.0
-    ) -> tuple[str, str]:
-        """生成答案
+    ) -> Tuple[List[Dict[str, str]], str]:
+        """构建对话消息列表
+        
+        系统提示词对所有请求保持不变，回答策略写在用户消息中，
+        这样 [系统提示词 + 会话历史] 前缀在多轮对话间保持稳定，可命中Ollama的前缀缓存。
         
-        Args:
-            question: 用户问题
-            context: 从知识库检索到的上下文
-            history: 对话历史
-            confidence: 知识库匹配置信度
-            
         Returns:
-            (生成的答案, 答案来源标识)
+            (消息列表, 答案来源标识)
         """
-        try:
-            # 根据置信度调整回答策略
-            if confidence >= 0.6:
-                # 高置信度：严格基于知识库
-                system_prompt = """你是一个专业的智能客服助手。请严格根据提供的知识库内容回答用户问题。
-
-回答规则：
-1. 必须基于知识库内容回答
-2. 回答要准确、专业、友好
-3. 保持回答简洁明了
-"""
-                user_prompt = f"""知识库内容：
+        # 根据置信度调整回答策略
+        if self.answer_mode(confidence) == "knowledge_base":
+            # 高置信度：严格基于知识库
+            user_prompt = f"""知识库内容：
 {context}
 
 用户问题：{question}
 
-请严格根据上述知识库内容回答问题。"""
-                answer_source = "knowledge_base"
-                
-            else:
-                # 低置信度：允许通用回答
-                system_prompt = """你是一个智能AI助手，既可以回答专业客服问题，也可以进行日常对话。
-
-回答规则：
-1. 如果知识库中有相关内容，优先参考使用
-2. 如果知识库中没有，使用你的通用知识友好地回答
-3. 回答要自然、有帮助、友好
-4. 保持专业但不失亲和力
-"""
-                
-                if context.strip():
-                    user_prompt = f"""参考知识库（可能相关度不高）：
+请严格根据上述知识库内容回答问题，回答必须基于知识库内容。"""
+            answer_source = "knowledge_base"
+            
+        else:
+            # 低置信度：允许通用回答
+            if context.strip():
+                user_prompt = f"""参考知识库（可能相关度不高）：
 {context}
 
 用户问题：{question}
 
 请回答用户问题。如果知识库内容相关，可以参考；如果不相关，请直接根据问题本身回答。"""
-                else:
-                    user_prompt = f"""用户问题：{question}
+            else:
+                user_prompt = f"""用户问题：{question}
 
 请友好地回答用户问题。"""
-                
-                answer_source = "general_ai"
             
-            # 构建消息列表
-            messages = [
-                {"role": "system", "content": system_prompt}
-            ]
+            answer_source = "general_ai"
+        
+        # 构建消息列表（历史已由session_store按轮数/token预算裁剪）
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            *(history or []),
+            {"role": "user", "content": user_prompt}
+        ]
+        
+        return messages, answer_source
+    
+    def _options(self, answer_source: str) -> Dict:
+        """生成参数（知识库模式使用较低温度）"""
+        temperature = (
+            settings.LLM_TEMPERATURE_KNOWLEDGE_BASE
+            if answer_source == "knowledge_base"
+            else settings.LLM_TEMPERATURE_GENERAL
+        )
+        return {"num_ctx": settings.OLLAMA_NUM_CTX, "temperature": temperature}
+    
+    def _usage(self, response, messages: List[Dict[str, str]]) -> Dict[str, int]:
+        """提取token用量
+        
+        命中前缀缓存时Ollama的prompt_eval_count只统计新计算的token，
+        cached_prompt_tokens为按估算推得的复用部分。
+        """
+        estimated = estimate_messages_tokens(messages)
+        prompt_eval = response.get("prompt_eval_count")
+        return {
+            "prompt_tokens": prompt_eval if prompt_eval is not None else estimated,
+            "cached_prompt_tokens": max(0, estimated - prompt_eval) if prompt_eval is not None else 0,
+            "completion_tokens": response.get("eval_count") or 0,
+        }
+    
+    @staticmethod
+    def _cached_usage() -> Dict[str, int]:
+        """命中响应缓存时的token用量（未调用模型）"""
+        return {"prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+    
+    async def generate_answer(
+        self,
+        question: str,
+        context: str,
+        history: List[Dict[str, str]] = None,
+        confidence: float = 0.0,
+        session_id: Optional[str] = None,
+        use_cache: bool = True,
+        intent: Optional[str] = None,
+        priority: str = "interactive"
+    ) -> tuple[str, str, Dict[str, int]]:
+        """生成答案
+        
+        Args:
+            question: 用户问题
+            context: 从知识库检索到的上下文（应已由context_packer按预算打包）
+            history: 对话历史（未传入且提供session_id时使用会话历史）
+            confidence: 知识库匹配置信度
+            session_id: 会话ID（提供时读取并追加会话历史）
+            use_cache: 是否使用响应缓存（温度过高时自动跳过）
+            intent: 已知意图（用于模型路由，闲聊走小模型）
+            priority: 调度优先级
             
-            # 添加历史对话
-            if history:
-                for msg in history[-settings.MAX_CONTEXT_TURNS:]:
-                    messages.append(msg)
+        Returns:
+            (生成的答案, 答案来源标识, token用量)
+            token用量: {"prompt_tokens": 新计算的提示词token数, "cached_prompt_tokens": 复用缓存的token数, "completion_tokens": 生成token数}
+        """
+        try:
+            if history is None and session_id:
+                history = session_store.get_history(session_id)
+            messages, answer_source = self._build_messages(question, context, history, confidence)
+            options = self._options(answer_source)
+            model = self._route(question, context, answer_source, intent)
             
-            # 添加当前问题
-            messages.append({"role": "user", "content": user_prompt})
+            cache_key = None
+            if use_cache and response_cache.cacheable(options):
+                cache_key = response_cache.make_key("chat", model, messages, options)
+                cached = await response_cache.get(cache_key)
+                if cached is not None:
+                    if session_id:
+                        session_store.append(session_id, messages[-1]["content"], cached["answer"])
+                    logger.info(f"LLM响应缓存命中: 模式={answer_source}")
+                    return cached["answer"], answer_source, self._cached_usage()
             
-            # 调用LLM
-            response = ollama.chat(
-                model=self.model,
-                messages=messages
-            )
+            # 调用LLM（keep_alive保证会话期间模型及其KV缓存常驻）
+            async with self._slot(model, priority, session_id) as client:
+                response = await client.chat(
+                    model=model,
+                    messages=messages,
+                    options=options,
+                    keep_alive=settings.SESSION_TIMEOUT
+                )
             
             answer = response["message"]["content"]
-            return answer, answer_source
+            if session_id:
+                session_store.append(session_id, messages[-1]["content"], answer)
+            if cache_key:
+                await response_cache.set(cache_key, {"answer": answer})
+            
+            usage = self._usage(response, messages)
+            logger.info(f"LLM生成完成: 模型={model}, 模式={answer_source}, prompt_tokens={usage['prompt_tokens']}, cached={usage['cached_prompt_tokens']}, completion_tokens={usage['completion_tokens']}")
+            return answer, answer_source, usage
             
         except Exception as e:
             logger.error(f"LLM生成答案失败: {e}")
             raise
     
-    async def detect_intent(self, question: str) -> str:
+    async def stream_answer(
+        self,
+        question: str,
+        context: str,
+        history: List[Dict[str, str]] = None,
+        confidence: float = 0.0,
+        session_id: Optional[str] = None,
+        use_cache: bool = True,
+        intent: Optional[str] = None,
+        priority: str = "interactive"
+    ) -> AsyncIterator[Dict]:
+        """流式生成答案（逐token返回）
+        
+        调用方提前关闭生成器（aclose）时会断开与Ollama的连接，Ollama随之停止生成。
+        生成期间一直占用一个并发名额。生成完整结束后才追加会话历史和写入缓存；
+        命中缓存时一次性返回完整答案。
+        
+        Args:
+            question: 用户问题
+            context: 上下文（应已由context_packer按预算打包）
+            history: 对话历史（未传入且提供session_id时使用会话历史）
+            confidence: 知识库匹配置信度
+            session_id: 会话ID（提供时读取并追加会话历史）
+            use_cache: 是否使用响应缓存（温度过高时自动跳过）
+            intent: 已知意图（用于模型路由，闲聊走小模型）
+            priority: 调度优先级
+            
+        Yields:
+            {"content": 文本片段, "done": False}
+            最后一条为 {"content": "", "done": True, "answer_source": 答案来源, "usage": token用量}
+        """
+        if history is None and session_id:
+            history = session_store.get_history(session_id)
+        messages, answer_source = self._build_messages(question, context, history, confidence)
+        options = self._options(answer_source)
+        model = self._route(question, context, answer_source, intent)
+        
+        cache_key = None
+        if use_cache and response_cache.cacheable(options):
+            cache_key = response_cache.make_key("chat", model, messages, options)
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                if session_id:
+                    session_store.append(session_id, messages[-1]["content"], cached["answer"])
+                logger.info(f"LLM响应缓存命中: 模式={answer_source}")
+                yield {"content": cached["answer"], "done": False}
+                yield {"content": "", "done": True, "answer_source": answer_source, "usage": self._cached_usage()}
+                return
+        
+        async with self._slot(model, priority, session_id) as client:
+            stream = await client.chat(
+                model=model,
+                messages=messages,
+                stream=True,
+                options=options,
+                keep_alive=settings.SESSION_TIMEOUT
+            )
+            parts = []
+            try:
+                async for part in stream:
+                    if part.get("done"):
+                        answer = "".join(parts)
+                        if session_id:
+                            session_store.append(session_id, messages[-1]["content"], answer)
+                        if cache_key:
+                            await response_cache.set(cache_key, {"answer": answer})
+                        usage = self._usage(part, messages)
+                        logger.info(f"LLM流式生成完成: 模型={model}, 模式={answer_source}, prompt_tokens={usage['prompt_tokens']}, cached={usage['cached_prompt_tokens']}, completion_tokens={usage['completion_tokens']}")
+                        yield {"content": "", "done": True, "answer_source": answer_source, "usage": usage}
+                        return
+                    content = part["message"]["content"]
+                    if content:
+                        parts.append(content)
+                        yield {"content": content, "done": False}
+            finally:
+                await stream.aclose()
+    
+    async def polish_answer(self, question: str, answer: str) -> str:
+        """将知识库标准答案润色为面向用户的回答（离线预生成使用，固定使用大模型）
+        
+        Args:
+            question: 标准问题
+            answer: 标准答案
+            
+        Returns:
+            润色后的答案
+        """
+        prompt = f"""请将下面的客服知识库标准答案改写为直接回复用户的答案。
+
+要求：
+1. 只能使用标准答案中的信息，不得增加、删减或改变任何事实
+2. 语气友好自然，表达清晰，保持简洁
+3. 直接输出答案内容，不要输出其他说明
+
+标准问题：{question}
+标准答案：{answer}"""
+        
+        async with self._slot(self.model, "background") as client:
+            response = await client.chat(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                options={"temperature": settings.LLM_TEMPERATURE_KNOWLEDGE_BASE}
+            )
+        return _THINK_PATTERN.sub("", response["message"]["content"]).strip()
+    
+    async def detect_intent(self, question: str, use_cache: bool = True) -> str:
         """检测用户意图
         
         Args:
             question: 用户问题
+            use_cache: 是否使用响应缓存
             
         Returns:
             意图类别
@@ -126,17 +367,79 @@ class LLMService:
 
 类别："""
             
-            response = ollama.generate(
-                model=self.model,
-                prompt=prompt
-            )
+            # 分类任务使用确定性输出，结果可缓存；由小模型处理
+            options = {"temperature": 0}
+            model = self.router.intent_model()
+            cache_key = None
+            if use_cache and response_cache.cacheable(options):
+                cache_key = response_cache.make_key(
+                    "generate", model, [{"role": "user", "content": prompt}], options
+                )
+                cached = await response_cache.get(cache_key)
+                if cached is not None:
+                    return cached["intent"]
+            
+            async with self._slot(model, "intent") as client:
+                response = await client.generate(
+                    model=model,
+                    prompt=prompt,
+                    options=options
+                )
             
-            intent = response["response"].strip()
+            intent = self.normalize_intent(response["response"])
+            if cache_key:
+                await response_cache.set(cache_key, {"intent": intent})
             return intent
             
         except Exception as e:
             logger.error(f"意图识别失败: {e}")
             return "其他"
+    
+    async def detect_intents_batch(self, questions: List[str]) -> List[Optional[str]]:
+        """批量检测意图（一次请求识别多个问题，用于后台标注）
+        
+        Args:
+            questions: 用户问题列表
+            
+        Returns:
+            与questions一一对应的意图类别，模型未给出结果的位置为None
+        """
+        numbered = "\n".join(
+            f"{i}. {' '.join(question.split())}" for i, question in enumerate(questions, 1)
+        )
+        prompt = f"""请判断以下每个用户问题属于哪个类别。
+
+类别：{"、".join(INTENT_LABELS)}
+
+用户问题：
+{numbered}
+
+每行输出一个结果，格式为"序号. 类别"，不要其他内容："""
+        
+        model = self.router.intent_model()
+        async with self._slot(model, "background") as client:
+            response = await client.generate(
+                model=model,
+                prompt=prompt,
+                options={"temperature": 0}
+            )
+        
+        intents: List[Optional[str]] = [None] * len(questions)
+        text = _THINK_PATTERN.sub("", response["response"] or "")
+        for match in _NUMBERED_LINE_PATTERN.finditer(text):
+            index = int(match.group(1)) - 1
+            if 0 <= index < len(questions):
+                intents[index] = self.normalize_intent(match.group(2))
+        return intents
+    
+    @staticmethod
+    def normalize_intent(text: str) -> str:
+        """将模型输出规整为标准意图类别（去除思考过程，未识别时归为"其他"）"""
+        text = _THINK_PATTERN.sub("", text or "").strip()
+        for label in INTENT_LABELS:
+            if label in text:
+                return label
+        return "其他"
 
 
 # 创建全局实例
@@ -0,0 +1,109 @@
+"""
+安全的数学表达式求值
+
+解析为 AST 后只允许数字、四则运算、幂、取模和白名单中的数学函数，
+不使用 eval，表达式中无法访问任何变量或内置函数。
+"""
+
+import ast
+import math
+import operator
+from typing import Callable, Dict, Union
+
+Number = Union[int, float]
+
+# 允许的二元运算
+_BINARY_OPERATORS: Dict[type, Callable] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+# 允许的一元运算
+_UNARY_OPERATORS: Dict[type, Callable] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+# 允许的数学函数
+FUNCTIONS: Dict[str, Callable] = {
+    "abs": abs, "round": round,
+    "sqrt": math.sqrt, "pow": math.pow,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "log": math.log, "log10": math.log10,
+    "exp": math.exp,
+}
+
+# 允许的常量
+CONSTANTS: Dict[str, float] = {"pi": math.pi, "e": math.e}
+
+# 幂运算结果的位数上限（避免 9**9**9 之类的表达式耗尽CPU和内存）
+MAX_POWER_DIGITS = 1000
+
+# 计算结果（整数）的位数上限：多个大数相乘可能超过幂运算的检查，
+# 且超过 4300 位的整数无法转换为字符串
+MAX_RESULT_DIGITS = 1000
+
+# 表达式长度上限
+MAX_LENGTH = 200
+
+
+def safe_eval(expression: str) -> Number:
+    """
+    计算数学表达式
+
+    Args:
+        expression: 数学表达式，如 "3*7+2"、"sqrt(16)"、"2^10"（^ 视为幂运算）
+
+    Returns:
+        计算结果
+
+    Raises:
+        ValueError: 表达式不合法或包含不允许的内容
+        ZeroDivisionError / OverflowError: 计算出错
+    """
+    if len(expression) > MAX_LENGTH:
+        raise ValueError("表达式过长")
+    try:
+        tree = ast.parse(expression.replace("^", "**"), mode="eval")
+    except SyntaxError:
+        raise ValueError(f"无法解析表达式: {expression}")
+    return _eval(tree.body)
+
+
+def _check_size(value: Number) -> Number:
+    """整数结果超过 MAX_RESULT_DIGITS 位时拒绝（按二进制位数估算，无需转换为字符串）"""
+    if isinstance(value, int) and value.bit_length() * math.log10(2) > MAX_RESULT_DIGITS:
+        raise ValueError("结果过大")
+    return value
+
+
+def _eval(node: ast.AST) -> Number:
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        left, right = _eval(node.left), _eval(node.right)
+        if isinstance(node.op, ast.Pow) and abs(left) > 1 and abs(right) * math.log10(abs(left)) > MAX_POWER_DIGITS:
+            raise ValueError("结果过大")
+        return _check_size(_BINARY_OPERATORS[type(node.op)](left, right))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        return _UNARY_OPERATORS[type(node.op)](_eval(node.operand))
+
+    if isinstance(node, ast.Name) and node.id in CONSTANTS:
+        return CONSTANTS[node.id]
+
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in FUNCTIONS
+        and not node.keywords
+    ):
+        return FUNCTIONS[node.func.id](*(_eval(arg) for arg in node.args))
+
+    raise ValueError("表达式包含不支持的内容")
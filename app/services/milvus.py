@@ -1,4 +1,5 @@
 """Milvus向量检索服务"""
+import asyncio
 from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility
 from typing import List, Dict, Tuple
 from app.core.config import get_settings
@@ -64,6 +65,17 @@ class MilvusService:
             logger.error(f"初始化集合失败: {e}")
             raise
     
+    def _insert_sync(self, knowledge_ids: List[int], embeddings: List[List[float]]) -> List[int]:
+        """写入向量并flush（同步调用，在线程中执行）"""
+        result = self.collection.insert([knowledge_ids, embeddings])
+        self.collection.flush()
+        return list(result.primary_keys)
+    
+    def _delete_sync(self, expr: str):
+        """删除向量并flush（同步调用，在线程中执行）"""
+        self.collection.delete(expr)
+        self.collection.flush()
+    
     async def insert(self, knowledge_id: int, embedding: List[float]) -> int:
         """插入向量
         
@@ -75,17 +87,27 @@ class MilvusService:
             Milvus ID
         """
         try:
-            data = [
-                [knowledge_id],
-                [embedding]
-            ]
-            result = self.collection.insert(data)
-            self.collection.flush()
-            return result.primary_keys[0]
+            return (await asyncio.to_thread(self._insert_sync, [knowledge_id], [embedding]))[0]
         except Exception as e:
             logger.error(f"插入向量失败: {e}")
             raise
     
+    async def insert_batch(self, knowledge_ids: List[int], embeddings: List[List[float]]) -> List[int]:
+        """批量插入向量（一次写入、一次flush，在线程中执行，不阻塞事件循环）
+        
+        Args:
+            knowledge_ids: 知识库ID列表
+            embeddings: 向量列表（与knowledge_ids一一对应）
+            
+        Returns:
+            Milvus ID列表
+        """
+        try:
+            return await asyncio.to_thread(self._insert_sync, knowledge_ids, embeddings)
+        except Exception as e:
+            logger.error(f"批量插入向量失败: {e}")
+            raise
+    
     async def search(self, embedding: List[float], top_k: int = 5) -> List[Tuple[int, float]]:
         """搜索相似向量
         
@@ -122,12 +144,20 @@ class MilvusService:
     async def delete(self, milvus_id: int):
         """删除向量"""
         try:
-            expr = f"id == {milvus_id}"
-            self.collection.delete(expr)
-            self.collection.flush()
+            await asyncio.to_thread(self._delete_sync, f"id == {milvus_id}")
         except Exception as e:
             logger.error(f"删除向量失败: {e}")
             raise
+    
+    async def delete_batch(self, milvus_ids: List[int]):
+        """批量删除向量"""
+        if not milvus_ids:
+            return
+        try:
+            await asyncio.to_thread(self._delete_sync, f"id in {list(milvus_ids)}")
+        except Exception as e:
+            logger.error(f"批量删除向量失败: {e}")
+            raise
 
 
 # 创建全局实例
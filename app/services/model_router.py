@@ -0,0 +1,86 @@
+"""模型路由 - 按问题复杂度在小模型/大模型之间分配请求"""
+import re
+from typing import Optional, Tuple
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+settings = get_settings()
+
+# 需要多步推理/分析的问题特征
+_COMPLEX_PATTERN = re.compile(
+    r"为什么|怎么办|如何|步骤|流程|区别|对比|比较|分析|原因|计算|推荐|方案|优缺点|哪个好"
+)
+
+
+class ModelRouter:
+    """模型路由器
+
+    使用请求中已有的信号（知识库置信度、意图、问题长度）判断复杂度：
+    - 闲聊、意图识别、高置信度知识库改写 → 小模型
+    - 低置信度或多步推理问题 → 大模型
+    - 大模型排队过长时，非复杂问题改由小模型处理（负载分流）
+    """
+
+    def __init__(self):
+        self.large_model = settings.OLLAMA_MODEL
+        self.small_model = settings.OLLAMA_SMALL_MODEL
+        self.enabled = settings.MODEL_ROUTING_ENABLED and bool(self.small_model)
+        self.simple_max_chars = settings.MODEL_ROUTING_SIMPLE_MAX_CHARS
+        self.complex_min_chars = settings.MODEL_ROUTING_COMPLEX_MIN_CHARS
+        self.large_queue_threshold = settings.MODEL_ROUTING_LARGE_QUEUE_THRESHOLD
+
+    def is_complex(self, question: str) -> bool:
+        """是否为长问题或多步推理问题"""
+        return (
+            len(question) >= self.complex_min_chars
+            or bool(_COMPLEX_PATTERN.search(question))
+            or len(re.findall(r"[?？]", question)) > 1
+        )
+
+    def route(
+        self,
+        question: str,
+        answer_source: str,
+        intent: Optional[str] = None,
+        has_context: bool = True,
+        large_pending: int = 0
+    ) -> Tuple[str, str]:
+        """选择生成答案使用的模型
+
+        Args:
+            question: 用户问题
+            answer_source: 回答模式（knowledge_base 表示高置信度知识库改写）
+            intent: 意图（本地分类器已有高置信度结果时传入）
+            has_context: 是否带有检索上下文
+            large_pending: 大模型当前在途+排队的请求数
+
+        Returns:
+            (模型名, 路由原因)
+        """
+        if not self.enabled:
+            return self.large_model, "disabled"
+
+        if self.is_complex(question):
+            reason = "complex"
+        elif intent == "闲聊":
+            reason = "chitchat"
+        elif answer_source == "knowledge_base" and has_context:
+            reason = "paraphrase"
+        elif len(question) <= self.simple_max_chars and not has_context:
+            reason = "short"
+        elif large_pending >= self.large_queue_threshold:
+            reason = "load_shed"
+        else:
+            reason = "default"
+
+        model = self.small_model if reason in ("chitchat", "paraphrase", "short", "load_shed") else self.large_model
+        metrics.incr(f"llm.route.{reason}")
+        return model, reason
+
+    def intent_model(self) -> str:
+        """意图识别使用的模型"""
+        return self.small_model if self.enabled else self.large_model
+
+
+# 创建全局实例
+model_router = ModelRouter()
@@ -0,0 +1,205 @@
+"""Ollama后端池 - 在多个Ollama节点间负载均衡，并做健康检查与故障摘除"""
+import time
+import asyncio
+import ollama
+import httpx
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from loguru import logger
+
+try:
+    # LangChain的Ollama LLM使用aiohttp访问节点
+    import aiohttp
+    _AIOHTTP_ERRORS = (aiohttp.ClientConnectionError,)
+except ImportError:
+    _AIOHTTP_ERRORS = ()
+
+settings = get_settings()
+
+# 视为节点故障的异常（连接失败、超时）
+_CONNECTION_ERRORS = (httpx.TransportError, ConnectionError, asyncio.TimeoutError) + _AIOHTTP_ERRORS
+
+
+def _normalize_model(name: str) -> str:
+    """模型名补全默认标签（nomic-embed-text → nomic-embed-text:latest）"""
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaBackend:
+    """单个Ollama节点"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.client = ollama.AsyncClient(host=url, timeout=settings.OLLAMA_TIMEOUT)
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.ejected_until = 0.0
+        # 节点上已下载的模型 / 已加载到显存的模型（由健康检查刷新，为空表示未知）
+        self.available_models: Set[str] = set()
+        self.loaded_models: Set[str] = set()
+        self.last_check_ms: Optional[float] = None
+
+    def has_model(self, model: str) -> bool:
+        """节点是否有该模型（模型列表未知时视为有）"""
+        return not self.available_models or _normalize_model(model) in self.available_models
+
+    def snapshot(self) -> Dict:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+            "loaded_models": sorted(self.loaded_models),
+            "last_check_ms": self.last_check_ms,
+        }
+
+
+class OllamaBackendPool:
+    """Ollama后端池
+
+    - 按最少在途请求数选择节点；优先选择已加载目标模型的节点，其次是已下载该模型的节点
+    - 同一会话尽量落在同一节点，复用该节点上的提示词前缀缓存（节点负载明显更高时放弃亲和）
+    - 请求连续失败达到阈值的节点被摘除，摘除期满后由健康检查确认恢复再重新加入
+    - 健康检查定期刷新各节点的模型列表；检查超时或过慢的节点同样被摘除
+    - 所有节点都不可用时仍尝试全部节点（避免误摘除导致完全不可用）
+    """
+
+    # 会话亲和记录的最大条数
+    MAX_AFFINITY = 10000
+    # 亲和节点的在途请求数比最空闲节点多出该值时放弃亲和
+    AFFINITY_SLACK = 2
+
+    def __init__(self, urls: List[str]):
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.health_interval = settings.OLLAMA_HEALTH_CHECK_INTERVAL
+        self.slow_threshold = settings.OLLAMA_HEALTH_CHECK_SLOW
+        self.eject_failures = settings.OLLAMA_EJECT_FAILURES
+        self.eject_seconds = settings.OLLAMA_EJECT_SECONDS
+        self._affinity: "OrderedDict[str, OllamaBackend]" = OrderedDict()
+        self._health_task: Optional[asyncio.Task] = None
+        metrics.register_source("ollama.backends", self.snapshot)
+
+    def pick(self, model: str, affinity: Optional[str] = None) -> OllamaBackend:
+        """选择处理请求的节点
+
+        Args:
+            model: 模型名
+            affinity: 亲和键（如session_id），相同键尽量选择同一节点
+        """
+        candidates = [b for b in self.backends if b.healthy] or self.backends
+        with_model = [b for b in candidates if b.has_model(model)] or candidates
+        target = _normalize_model(model)
+        loaded = [b for b in with_model if target in b.loaded_models] or with_model
+        best = min(loaded, key=lambda b: b.outstanding)
+
+        if affinity is not None:
+            preferred = self._affinity.get(affinity)
+            if (
+                preferred is not None
+                and preferred in with_model
+                and preferred.outstanding <= best.outstanding + self.AFFINITY_SLACK
+            ):
+                best = preferred
+            self._affinity[affinity] = best
+            self._affinity.move_to_end(affinity)
+            if len(self._affinity) > self.MAX_AFFINITY:
+                self._affinity.popitem(last=False)
+        return best
+
+    @asynccontextmanager
+    async def client(self, model: str, affinity: Optional[str] = None) -> AsyncIterator[ollama.AsyncClient]:
+        """获取一个节点的客户端
+
+        用法：
+            async with ollama_pool.client(model) as client:
+                response = await client.chat(model=model, messages=messages)
+        """
+        async with self.backend(model, affinity) as backend:
+            yield backend.client
+
+    @asynccontextmanager
+    async def backend(self, model: str, affinity: Optional[str] = None) -> AsyncIterator[OllamaBackend]:
+        """选择一个节点，请求期间计入该节点的在途请求数，结束后记录结果"""
+        backend = self.pick(model, affinity)
+        backend.outstanding += 1
+        try:
+            yield backend
+        except _CONNECTION_ERRORS as e:
+            # 连接失败/超时属于节点故障
+            self._record_failure(backend, e)
+            raise
+        except ollama.ResponseError as e:
+            # 5xx视为节点故障；4xx（模型不存在、参数错误等）不计入
+            if e.status_code >= 500:
+                self._record_failure(backend, e)
+            raise
+        else:
+            backend.failures = 0
+        finally:
+            backend.outstanding -= 1
+
+    def _record_failure(self, backend: OllamaBackend, error: Exception):
+        backend.failures += 1
+        metrics.incr("ollama.backend_failures")
+        if backend.healthy and backend.failures >= self.eject_failures and len(self.backends) > 1:
+            self._eject(backend, f"连续失败{backend.failures}次: {error}")
+
+    def _eject(self, backend: OllamaBackend, reason: str):
+        backend.healthy = False
+        backend.ejected_until = time.time() + self.eject_seconds
+        metrics.incr("ollama.backend_ejections")
+        logger.warning(f"Ollama节点摘除: {backend.url}, 原因: {reason}")
+
+    async def check(self, backend: OllamaBackend):
+        """检查单个节点：刷新模型列表，按结果摘除或恢复"""
+        start = time.perf_counter()
+        try:
+            tags, running = await asyncio.wait_for(
+                asyncio.gather(backend.client.list(), backend.client.ps()),
+                timeout=self.slow_threshold
+            )
+        except Exception as e:
+            backend.last_check_ms = None
+            if backend.healthy and len(self.backends) > 1:
+                self._eject(backend, f"健康检查失败: {e!r}")
+            return
+
+        backend.last_check_ms = round((time.perf_counter() - start) * 1000, 1)
+        backend.available_models = {_normalize_model(m["model"]) for m in tags["models"]}
+        backend.loaded_models = {_normalize_model(m["model"]) for m in running["models"]}
+        if not backend.healthy and time.time() >= backend.ejected_until:
+            backend.healthy = True
+            backend.failures = 0
+            logger.info(f"Ollama节点恢复: {backend.url}")
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self.check(b) for b in self.backends))
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        """启动健康检查（在事件循环中调用）"""
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop(), name="ollama_health_check")
+            logger.info(f"Ollama后端池: {[b.url for b in self.backends]}")
+
+    async def stop(self):
+        """停止健康检查"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def snapshot(self) -> Dict:
+        """当前状态"""
+        return {b.url: b.snapshot() for b in self.backends}
+
+
+# 创建全局实例（未配置OLLAMA_BASE_URLS时只有OLLAMA_BASE_URL一个节点）
+ollama_pool = OllamaBackendPool(settings.OLLAMA_BASE_URLS or [settings.OLLAMA_BASE_URL])
@@ -0,0 +1,119 @@
+"""阶段图执行器 - 并发执行相互独立的处理阶段并记录各阶段耗时"""
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Coroutine, Dict, List, Sequence
+from app.core.metrics import metrics
+from loguru import logger
+
+StageFunc = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+# 后台任务的强引用，防止任务在完成前被垃圾回收
+_background_tasks = set()
+
+
+def spawn_background(coro: Coroutine, name: str = "background") -> asyncio.Task:
+    """在后台执行协程（不阻塞响应），异常仅记录日志"""
+    async def runner():
+        try:
+            await coro
+        except Exception as e:
+            logger.error(f"后台任务失败({name}): {e}")
+
+    task = asyncio.create_task(runner(), name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+class StageGraph:
+    """阶段图（DAG）
+
+    每个阶段声明依赖的阶段，依赖全部完成后立即开始执行，
+    没有依赖关系的阶段并发执行。阶段函数接收已完成阶段的结果字典。
+
+    示例：
+        graph = StageGraph("chat")
+        graph.add("embed", lambda r: get_embedding(message))
+        graph.add("retrieve", lambda r: retrieve(r["embed"]), deps=["embed"])
+        graph.add("intent", lambda r: detect_intent(r["embed"]), deps=["embed"])
+        results = await graph.run()
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: Dict[str, Dict] = {}
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.total_ms: float = 0.0
+
+    def add(self, name: str, func: StageFunc, deps: Sequence[str] = ()) -> "StageGraph":
+        """添加阶段（依赖的阶段必须先添加，保证无环）"""
+        if name in self.stages:
+            raise ValueError(f"阶段重复: {name}")
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"阶段 {name} 依赖未定义的阶段: {dep}")
+        self.stages[name] = {"func": func, "deps": list(deps)}
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """执行阶段图
+
+        Returns:
+            各阶段结果 {阶段名: 结果}
+
+        Raises:
+            任一阶段抛出的异常（其余未完成阶段会被取消）
+        """
+        graph_start = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str, stage: Dict):
+            if stage["deps"]:
+                await asyncio.gather(*(tasks[dep] for dep in stage["deps"]))
+            start = time.perf_counter()
+            result = await stage["func"](self.results)
+            end = time.perf_counter()
+            self.results[name] = result
+            self.timings[name] = {
+                "start_ms": (start - graph_start) * 1000,
+                "end_ms": (end - graph_start) * 1000,
+                "duration_ms": (end - start) * 1000,
+            }
+            metrics.observe(f"pipeline.{self.name}.{name}_ms", self.timings[name]["duration_ms"])
+            return result
+
+        for name, stage in self.stages.items():
+            tasks[name] = asyncio.create_task(run_stage(name, stage))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.total_ms = (time.perf_counter() - graph_start) * 1000
+
+        metrics.observe(f"pipeline.{self.name}.total_ms", self.total_ms)
+        return self.results
+
+    def critical_path(self) -> List[str]:
+        """关键路径：从最后结束的阶段沿最晚结束的依赖回溯"""
+        if not self.timings:
+            return []
+        current = max(self.timings, key=lambda n: self.timings[n]["end_ms"])
+        path = [current]
+        while self.stages[current]["deps"]:
+            current = max(self.stages[current]["deps"], key=lambda n: self.timings[n]["end_ms"])
+            path.append(current)
+        return list(reversed(path))
+
+    def summary(self) -> str:
+        """各阶段耗时摘要（用于日志）"""
+        stages = ", ".join(
+            f"{name}={timing['duration_ms']:.0f}ms"
+            for name, timing in sorted(self.timings.items(), key=lambda item: item[1]["start_ms"])
+        )
+        return f"总耗时={self.total_ms:.0f}ms [{stages}] 关键路径={'→'.join(self.critical_path())}"
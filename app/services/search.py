@@ -86,6 +86,25 @@ class SearchService:
             )
         
         return "\n\n".join(context_parts)
+    
+    def to_passages(self, results: List[Dict[str, str]]) -> List[Dict]:
+        """将搜索结果转换为上下文片段（供context_packer按预算打包）
+        
+        搜索引擎返回顺序即相关度顺序，按排名递减赋分。
+        
+        Args:
+            results: 搜索结果列表
+            
+        Returns:
+            片段列表 [{"text": "", "score": 0.0}]
+        """
+        passages = []
+        for i, r in enumerate(results, 1):
+            passages.append({
+                "text": f"[搜索结果{i}]\n标题：{r['title']}\n来源：{r['url']}\n摘要：{r['content']}",
+                "score": 1.0 / i,
+            })
+        return passages
 
 
 # 创建全局实例
@@ -0,0 +1,104 @@
+"""会话上下文存储 - 按session_id保存多轮对话，供Ollama复用提示词前缀缓存"""
+import time
+import threading
+from typing import Dict, List
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from .context_packer import estimate_tokens, MESSAGE_OVERHEAD_TOKENS
+
+settings = get_settings()
+
+
+class SessionStore:
+    """会话上下文存储
+
+    保存每轮实际发送给模型的用户消息和模型回复（逐字不变），
+    下一轮请求时原样作为历史发送。这样新请求的前缀与上一轮已计算过的
+    提示词完全一致，Ollama可以复用该前缀的KV缓存，只需计算新增的token。
+
+    历史超出轮数或token预算时，一次性丢弃最早的一半轮次，
+    而不是每轮滑动一条，避免每一轮都改变前缀导致缓存失效。
+    """
+
+    # 惰性清理过期会话的最小间隔（秒）
+    SWEEP_INTERVAL = 60
+
+    def __init__(self):
+        self.timeout = settings.SESSION_TIMEOUT
+        self.max_turns = settings.MAX_CONTEXT_TURNS
+        self.token_budget = settings.SESSION_HISTORY_TOKEN_BUDGET
+        self._sessions: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        metrics.register_source("session_store", self.snapshot)
+
+    def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        """获取会话历史消息（过期会话视为空）"""
+        self._sweep()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if not session:
+                return []
+            if time.time() - session["updated_at"] > self.timeout:
+                del self._sessions[session_id]
+                return []
+            return list(session["messages"])
+
+    def append(self, session_id: str, user_content: str, assistant_content: str):
+        """追加一轮对话
+
+        Args:
+            session_id: 会话ID
+            user_content: 本轮实际发送给模型的用户消息（含上下文）
+            assistant_content: 模型回复
+        """
+        turn = [
+            {"role": "user", "content": user_content},
+            {"role": "assistant", "content": assistant_content},
+        ]
+        turn_tokens = sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in turn)
+
+        with self._lock:
+            session = self._sessions.setdefault(session_id, {"turns": [], "tokens": 0})
+            session["turns"].append((turn, turn_tokens))
+            session["tokens"] += turn_tokens
+            session["updated_at"] = time.time()
+
+            if len(session["turns"]) > self.max_turns or session["tokens"] > self.token_budget:
+                # 批量丢弃最早的一半轮次（至少保留最新一轮）
+                keep = max(1, len(session["turns"]) // 2)
+                while len(session["turns"]) > keep or (
+                    len(session["turns"]) > 1 and session["tokens"] > self.token_budget
+                ):
+                    _, dropped_tokens = session["turns"].pop(0)
+                    session["tokens"] -= dropped_tokens
+                metrics.incr("session_store.trims")
+
+            session["messages"] = [m for turn_messages, _ in session["turns"] for m in turn_messages]
+
+    def clear(self, session_id: str):
+        """清除会话"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _sweep(self):
+        """清理过期会话"""
+        now = time.time()
+        if now - self._last_sweep < self.SWEEP_INTERVAL:
+            return
+        with self._lock:
+            self._last_sweep = now
+            expired = [
+                sid for sid, session in self._sessions.items()
+                if now - session["updated_at"] > self.timeout
+            ]
+            for sid in expired:
+                del self._sessions[sid]
+
+    def snapshot(self) -> Dict:
+        """当前状态"""
+        return {"sessions": len(self._sessions)}
+
+
+# 创建全局实例
+session_store = SessionStore()
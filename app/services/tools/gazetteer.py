@@ -0,0 +1,175 @@
+"""
+地名词典
+
+加载和风天气城市列表（省、市、区县），按字符构建前缀树：
+- 一次扫描消息，按最长匹配提取地名
+- 地名直接对应 Location ID，无需调用城市查询 API
+
+城市列表格式与和风天气官方 China-City-List 一致（CSV，按列名读取
+Location_ID、Location_Name_ZH、Adm1_Name_ZH、Adm2_Name_ZH），
+配置 WEATHER_LOCATION_LIST 指向官方完整列表即可覆盖全部区县；
+未配置时使用内置的常用城市列表。
+"""
+
+import csv
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from loguru import logger
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# 内置城市列表
+DEFAULT_LOCATION_LIST = Path(__file__).parent / "data" / "qweather_locations.csv"
+
+# 地名可带的行政区划后缀（"通州" 也可写作 "通州区"）
+_SUFFIXES = ("", "市", "区", "县")
+
+# 前缀树中表示词尾的键
+_END = ""
+
+
+class Location(NamedTuple):
+    """地点"""
+    id: str
+    name: str
+    adm1: str  # 省级行政区
+    adm2: str  # 地级行政区
+
+    @property
+    def level(self) -> int:
+        """行政级别：区县比地级市更具体"""
+        return 2 if self.name != self.adm2 else 1
+
+
+class Gazetteer:
+    """地名前缀树"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else DEFAULT_LOCATION_LIST
+        self._root: Dict = {}
+        self.size = 0
+        self._load()
+
+    def _load(self):
+        """加载城市列表并构建前缀树"""
+        try:
+            with open(self.path, encoding="utf-8-sig") as f:
+                lines = f.readlines()
+        except OSError as e:
+            logger.error(f"加载城市列表失败: {self.path}, {e}")
+            return
+
+        # 官方列表首行为版本说明，从列名行开始读取
+        header = next((i for i, line in enumerate(lines) if line.startswith("Location_ID")), 0)
+        for row in csv.DictReader(lines[header:]):
+            name = (row.get("Location_Name_ZH") or "").strip()
+            if not row.get("Location_ID") or len(name) < 2:
+                continue
+            location = Location(
+                id=row["Location_ID"].strip(),
+                name=name,
+                adm1=(row.get("Adm1_Name_ZH") or "").strip(),
+                adm2=(row.get("Adm2_Name_ZH") or "").strip(),
+            )
+            for suffix in _SUFFIXES:
+                self._insert(name + suffix, name, location)
+            self.size += 1
+        logger.info(f"🌍 地名词典加载完成: {self.size} 个地点 ({self.path.name})")
+
+    def _insert(self, key: str, name: str, location: Location):
+        node = self._root
+        for char in key:
+            node = node.setdefault(char, {})
+        entry = node.setdefault(_END, (name, []))
+        entry[1].append(location)
+
+    def scan(self, text: str) -> List[Tuple[str, List[Location]]]:
+        """
+        一次扫描文本，按最长匹配找出所有地名
+
+        Args:
+            text: 文本
+
+        Returns:
+            [(地名, 同名地点列表)]，按出现顺序
+        """
+        matches = []
+        i = 0
+        while i < len(text):
+            node = self._root
+            found, end = None, i
+            j = i
+            while j < len(text) and text[j] in node:
+                node = node[text[j]]
+                j += 1
+                if _END in node:
+                    found, end = node[_END], j
+            if found:
+                matches.append(found)
+                i = end
+            else:
+                i += 1
+        return matches
+
+    def extract(self, text: str) -> Optional[Location]:
+        """
+        从文本中提取最具体的地点
+
+        同时出现多个地名时（如"北京市通州区"），优先选择与其他地名
+        属于同一上级行政区的地点，其次选择级别更具体的地点。
+        """
+        best, best_key = None, None
+        for _, location, key in self._candidates(self.scan(text)):
+            if best_key is None or key > best_key:
+                best, best_key = location, key
+        return best
+
+    def extract_all(self, text: str) -> List[Location]:
+        """
+        从文本中提取提到的所有地点（如"北京和上海" → [北京, 上海]）
+
+        每个地名取最匹配的同名地点；同时提到上级和下级时（如"北京市通州区"）只保留下级。
+        """
+        chosen: Dict[str, Tuple[Location, Tuple[int, int]]] = {}
+        for name, location, key in self._candidates(self.scan(text)):
+            if name not in chosen or key > chosen[name][1]:
+                chosen[name] = (location, key)
+
+        locations = [location for location, _ in chosen.values()]
+        parents = {
+            parent
+            for location in locations if location.level == 2
+            for parent in (location.adm1, location.adm2)
+        }
+        result, seen = [], set()
+        for location in locations:
+            if location.id in seen or (location.level == 1 and location.name in parents):
+                continue
+            seen.add(location.id)
+            result.append(location)
+        return result
+
+    @staticmethod
+    def _candidates(matches: List[Tuple[str, List[Location]]]):
+        """候选地点：(地名, 地点, 排序键)，排序键为 (上级行政区也被提到的次数, 行政级别)"""
+        names = {name for name, _ in matches}
+        for name, locations in matches:
+            for location in locations:
+                support = (location.adm1 in names and location.adm1 != name) + (location.adm2 in names and location.adm2 != name)
+                yield name, location, (support, location.level)
+
+    def lookup(self, name: str) -> Optional[Location]:
+        """按地名查找地点（地名可带市/区/县后缀）"""
+        node = self._root
+        for char in name.strip():
+            node = node.get(char)
+            if node is None:
+                return None
+        entry = node.get(_END)
+        return entry[1][0] if entry else None
+
+
+# 创建全局实例
+gazetteer = Gazetteer(settings.WEATHER_LOCATION_LIST or None)
@@ -4,13 +4,30 @@
 集成和风天气 API (QWeather)
 - 免费额度：每天 1000 次请求
 - 文档：https://dev.qweather.com/
+
+城市 Location ID 永久缓存（进程内 + Redis），实时天气按更新间隔缓存，
+相同城市的并发查询合并为一次上游请求，节省额度并降低延迟。
 """
 
+import json
+import time
+import asyncio
 import httpx
-from typing import Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 from loguru import logger
 
+from app.core.async_bridge import run_sync
 from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.core.redis import get_redis
+from .gazetteer import gazetteer
+
+try:
+    # 安装了 h2 时使用 HTTP/2（多个请求复用同一连接）
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
 
 settings = get_settings()
 
@@ -20,61 +37,18 @@ class WeatherTool:
     
     name = "天气查询"
     description = """
-    查询指定城市的实时天气和天气预报。
+    查询指定城市的实时天气和天气预报（3天/7天）。
     适用于：用户询问天气、温度、天气状况等。
     输入：城市名称（例如：北京、上海、通州区）
     输出：实时天气信息（温度、天气状况、风力、湿度等）
     """
     
-    # 常见城市Location ID映射表（和风天气）
-    CITY_IDS = {
-        # 直辖市
-        "北京": "101010100", "北京市": "101010100",
-        "上海": "101020100", "上海市": "101020100", 
-        "天津": "101030100", "天津市": "101030100",
-        "重庆": "101040100", "重庆市": "101040100",
-        
-        # 北京区县
-        "通州": "101010600", "通州区": "101010600",
-        "海淀": "101010200", "海淀区": "101010200",
-        "朝阳": "101010300", "朝阳区": "101010300",
-        "东城": "101010400", "东城区": "101010400",
-        "西城": "101010500", "西城区": "101010500",
-        "丰台": "101010700", "丰台区": "101010700",
-        "石景山": "101010800", "石景山区": "101010800",
-        "昌平": "101011100", "昌平区": "101011100",
-        "大兴": "101011200", "大兴区": "101011200",
-        
-        # 省会城市
-        "广州": "101280101", "广州市": "101280101",
-        "深圳": "101280601", "深圳市": "101280601",
-        "杭州": "101210101", "杭州市": "101210101",
-        "南京": "101190101", "南京市": "101190101",
-        "成都": "101270101", "成都市": "101270101",
-        "武汉": "101200101", "武汉市": "101200101",
-        "西安": "101110101", "西安市": "101110101",
-        "郑州": "101180101", "郑州市": "101180101",
-        "长沙": "101250101", "长沙市": "101250101",
-        "济南": "101120101", "济南市": "101120101",
-        "沈阳": "101070101", "沈阳市": "101070101",
-        "哈尔滨": "101050101", "哈尔滨市": "101050101",
-        "昆明": "101290101", "昆明市": "101290101",
-        "南宁": "101300101", "南宁市": "101300101",
-        "福州": "101230101", "福州市": "101230101",
-        "南昌": "101240101", "南昌市": "101240101",
-        "石家庄": "101090101", "石家庄市": "101090101",
-        "太原": "101100101", "太原市": "101100101",
-        "呼和浩特": "101080101", "呼和浩特市": "101080101",
-        "长春": "101060101", "长春市": "101060101",
-        "兰州": "101160101", "兰州市": "101160101",
-        "西宁": "101150101", "西宁市": "101150101",
-        "银川": "101170101", "银川市": "101170101",
-        "乌鲁木齐": "101130101", "乌鲁木齐市": "101130101",
-        "拉萨": "101140101", "拉萨市": "101140101",
-        "贵阳": "101260101", "贵阳市": "101260101",
-        "海口": "101310101", "海口市": "101310101",
-        "合肥": "101220101", "合肥市": "101220101",
-    }
+    # Redis 缓存键
+    LOCATION_CACHE_KEY = "weather:location"
+    DATA_CACHE_PREFIX = "weather:"
+    
+    # 天气预报接口（预报天数 → 接口名）
+    FORECAST_ENDPOINTS = {3: "3d", 7: "7d"}
     
     def __init__(self, api_key: Optional[str] = None, api_host: Optional[str] = None):
         """
@@ -89,12 +63,91 @@ class WeatherTool:
         self.base_url = f"https://{self.api_host}/v7"       # 天气API地址
         self.geo_url = f"https://{self.api_host}/geo/v2"    # 城市查询API地址（注意：需要/geo前缀）
         
+        # 各接口的缓存时间（与和风天气的数据更新间隔一致）
+        self.cache_ttls = {
+            "now": settings.WEATHER_NOW_CACHE_TTL,
+            "3d": settings.WEATHER_FORECAST_CACHE_TTL,
+            "7d": settings.WEATHER_FORECAST_CACHE_TTL,
+        }
+        
+        # 长连接客户端（首次请求时创建，所有请求共用）
+        self._client: Optional[httpx.AsyncClient] = None
+        # 城市名称 → Location ID（城市ID不会变化，永久缓存）
+        self._location_ids: Dict[str, str] = {}
+        # (接口, Location ID) → (过期时间, 天气数据)
+        self._data_cache: Dict[Tuple[str, str], Tuple[float, Dict]] = {}
+        # 进行中的上游请求（相同请求合并）
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        
         if not self.api_key:
             logger.warning("⚠️  和风天气 API Key 未配置，天气查询功能不可用")
     
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取共用的HTTP客户端"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=_HTTP2,
+                timeout=settings.WEATHER_HTTP_TIMEOUT,
+                headers={"X-QW-Api-Key": self.api_key or ""},
+                limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60)
+            )
+        return self._client
+    
+    async def close(self):
+        """关闭HTTP客户端"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _singleflight(self, key: Tuple[str, str], factory: Callable[[], Awaitable[Any]]) -> Any:
+        """相同key的并发调用只执行一次，其余调用等待同一结果"""
+        future = self._inflight.get(key)
+        if future is not None:
+            metrics.incr("weather.coalesced")
+            return await asyncio.shield(future)
+        
+        future = asyncio.ensure_future(factory())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+    
+    async def _redis_get(self, key: str, field: Optional[str] = None) -> Optional[str]:
+        """读取Redis缓存（出错时视为未命中）"""
+        try:
+            redis = get_redis()
+            return await (redis.hget(key, field) if field else redis.get(key))
+        except Exception as e:
+            logger.debug(f"读取天气缓存失败: {e}")
+            return None
+    
+    async def _redis_get_with_ttl(self, key: str) -> Tuple[Optional[str], Optional[float]]:
+        """读取Redis缓存及其剩余有效时间（秒，未设置过期时间为None；出错时视为未命中）"""
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            raw, pttl = await pipe.execute()
+        except Exception as e:
+            logger.debug(f"读取天气缓存失败: {e}")
+            return None, None
+        return raw, (pttl / 1000 if pttl is not None and pttl >= 0 else None)
+    
+    async def _redis_set(self, key: str, value: str, field: Optional[str] = None, ttl: Optional[int] = None):
+        """写入Redis缓存（出错时忽略）"""
+        try:
+            redis = get_redis()
+            if field:
+                await redis.hset(key, field, value)
+            else:
+                await redis.set(key, value, ex=ttl)
+        except Exception as e:
+            logger.debug(f"写入天气缓存失败: {e}")
+    
     async def get_location_id(self, city_name: str) -> Optional[str]:
         """
-        根据城市名称获取 Location ID（优先使用API，失败则使用本地映射）
+        根据城市名称获取 Location ID
+        
+        依次查找：进程内缓存 → 地名词典 → Redis 缓存 → API
         
         Args:
             city_name: 城市名称
@@ -102,74 +155,83 @@ class WeatherTool:
         Returns:
             Location ID 或 None
         """
+        city_name = city_name.strip()
+        location_id = self._location_ids.get(city_name)
+        if location_id:
+            metrics.incr("weather.location_cache_hits")
+            return location_id
+        
+        location_id = await self._singleflight(("location", city_name), lambda: self._resolve_location(city_name))
+        if location_id:
+            self._location_ids[city_name] = location_id
+        return location_id
+    
+    async def _resolve_location(self, city_name: str) -> Optional[str]:
+        """查找 Location ID（地名词典 → Redis 缓存 → API）"""
+        location = gazetteer.lookup(city_name)
+        if location:
+            return location.id
+        
+        location_id = await self._redis_get(self.LOCATION_CACHE_KEY, city_name)
+        if location_id:
+            metrics.incr("weather.location_cache_hits")
+            return location_id
+        
         if not self.api_key:
-            logger.warning("API Key未配置，仅使用本地映射")
-            return self._get_location_from_cache(city_name)
+            logger.warning("API Key未配置，仅使用地名词典")
+            return self._get_location_from_gazetteer(city_name)
+        
+        location_id = await self._lookup_location(city_name)
+        if location_id:
+            await self._redis_set(self.LOCATION_CACHE_KEY, location_id, field=city_name)
+            return location_id
         
-        # 1. 尝试API查询
+        # API失败，使用地名词典兜底
+        logger.info(f"API查询失败，使用地名词典查找: {city_name}")
+        return self._get_location_from_gazetteer(city_name)
+    
+    async def _lookup_location(self, city_name: str) -> Optional[str]:
+        """调用城市查询API"""
+        metrics.incr("weather.upstream_calls")
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    f"{self.geo_url}/city/lookup",
-                    headers={"X-QW-Api-Key": self.api_key},
-                    params={"location": city_name, "lang": "zh"}
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("code") == "200" and data.get("location"):
-                        location = data["location"][0]
-                        location_id = location["id"]
-                        location_name = location["name"]
-                        logger.info(f"🌍 API找到城市: {location_name} (ID: {location_id})")
-                        return location_id
-                    else:
-                        logger.warning(f"API未找到城市: {city_name}, code={data.get('code')}")
+            response = await self._get_client().get(
+                f"{self.geo_url}/city/lookup",
+                params={"location": city_name, "lang": "zh"}
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("code") == "200" and data.get("location"):
+                    location = data["location"][0]
+                    location_id = location["id"]
+                    location_name = location["name"]
+                    logger.info(f"🌍 API找到城市: {location_name} (ID: {location_id})")
+                    return location_id
                 else:
-                    logger.error(f"API查询失败: HTTP {response.status_code}")
+                    logger.warning(f"API未找到城市: {city_name}, code={data.get('code')}")
+            else:
+                logger.error(f"API查询失败: HTTP {response.status_code}")
         except Exception as e:
             logger.error(f"API查询异常: {e}")
-        
-        # 2. API失败，使用本地映射兜底
-        logger.info(f"API查询失败，使用本地映射查找: {city_name}")
-        return self._get_location_from_cache(city_name)
+        return None
     
-    def _get_location_from_cache(self, city_name: str) -> Optional[str]:
-        """从本地映射表查找城市ID"""
-        # 清理城市名称
-        city_name = city_name.strip().replace("市", "").replace("的天气", "").replace("天气", "")
-        
-        # 尝试多种匹配方式
-        possible_names = [
-            city_name,
-            city_name + "市",
-            city_name + "区",
-            city_name.replace("区", ""),
-            city_name.replace("市", "")
-        ]
-        
-        for name in possible_names:
-            if name in self.CITY_IDS:
-                location_id = self.CITY_IDS[name]
-                logger.info(f"🌍 本地映射找到城市: {name} (ID: {location_id})")
-                return location_id
-        
-        # 模糊匹配：查找包含关键词的城市
-        for key in self.CITY_IDS:
-            if city_name in key or key in city_name:
-                location_id = self.CITY_IDS[key]
-                logger.info(f"🌍 本地模糊匹配到城市: {key} (ID: {location_id})")
-                return location_id
+    def _get_location_from_gazetteer(self, city_name: str) -> Optional[str]:
+        """从地名词典查找城市ID（名称中包含多个地名时取最具体的地点）"""
+        location = gazetteer.lookup(city_name) or gazetteer.extract(city_name)
+        if location:
+            logger.info(f"🌍 地名词典找到城市: {location.name} (ID: {location.id})")
+            return location.id
         
         logger.warning(f"未找到城市: {city_name}，请尝试：北京、上海、通州区等常见城市")
         return None
     
-    async def get_weather_now(self, city_name: str) -> Dict:
+    async def get_weather_now(self, city_name: str, location_id: Optional[str] = None) -> Dict:
         """
         获取实时天气
         
         Args:
             city_name: 城市名称
+            location_id: 已知的 Location ID（如地名词典的提取结果，提供时不再查找）
             
         Returns:
             天气信息字典
@@ -181,66 +243,195 @@ class WeatherTool:
             }
         
         # 1. 获取城市 Location ID
-        location_id = await self.get_location_id(city_name)
+        location_id = location_id or await self.get_location_id(city_name)
         if not location_id:
             return {
                 "success": False,
                 "message": f"未找到城市：{city_name}，请检查城市名称是否正确"
             }
         
-        # 2. 获取实时天气
+        # 2. 获取实时天气（优先使用缓存）
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    f"{self.base_url}/weather/now",
-                    headers={
-                        "X-QW-Api-Key": self.api_key
-                    },
-                    params={
-                        "location": location_id,
-                        "lang": "zh"
-                    }
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("code") == "200" and data.get("now"):
-                        now = data["now"]
-                        update_time = data.get("updateTime", "")
-                        
-                        weather_info = {
-                            "success": True,
-                            "city": city_name,
-                            "temperature": f"{now.get('temp', 'N/A')}°C",
-                            "feels_like": f"{now.get('feelsLike', 'N/A')}°C",
-                            "weather": now.get("text", "未知"),
-                            "wind_dir": now.get("windDir", "未知"),
-                            "wind_scale": now.get("windScale", "未知"),
-                            "humidity": f"{now.get('humidity', 'N/A')}%",
-                            "pressure": f"{now.get('pressure', 'N/A')} hPa",
-                            "visibility": f"{now.get('vis', 'N/A')} km",
-                            "update_time": update_time,
-                            "raw": now  # 原始数据
-                        }
-                        
-                        logger.info(f"🌤️  获取天气成功: {city_name} {weather_info['temperature']} {weather_info['weather']}")
-                        return weather_info
-                    else:
-                        return {
-                            "success": False,
-                            "message": f"获取天气失败: code={data.get('code')}"
-                        }
-                else:
-                    return {
-                        "success": False,
-                        "message": f"天气 API 请求失败: HTTP {response.status_code}"
-                    }
+            data = await self._get_data("now", location_id)
         except Exception as e:
             logger.error(f"获取天气异常: {e}")
             return {
                 "success": False,
                 "message": f"获取天气异常: {str(e)}"
             }
+        if data.get("code") != "200" or not data.get("now"):
+            return {
+                "success": False,
+                "message": data.get("message") or f"获取天气失败: code={data.get('code')}"
+            }
+        
+        now = data["now"]
+        weather_info = {
+            "success": True,
+            "city": city_name,
+            "temperature": f"{now.get('temp', 'N/A')}°C",
+            "feels_like": f"{now.get('feelsLike', 'N/A')}°C",
+            "weather": now.get("text", "未知"),
+            "wind_dir": now.get("windDir", "未知"),
+            "wind_scale": now.get("windScale", "未知"),
+            "humidity": f"{now.get('humidity', 'N/A')}%",
+            "pressure": f"{now.get('pressure', 'N/A')} hPa",
+            "visibility": f"{now.get('vis', 'N/A')} km",
+            "update_time": data.get("updateTime", ""),
+            "raw": now  # 原始数据
+        }
+        
+        logger.info(f"🌤️  获取天气成功: {city_name} {weather_info['temperature']} {weather_info['weather']}")
+        return weather_info
+    
+    async def get_forecast(self, city_name: str, days: int = 3, location_id: Optional[str] = None) -> Dict:
+        """
+        获取逐日天气预报
+        
+        Args:
+            city_name: 城市名称
+            days: 预报天数（3 或 7）
+            location_id: 已知的 Location ID（提供时不再查找）
+            
+        Returns:
+            {"success": True, "city": 城市, "daily": [每日预报], "update_time": 更新时间}
+        """
+        if not self.api_key:
+            return {
+                "success": False,
+                "message": "天气 API Key 未配置，请联系管理员配置 QWEATHER_API_KEY"
+            }
+        
+        location_id = location_id or await self.get_location_id(city_name)
+        if not location_id:
+            return {
+                "success": False,
+                "message": f"未找到城市：{city_name}，请检查城市名称是否正确"
+            }
+        
+        endpoint = self.FORECAST_ENDPOINTS[3 if days <= 3 else 7]
+        try:
+            data = await self._get_data(endpoint, location_id)
+        except Exception as e:
+            logger.error(f"获取天气预报异常: {e}")
+            return {
+                "success": False,
+                "message": f"获取天气预报异常: {str(e)}"
+            }
+        if data.get("code") != "200" or not data.get("daily"):
+            return {
+                "success": False,
+                "message": data.get("message") or f"获取天气预报失败: code={data.get('code')}"
+            }
+        
+        daily = [
+            {
+                "date": day.get("fxDate", ""),
+                "weather_day": day.get("textDay", "未知"),
+                "weather_night": day.get("textNight", "未知"),
+                "temp_max": f"{day.get('tempMax', 'N/A')}°C",
+                "temp_min": f"{day.get('tempMin', 'N/A')}°C",
+                "wind_dir": day.get("windDirDay", "未知"),
+                "wind_scale": day.get("windScaleDay", "未知"),
+                "humidity": f"{day.get('humidity', 'N/A')}%",
+                "precip": f"{day.get('precip', 'N/A')} mm",
+            }
+            for day in data["daily"][:days]
+        ]
+        logger.info(f"🌤️  获取天气预报成功: {city_name} {len(daily)}天")
+        return {
+            "success": True,
+            "city": city_name,
+            "daily": daily,
+            "update_time": data.get("updateTime", "")
+        }
+    
+    async def _get_data(self, endpoint: str, location_id: str) -> Dict:
+        """
+        获取天气数据（进程内缓存 → Redis 缓存 → API）
+        
+        缓存时间与和风天气的数据更新间隔一致，缓存期内的查询不消耗API额度。
+        
+        Args:
+            endpoint: 接口名（now/3d/7d）
+            location_id: Location ID
+            
+        Returns:
+            API返回的数据（code、now/daily、updateTime）
+        """
+        cached = self._data_cache.get((endpoint, location_id))
+        if cached and cached[0] > time.time():
+            metrics.incr("weather.cache_hits")
+            return cached[1]
+        return await self._singleflight((endpoint, location_id), lambda: self._load_data(endpoint, location_id))
+    
+    async def _load_data(self, endpoint: str, location_id: str, refresh: bool = False) -> Dict:
+        """从Redis缓存或API加载天气数据，成功的结果写入缓存
+
+        Args:
+            refresh: 跳过缓存直接请求API（预取刷新）
+        """
+        key = f"{self.DATA_CACHE_PREFIX}{endpoint}:{location_id}"
+        ttl = self.cache_ttls[endpoint]
+        raw, remaining = (None, None) if refresh else await self._redis_get_with_ttl(key)
+        if raw:
+            metrics.incr("weather.cache_hits")
+            data = json.loads(raw)
+            # 进程内缓存与 Redis 同时过期，避免把即将过期的数据再保留一个完整的TTL
+            if remaining is not None:
+                ttl = min(ttl, remaining)
+        else:
+            data = await self._fetch_data(endpoint, location_id)
+            if data.get("code") != "200":
+                return data
+            await self._redis_set(key, json.dumps(data, ensure_ascii=False), ttl=ttl)
+        self._data_cache[(endpoint, location_id)] = (time.time() + ttl, data)
+        return data
+    
+    async def _fetch_data(self, endpoint: str, location_id: str) -> Dict:
+        """调用天气API（/weather/now、/weather/3d、/weather/7d）"""
+        metrics.incr("weather.upstream_calls")
+        response = await self._get_client().get(
+            f"{self.base_url}/weather/{endpoint}",
+            params={
+                "location": location_id,
+                "lang": "zh"
+            }
+        )
+        if response.status_code != 200:
+            return {"code": str(response.status_code), "message": f"天气 API 请求失败: HTTP {response.status_code}"}
+        data = response.json()
+        return {
+            key: data[key]
+            for key in ("code", "now", "daily", "updateTime")
+            if key in data
+        }
+    
+    async def cache_expires_in(self, endpoint: str, location_id: str) -> float:
+        """共享缓存（Redis）的剩余有效时间（秒），未缓存为 0
+
+        多个 worker 共用 Redis 缓存，以 Redis 的 TTL 为准；Redis 不可用时使用进程内缓存。
+        """
+        try:
+            ttl = await get_redis().ttl(f"{self.DATA_CACHE_PREFIX}{endpoint}:{location_id}")
+            return float(max(ttl, 0))
+        except Exception as e:
+            logger.debug(f"读取天气缓存TTL失败: {e}")
+        cached = self._data_cache.get((endpoint, location_id))
+        return max(0.0, cached[0] - time.time()) if cached else 0.0
+    
+    async def refresh(self, endpoint: str, location_id: str) -> bool:
+        """
+        从API刷新天气数据并写入缓存（供预取任务调用）
+        
+        Returns:
+            是否刷新成功
+        """
+        data = await self._singleflight(
+            (endpoint, location_id),
+            lambda: self._load_data(endpoint, location_id, refresh=True)
+        )
+        return data.get("code") == "200"
     
     async def _arun(self, city_name: str) -> str:
         """异步执行天气查询（供 LangChain Agent 调用）"""
@@ -266,9 +457,8 @@ class WeatherTool:
             return f"天气查询失败：{result['message']}"
     
     def run(self, city_name: str) -> str:
-        """同步执行天气查询（供 Agent 调用）"""
-        import asyncio
-        return asyncio.run(self._arun(city_name))
+        """同步执行天气查询（供 Agent 调用，在共享事件循环中执行以复用长连接）"""
+        return run_sync(self._arun(city_name))
 
 
 # 单例
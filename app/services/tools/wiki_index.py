@@ -0,0 +1,239 @@
+"""
+离线维基百科索引
+
+由维基百科中文摘要 dump 构建的本地 SQLite FTS5 索引（scripts/build_wiki_index.py），
+替代在线调用 zh.wikipedia 的维基百科工具：
+- 不依赖外网，无频率限制，内网/离线节点可用
+- 中文按字的二元组切分后建全文索引，BM25 排序，查询在毫秒级完成
+- 建索引时可同时生成摘要向量，查询时对 BM25 候选按向量相似度重排（WIKI_VECTOR_SEARCH）
+- 安装了 opencc 时建索引和查询都转换为简体，繁体词条也能被简体问题检索到
+"""
+
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+import numpy as np
+from loguru import logger
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+
+settings = get_settings()
+
+try:
+    from opencc import OpenCC
+    _t2s = OpenCC("t2s")
+except ImportError:
+    _t2s = None
+
+# 是否可以进行繁简转换
+T2S_AVAILABLE = _t2s is not None
+
+# 索引格式版本（切词方式变化时递增，旧索引需重新构建）
+INDEX_VERSION = "1"
+
+# 连续的汉字 / 字母数字
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+")
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+# 查询最多使用的词数（过长的问题只取前面部分）
+_MAX_QUERY_TOKENS = 32
+
+# 出现在超过该比例词条中的词（如"的一"、"中国"）区分度低且倒排表很长，
+# 建索引时记为停用词，查询时跳过，避免个别常见词把查询拖慢到上百毫秒
+STOP_TOKEN_DOC_RATIO = 0.01
+STOP_TOKEN_MIN_DOCS = 1000
+
+# 标题命中的权重（相对摘要）
+_TITLE_WEIGHT = 5.0
+
+# 向量重排时参与融合的 BM25 候选数
+_VECTOR_CANDIDATES = 20
+
+# 倒数排名融合常数
+_RRF_K = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS stop_tokens (token TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    title_key TEXT NOT NULL,
+    url TEXT,
+    abstract TEXT NOT NULL,
+    embedding BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_pages_title_key ON pages(title_key);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(title, abstract, content='');
+"""
+
+
+def normalize(text: str, t2s: bool = False) -> str:
+    """统一为小写，按需繁体转简体"""
+    text = text.lower()
+    if t2s and T2S_AVAILABLE:
+        text = _t2s.convert(text)
+    return text
+
+
+def tokenize(text: str, t2s: bool = False) -> List[str]:
+    """切词：汉字按相邻二元组（单字保留为一元组），字母数字按整词
+
+    二元组不需要分词词典，"李白的诗" → 李白 白的 的诗，
+    查询与建索引使用同一切分方式，BM25 会偏向同时包含多个二元组的词条。
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(normalize(text, t2s)):
+        if not _CJK_PATTERN.match(run):
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class WikiPage(NamedTuple):
+    """维基百科词条"""
+    title: str
+    url: str
+    abstract: str
+    score: float
+
+
+class WikiIndex:
+    """离线维基百科索引（只读，每个线程使用独立的 SQLite 连接）"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._local = threading.local()
+        meta = self._meta()
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"维基百科索引版本不匹配（{meta.get('version')}），请重新运行 scripts/build_wiki_index.py")
+        self.t2s = meta.get("t2s") == "1"
+        self.size = int(meta.get("pages", 0))
+        self.has_vectors = meta.get("vectors") == "1"
+        self.stop_tokens = {row[0] for row in self._connection().execute("SELECT token FROM stop_tokens")}
+        if self.t2s and not T2S_AVAILABLE:
+            logger.warning("维基百科索引使用了繁简转换，但未安装 opencc，繁体问题可能检索不到")
+        logger.info(f"✅ 离线维基百科索引: {self.path}，{self.size}个词条，向量: {'有' if self.has_vectors else '无'}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _meta(self) -> Dict[str, str]:
+        return dict(self._connection().execute("SELECT key, value FROM meta"))
+
+    def search(self, query: str, top_k: int = 2, embedding: Optional[List[float]] = None) -> List[WikiPage]:
+        """
+        检索词条
+
+        Args:
+            query: 查询词或问题
+            top_k: 返回的词条数
+            embedding: 查询向量（提供且索引含向量时，对 BM25 候选按向量相似度重排）
+
+        Returns:
+            按相关度排序的词条
+        """
+        start = time.perf_counter()
+        tokens = [token for token in dict.fromkeys(tokenize(query, self.t2s)) if token not in self.stop_tokens]
+        conn = self._connection()
+        rerank = embedding is not None and self.has_vectors
+        limit = max(top_k, _VECTOR_CANDIDATES) if rerank else top_k
+        title_key = normalize(query.strip(), self.t2s)
+
+        # 词条名与查询完全一致的排在最前
+        exact = [row[0] for row in conn.execute("SELECT id FROM pages WHERE title_key = ? LIMIT 1", (title_key,))]
+        if tokens:
+            match = " OR ".join(f'"{token}"' for token in tokens[:_MAX_QUERY_TOKENS])
+            ranked = conn.execute(
+                "SELECT rowid, bm25(pages_fts, ?, 1.0) AS score FROM pages_fts "
+                "WHERE pages_fts MATCH ? ORDER BY score LIMIT ?",
+                (_TITLE_WEIGHT, match, limit)
+            ).fetchall()
+            # bm25() 越小越相关，取负数使分数越大越相关
+            scores = {page_id: -score for page_id, score in ranked}
+        else:
+            # 只有常见词（如"中国"）时全文检索区分不出相关度，按词条名前缀查找
+            ranked = conn.execute(
+                "SELECT id, 0.0 FROM pages WHERE title_key > ? AND title_key < ? ORDER BY title_key LIMIT ?",
+                (title_key, title_key + "\U0010ffff", limit)
+            ).fetchall() if title_key else []
+            scores = {}
+        ids = list(dict.fromkeys(exact + [page_id for page_id, _ in ranked]))
+        pages = self._load(ids, with_embedding=rerank)
+
+        if rerank:
+            ids = self._rerank(ids, pages, embedding)
+        result = [
+            WikiPage(pages[page_id]["title"], pages[page_id]["url"], pages[page_id]["abstract"],
+                     round(scores.get(page_id, 0.0), 4))
+            for page_id in ids[:top_k] if page_id in pages
+        ]
+        metrics.observe("wiki.search_ms", (time.perf_counter() - start) * 1000)
+        return result
+
+    def _load(self, ids: List[int], with_embedding: bool) -> Dict[int, Dict]:
+        """按 ID 读取词条"""
+        if not ids:
+            return {}
+        columns = "id, title, url, abstract" + (", embedding" if with_embedding else "")
+        placeholders = ",".join("?" * len(ids))
+        rows = self._connection().execute(f"SELECT {columns} FROM pages WHERE id IN ({placeholders})", ids)
+        pages = {}
+        for row in rows:
+            pages[row[0]] = {"title": row[1], "url": row[2] or "", "abstract": row[3]}
+            if with_embedding:
+                pages[row[0]]["embedding"] = row[4]
+        return pages
+
+    def _rerank(self, ids: List[int], pages: Dict[int, Dict], embedding: List[float]) -> List[int]:
+        """BM25 排名与向量相似度排名做倒数排名融合"""
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        similarities = {}
+        for page_id in ids:
+            blob = pages.get(page_id, {}).get("embedding")
+            if blob:
+                # 建索引时已归一化，内积即余弦相似度
+                similarities[page_id] = float(np.frombuffer(blob, dtype=np.float32) @ query_vector)
+        vector_rank = {page_id: rank for rank, page_id in enumerate(
+            sorted(similarities, key=similarities.get, reverse=True)
+        )}
+        fused = {
+            page_id: 1 / (_RRF_K + rank) + (1 / (_RRF_K + vector_rank[page_id]) if page_id in vector_rank else 0)
+            for rank, page_id in enumerate(ids)
+        }
+        return sorted(ids, key=fused.get, reverse=True)
+
+    def format(self, pages: Iterable[WikiPage], max_chars: int) -> str:
+        """格式化为工具输出"""
+        text = "\n\n".join(f"词条: {page.title}\n摘要: {page.abstract}" for page in pages)
+        if not text:
+            return "维基百科中未找到相关词条。"
+        return text[:max_chars]
+
+    def run(self, query: str) -> str:
+        """工具同步入口（仅 BM25）"""
+        return self.format(self.search(query, settings.WIKI_TOP_K), settings.WIKI_MAX_CHARS)
+
+    async def arun(self, query: str) -> str:
+        """工具异步入口（WIKI_VECTOR_SEARCH=True 时结合向量重排）"""
+        embedding = None
+        if settings.WIKI_VECTOR_SEARCH and self.has_vectors:
+            from app.services.embedding import embedding_service
+            try:
+                embedding = await embedding_service.get_embedding(query)
+            except Exception as e:
+                logger.warning(f"维基百科向量检索不可用，仅使用全文检索: {e}")
+        pages = await asyncio.to_thread(self.search, query, settings.WIKI_TOP_K, embedding)
+        return self.format(pages, settings.WIKI_MAX_CHARS)
@@ -0,0 +1,131 @@
+"""天气预取 - 后台定期刷新热门城市的实时天气和预报，使大部分天气问答直接命中缓存"""
+import asyncio
+import datetime
+from collections import Counter
+from typing import List, Optional
+from sqlalchemy import select, or_
+from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import metrics
+from app.core.redis import get_redis
+from app.models import Conversation
+from .agents.weather_agent import WeatherAgent
+from .tools.gazetteer import gazetteer
+from .tools.weather_tool import get_weather_tool
+from loguru import logger
+
+settings = get_settings()
+
+
+class WeatherPrefetcher:
+    """热门城市天气预取任务
+
+    每个周期：
+    1. 从最近 WEATHER_PREFETCH_LOOKBACK_DAYS 天的天气类对话中统计被问得最多的城市
+    2. 对前 WEATHER_PREFETCH_TOP_N 个城市，Redis 缓存剩余时间不足一个周期的实时天气/3天预报从API刷新
+
+    刷新在缓存过期前完成，热门城市的查询不会等待上游请求。
+    每项数据约每 (TTL - 周期/2) 秒刷新一次，周期应远小于缓存时间；
+    多个 worker 同时运行时，每个周期只有抢到 Redis 锁的 worker 执行。
+    """
+
+    # 预取的接口
+    ENDPOINTS = ("now", "3d")
+    # 统计热门城市时最多读取的对话数
+    MAX_ROWS = 5000
+    # 每个周期的执行锁
+    LOCK_KEY = "weather:prefetch:lock"
+
+    def __init__(self):
+        self.interval = settings.WEATHER_PREFETCH_INTERVAL
+        self.top_n = settings.WEATHER_PREFETCH_TOP_N
+        self.lookback_days = settings.WEATHER_PREFETCH_LOOKBACK_DAYS
+        self.weather_tool = get_weather_tool()
+        self._task: Optional[asyncio.Task] = None
+
+    async def hot_locations(self) -> List[str]:
+        """统计最近被问得最多的城市
+
+        Returns:
+            Location ID 列表（按提问次数从多到少）
+        """
+        since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=self.lookback_days)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Conversation.user_message)
+                .where(
+                    Conversation.created_at >= since,
+                    or_(*(Conversation.user_message.contains(k) for k in WeatherAgent.WEATHER_KEYWORDS))
+                )
+                .order_by(Conversation.id.desc())
+                .limit(self.MAX_ROWS)
+            )
+            messages = result.scalars().all()
+
+        counts = Counter()
+        for message in messages:
+            location = gazetteer.extract(message)
+            if location:
+                counts[location.id] += 1
+        return [location_id for location_id, _ in counts.most_common(self.top_n)]
+
+    async def _acquire_round(self) -> bool:
+        """获取本周期的执行权（锁在下一周期开始前过期；Redis 不可用时直接执行）"""
+        try:
+            return bool(await get_redis().set(self.LOCK_KEY, "1", nx=True, ex=max(1, self.interval - 1)))
+        except Exception as e:
+            logger.debug(f"获取天气预取锁失败: {e}")
+            return True
+
+    async def run_once(self) -> int:
+        """刷新一轮热门城市的天气缓存
+
+        Returns:
+            本轮刷新的接口调用数（其他 worker 执行本周期时为 0）
+        """
+        if not await self._acquire_round():
+            return 0
+        refreshed = 0
+        for location_id in await self.hot_locations():
+            for endpoint in self.ENDPOINTS:
+                # 下一轮之前仍有效的缓存不刷新，节省API额度
+                if await self.weather_tool.cache_expires_in(endpoint, location_id) >= self.interval:
+                    continue
+                try:
+                    if await self.weather_tool.refresh(endpoint, location_id):
+                        refreshed += 1
+                except Exception as e:
+                    logger.warning(f"天气预取失败: {location_id} {endpoint}, {e}")
+
+        metrics.incr("weather_prefetcher.refreshed", refreshed)
+        if refreshed:
+            logger.info(f"天气预取: 已刷新{refreshed}项")
+        return refreshed
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"天气预取失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """启动后台预取任务（在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="weather_prefetcher")
+            logger.info(f"天气预取任务已启动（热门城市前{self.top_n}个，间隔{self.interval}秒）")
+
+    async def stop(self):
+        """停止后台预取任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# 创建全局实例
+weather_prefetcher = WeatherPrefetcher()
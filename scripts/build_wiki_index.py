@@ -0,0 +1,183 @@
+"""构建离线维基百科索引 - 从维基百科中文摘要 dump 生成 SQLite FTS5 索引
+
+dump 可从 https://dumps.wikimedia.org/zhwiki/latest/ 下载 zhwiki-latest-abstract.xml.gz，
+也支持每行一个 {"title", "abstract", "url"} 的 JSONL 文件（.jsonl / .jsonl.gz）。
+
+先写入临时文件，完成后替换 WIKI_INDEX_PATH，重建期间服务仍可使用旧索引（重启或重新构建工具后生效）。
+
+用法：
+    python scripts/build_wiki_index.py zhwiki-latest-abstract.xml.gz
+    python scripts/build_wiki_index.py zhwiki-latest-abstract.xml.gz --output data/wiki_zh.db --limit 10000
+    python scripts/build_wiki_index.py zhwiki-latest-abstract.xml.gz --vectors   # 同时生成摘要向量（调用Embedding服务）
+"""
+import argparse
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+import xml.etree.ElementTree as ET
+sys.path.insert(0, '.')
+
+from pathlib import Path
+from typing import Iterator, Tuple
+import numpy as np
+from app.core.config import get_settings
+from app.services.tools.wiki_index import INDEX_VERSION, SCHEMA, STOP_TOKEN_DOC_RATIO, STOP_TOKEN_MIN_DOCS, T2S_AVAILABLE, normalize, tokenize
+from loguru import logger
+
+settings = get_settings()
+
+# 每批写入的词条数
+BATCH_SIZE = 1000
+
+# 摘要 dump 中词条名的前缀
+_TITLE_PREFIX = "Wikipedia:"
+
+# 消歧义页、过短的摘要对问答没有帮助
+_MIN_ABSTRACT_CHARS = 10
+_SKIP_SUFFIX = "可以指："
+
+
+def _open(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def read_dump(path: str) -> Iterator[Tuple[str, str, str]]:
+    """流式读取 dump，逐条返回 (词条名, 摘要, 链接)"""
+    with _open(path) as f:
+        if ".jsonl" in path:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    yield item.get("title", ""), item.get("abstract", ""), item.get("url", "")
+            return
+        # 摘要 dump：<feed><doc><title/><url/><abstract/><links/></doc>...</feed>
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag != "doc":
+                continue
+            title = (elem.findtext("title") or "").strip()
+            if title.startswith(_TITLE_PREFIX):
+                title = title[len(_TITLE_PREFIX):].strip()
+            yield title, (elem.findtext("abstract") or "").strip(), elem.findtext("url") or ""
+            elem.clear()
+
+
+def _keep(title: str, abstract: str) -> bool:
+    return bool(title) and len(abstract) >= _MIN_ABSTRACT_CHARS and not abstract.endswith(_SKIP_SUFFIX)
+
+
+def build_index(dump: str, output: str, limit: int, t2s: bool) -> int:
+    """构建全文索引，返回写入的词条数"""
+    conn = sqlite3.connect(output)
+    conn.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + SCHEMA)
+    count = 0
+    pages, fts = [], []
+
+    def flush():
+        conn.executemany("INSERT INTO pages (id, title, title_key, url, abstract) VALUES (?, ?, ?, ?, ?)", pages)
+        conn.executemany("INSERT INTO pages_fts (rowid, title, abstract) VALUES (?, ?, ?)", fts)
+        pages.clear()
+        fts.clear()
+
+    start = time.time()
+    for title, abstract, url in read_dump(dump):
+        if not _keep(title, abstract):
+            continue
+        count += 1
+        # title_key 用于查询词与词条名完全一致的匹配（小写、繁简转换后比较）
+        pages.append((count, title, normalize(title, t2s), url, abstract))
+        fts.append((count, " ".join(tokenize(title, t2s)), " ".join(tokenize(abstract, t2s))))
+        if len(pages) >= BATCH_SIZE:
+            flush()
+            if count % (BATCH_SIZE * 50) == 0:
+                logger.info(f"已导入 {count} 个词条（{time.time() - start:.0f}秒）")
+        if limit and count >= limit:
+            break
+    flush()
+
+    logger.info("优化全文索引...")
+    conn.execute("INSERT INTO pages_fts (pages_fts) VALUES ('optimize')")
+    conn.execute("CREATE VIRTUAL TABLE temp.pages_vocab USING fts5vocab(main, pages_fts, row)")
+    threshold = max(int(count * STOP_TOKEN_DOC_RATIO), STOP_TOKEN_MIN_DOCS)
+    conn.execute("INSERT INTO stop_tokens (token) SELECT term FROM temp.pages_vocab WHERE doc > ?", (threshold,))
+    stop_tokens = conn.execute("SELECT COUNT(*) FROM stop_tokens").fetchone()[0]
+    logger.info(f"常见词 {stop_tokens} 个（出现在超过{threshold}个词条中，查询时跳过）")
+    conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+        ("version", INDEX_VERSION),
+        ("source", os.path.basename(dump)),
+        ("built_at", datetime.datetime.now().isoformat(timespec="seconds")),
+        ("pages", str(count)),
+        ("t2s", "1" if t2s else "0"),
+        ("vectors", "0"),
+    ])
+    conn.commit()
+    conn.close()
+    return count
+
+
+async def build_vectors(output: str, batch_size: int):
+    """为所有词条生成摘要向量（词条名 + 摘要）"""
+    from app.services.embedding import embedding_service
+
+    conn = sqlite3.connect(output)
+    total = conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+    done = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, title, abstract FROM pages WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        embeddings = await embedding_service.get_embeddings_batch([f"{title}：{abstract}" for _, title, abstract in rows])
+        conn.executemany("UPDATE pages SET embedding = ? WHERE id = ?", [
+            (np.asarray(embedding, dtype=np.float32).tobytes(), page_id)
+            for (page_id, _, _), embedding in zip(rows, embeddings)
+        ])
+        conn.commit()
+        last_id = rows[-1][0]
+        done += len(rows)
+        if done % (batch_size * 100) < batch_size:
+            logger.info(f"已生成向量 {done}/{total}")
+    conn.execute("UPDATE meta SET value = '1' WHERE key = 'vectors'")
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建离线维基百科索引")
+    parser.add_argument("dump", help="维基百科摘要 dump（.xml / .xml.gz / .jsonl / .jsonl.gz）")
+    parser.add_argument("--output", default=settings.WIKI_INDEX_PATH, help="索引文件路径（默认 WIKI_INDEX_PATH）")
+    parser.add_argument("--limit", type=int, default=0, help="最多导入的词条数（0表示全部）")
+    parser.add_argument("--vectors", action="store_true", help="同时生成摘要向量（用于 WIKI_VECTOR_SEARCH）")
+    parser.add_argument("--batch-size", type=int, default=64, help="生成向量时每批的词条数")
+    parser.add_argument("--no-t2s", action="store_true", help="不进行繁简转换")
+    args = parser.parse_args()
+
+    t2s = not args.no_t2s
+    if t2s and not T2S_AVAILABLE:
+        logger.warning("未安装 opencc（pip install opencc-python-reimplemented），跳过繁简转换")
+        t2s = False
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(output.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+
+    start = time.time()
+    count = build_index(args.dump, str(tmp), args.limit, t2s)
+    logger.info(f"全文索引完成: {count} 个词条，耗时 {time.time() - start:.0f}秒")
+    if args.vectors:
+        asyncio.run(build_vectors(str(tmp), args.batch_size))
+        logger.info(f"向量生成完成，耗时 {time.time() - start:.0f}秒")
+
+    os.replace(tmp, output)
+    logger.info(f"✅ 离线维基百科索引已生成: {output}（{output.stat().st_size / 1024 / 1024:.1f}MB）")
+
+
+if __name__ == "__main__":
+    main()
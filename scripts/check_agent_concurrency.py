@@ -0,0 +1,102 @@
+"""验证通用Agent的并发执行 - 多个Agent对话应在同一事件循环中并发进行且不阻塞事件循环
+
+使用模拟LLM（每次推理异步等待固定时间）代替Ollama，不依赖外部服务：
+- 并发执行N个Agent对话，总耗时应接近单个对话的耗时，而不是N倍
+- 执行期间事件循环的最大调度延迟应保持在毫秒级
+
+任一项超出阈值时以退出码1结束，可直接在CI中运行（防止回退为阻塞的同步invoke）。
+
+用法：
+    python scripts/check_agent_concurrency.py
+    python scripts/check_agent_concurrency.py --conversations 20 --llm-latency 0.5
+    python scripts/check_agent_concurrency.py --max-total-factor 2 --max-lag-ms 50
+"""
+import argparse
+import asyncio
+import sys
+import time
+sys.path.insert(0, '.')
+
+from typing import Any, List, Optional
+from langchain_core.language_models.llms import LLM
+from app.services.agents.general_agent import GeneralAgent
+from loguru import logger
+
+
+class SlowFakeLLM(LLM):
+    """模拟LLM：第一步调用日期时间工具，第二步给出最终回答，每次推理耗时latency秒"""
+
+    latency: float = 0.3
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow_fake"
+
+    def _respond(self, prompt: str) -> str:
+        # 已拿到日期时间工具的结果
+        if "当前时间信息" in prompt:
+            return "Thought: 我现在可以回答了\nFinal Answer: 已查询到当前日期。"
+        return "Thought: 需要查询日期\nAction: 日期时间查询\nAction Input: 今天几号"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+        await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """测量事件循环的最大调度延迟（毫秒）"""
+    max_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, (time.perf_counter() - start - interval) * 1000)
+    return max_lag
+
+
+async def main(args) -> bool:
+    agent = GeneralAgent(llm=SlowFakeLLM(latency=args.llm_latency))
+    # 每个对话2次推理
+    single_ms = 2 * args.llm_latency * 1000
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(agent.chat(f"今天几号？#{i}") for i in range(args.conversations)))
+    total_ms = (time.perf_counter() - start) * 1000
+    stop.set()
+    max_lag_ms = await lag_task
+
+    succeeded = sum(r["answer_source"] == "general_agent" for r in results)
+    sequential_ms = single_ms * args.conversations
+    max_total_ms = single_ms * args.max_total_factor
+    logger.info(
+        f"{args.conversations}个Agent对话: 成功{succeeded}个, 总耗时={total_ms:.0f}ms "
+        f"(阈值{max_total_ms:.0f}ms, 串行约{sequential_ms:.0f}ms), "
+        f"事件循环最大延迟={max_lag_ms:.1f}ms (阈值{args.max_lag_ms:.0f}ms)"
+    )
+
+    failures = []
+    if succeeded != args.conversations:
+        failures.append(f"{args.conversations - succeeded}个对话失败")
+    if total_ms >= max_total_ms:
+        failures.append(f"总耗时{total_ms:.0f}ms超过{max_total_ms:.0f}ms（对话未并发执行）")
+    if max_lag_ms >= args.max_lag_ms:
+        failures.append(f"事件循环延迟{max_lag_ms:.1f}ms超过{args.max_lag_ms:.0f}ms（存在阻塞调用）")
+    if failures:
+        logger.error(f"❌ {'；'.join(failures)}")
+        return False
+    logger.info("✅ Agent对话并发执行，未阻塞事件循环")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="验证通用Agent的并发执行")
+    parser.add_argument("--conversations", type=int, default=10, help="并发对话数")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="模拟LLM每次推理耗时（秒）")
+    parser.add_argument("--max-lag-ms", type=float, default=100.0, help="允许的事件循环最大延迟（毫秒）")
+    parser.add_argument("--max-total-factor", type=float, default=3.0, help="允许的总耗时（单个对话耗时的倍数）")
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
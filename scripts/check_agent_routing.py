@@ -0,0 +1,115 @@
+"""验证Agent路由缓存 - 语义匹配或规则判断失败时的降级路由结果不应被缓存
+
+使用模拟的Embedding服务和Agent代替Ollama，不依赖外部服务：
+- 第一次路由时向量化失败，降级为默认Agent
+- 再次路由同一问题时向量化恢复，应按语义路由到专业Agent，而不是命中缓存的默认Agent
+- 规则判断（can_handle）失败一次后，同一问题也应重新判断
+- 判断都成功的路由结果正常缓存，不再重复向量化
+
+任一项不满足时以退出码1结束，可直接在CI中运行。
+
+用法：
+    python scripts/check_agent_routing.py
+"""
+import argparse
+import asyncio
+import sys
+sys.path.insert(0, '.')
+
+from typing import Dict, List, Optional
+from app.services.agents import manager as manager_module
+from app.services.agents import semantic_router as semantic_router_module
+from app.services.agents.base import BaseAgent
+from app.services.agents.manager import AgentManager
+from loguru import logger
+
+
+class FakeEmbeddingService:
+    """模拟Embedding服务：含"天气"的文本与其余文本的向量正交，前failures次单条向量化抛出异常"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        return [1.0, 0.0] if "天气" in text else [0.0, 1.0]
+
+    async def get_embedding(self, text: str) -> List[float]:
+        self.calls += 1
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("模拟Embedding服务不可用")
+        return self._embed(text)
+
+    async def get_embeddings_batch(self, texts: List[str], priority: str = "batch") -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+
+class FakeAgent(BaseAgent):
+    """模拟Agent：can_handle 按固定结果返回，前failures次抛出异常"""
+
+    def __init__(self, name: str, examples: Optional[List[str]] = None, rule: tuple = (False, 0.0), failures: int = 0):
+        super().__init__(name, f"{name}（模拟）")
+        self.examples = examples or []
+        self.rule = rule
+        self.failures = failures
+
+    async def can_handle(self, message: str) -> tuple[bool, float]:
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("模拟规则判断失败")
+        return self.rule
+
+    async def chat(self, message: str, chat_history: Optional[List[Dict]] = None, session_id: Optional[str] = None) -> Dict:
+        return {"answer": "", "answer_source": self.name, "confidence": 1.0, "tools_used": []}
+
+
+def use_embedding_service(service: FakeEmbeddingService):
+    manager_module.embedding_service = service
+    semantic_router_module.embedding_service = service
+
+
+async def main(args) -> bool:
+    failures = []
+
+    # 向量化失败一次
+    service = FakeEmbeddingService(failures=1)
+    use_embedding_service(service)
+    manager = AgentManager()
+    manager.register_agent(FakeAgent("天气助手", examples=["明天天气怎么样"]))
+    manager.register_agent(FakeAgent("通用助手"), is_default=True)
+    first = await manager.route("北京天气如何")
+    second = await manager.route("北京天气如何")
+    logger.info(f"向量化失败后: 第一次={first.name}, 第二次={second.name}")
+    if first.name != "通用助手":
+        failures.append(f"向量化失败时应降级为通用助手，实际为{first.name}")
+    if second.name != "天气助手":
+        failures.append(f"向量化恢复后应按语义路由到天气助手，实际为{second.name}（降级结果被缓存）")
+
+    # 判断都成功后应命中缓存
+    calls = service.calls
+    third = await manager.route("北京天气如何")
+    if third.name != "天气助手" or service.calls != calls:
+        failures.append("判断都成功的路由结果未被缓存")
+
+    # 规则判断失败一次
+    use_embedding_service(FakeEmbeddingService())
+    manager = AgentManager()
+    manager.register_agent(FakeAgent("计算助手", rule=(True, 0.9), failures=1))
+    manager.register_agent(FakeAgent("通用助手"), is_default=True)
+    first = await manager.route("帮我算一下")
+    second = await manager.route("帮我算一下")
+    logger.info(f"规则判断失败后: 第一次={first.name}, 第二次={second.name}")
+    if second.name != "计算助手":
+        failures.append(f"规则判断恢复后应路由到计算助手，实际为{second.name}（降级结果被缓存）")
+
+    if failures:
+        logger.error(f"❌ {'；'.join(failures)}")
+        return False
+    logger.info("✅ 降级路由结果未被缓存，恢复后重新判断")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="验证Agent路由缓存")
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -0,0 +1,111 @@
+"""验证天气数据的两级缓存 - 进程内缓存不应比Redis缓存保留得更久
+
+使用内存模拟的Redis代替真实Redis，不请求和风天气API：
+- Redis中预置一条剩余有效期很短的天气数据
+- 读取后进程内缓存的过期时间不应晚于Redis键的过期时间
+- Redis中没有设置过期时间的数据，进程内缓存使用接口配置的缓存时间
+
+任一项不满足时以退出码1结束，可直接在CI中运行。
+
+用法：
+    python scripts/check_weather_cache.py
+    python scripts/check_weather_cache.py --remaining 5
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+sys.path.insert(0, '.')
+
+from typing import Dict, Optional, Tuple
+from app.services.tools import weather_tool
+from app.services.tools.weather_tool import WeatherTool
+from loguru import logger
+
+
+class FakeRedis:
+    """模拟Redis：只实现天气缓存用到的命令"""
+
+    def __init__(self):
+        # 键 → (值, 过期时间；None表示不过期)
+        self.data: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    def put(self, key: str, value: str, ttl: Optional[float] = None):
+        self.data[key] = (value, time.time() + ttl if ttl is not None else None)
+
+    def expires_at(self, key: str) -> Optional[float]:
+        return self.data[key][1]
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.data.get(key, (None, None))[0]
+
+    async def set(self, key: str, value: str, ex: Optional[int] = None):
+        self.put(key, value, ex)
+
+    async def pttl(self, key: str) -> int:
+        if key not in self.data:
+            return -2
+        expires_at = self.data[key][1]
+        return -1 if expires_at is None else int((expires_at - time.time()) * 1000)
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    def get(self, key: str):
+        self.commands.append(self.redis.get(key))
+
+    def pttl(self, key: str):
+        self.commands.append(self.redis.pttl(key))
+
+    async def execute(self):
+        return [await command for command in self.commands]
+
+
+async def main(args) -> bool:
+    redis = FakeRedis()
+    weather_tool.get_redis = lambda: redis
+    tool = WeatherTool(api_key="check")
+    payload = json.dumps({"code": "200", "now": {"temp": "20", "text": "晴"}, "updateTime": ""})
+    failures = []
+
+    # Redis中的数据即将过期
+    key = f"{tool.DATA_CACHE_PREFIX}now:101010100"
+    redis.put(key, payload, ttl=args.remaining)
+    await tool._get_data("now", "101010100")
+    local_expires_at = tool._data_cache[("now", "101010100")][0]
+    redis_expires_at = redis.expires_at(key)
+    logger.info(
+        f"即将过期的Redis数据: 进程内缓存剩余{local_expires_at - time.time():.1f}秒, "
+        f"Redis剩余{redis_expires_at - time.time():.1f}秒 (接口缓存时间{tool.cache_ttls['now']}秒)"
+    )
+    if local_expires_at > redis_expires_at:
+        failures.append(f"进程内缓存比Redis晚{local_expires_at - redis_expires_at:.1f}秒过期")
+
+    # Redis中的数据没有过期时间
+    key = f"{tool.DATA_CACHE_PREFIX}3d:101010100"
+    redis.put(key, payload)
+    before = time.time()
+    await tool._get_data("3d", "101010100")
+    local_ttl = tool._data_cache[("3d", "101010100")][0] - before
+    logger.info(f"未设置过期时间的Redis数据: 进程内缓存{local_ttl:.1f}秒 (接口缓存时间{tool.cache_ttls['3d']}秒)")
+    if not 0 < local_ttl <= tool.cache_ttls["3d"] + 1:
+        failures.append(f"未设置过期时间的数据进程内缓存{local_ttl:.1f}秒，应为{tool.cache_ttls['3d']}秒")
+
+    if failures:
+        logger.error(f"❌ {'；'.join(failures)}")
+        return False
+    logger.info("✅ 进程内缓存与Redis缓存同时过期")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="验证天气数据的两级缓存")
+    parser.add_argument("--remaining", type=float, default=2.0, help="预置的Redis数据剩余有效期（秒）")
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -27,6 +27,12 @@ CREATE INDEX IF NOT EXISTS idx_kb_created_at ON knowledge_base(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_kb_milvus_id ON knowledge_base(milvus_id);
 CREATE INDEX IF NOT EXISTS idx_kb_question_gin ON knowledge_base USING gin(question gin_trgm_ops);
 
+-- 预生成的润色答案（由 scripts/pregenerate_answers.py 生成，问题/答案变更后哈希不一致即失效）
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS polished_answer TEXT;
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS polished_hash VARCHAR(64);
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS polished_version INTEGER DEFAULT 0;
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS polished_at TIMESTAMP;
+
 -- 对话历史表
 CREATE TABLE IF NOT EXISTS conversation_history (
     id SERIAL PRIMARY KEY,
@@ -42,11 +48,15 @@ CREATE TABLE IF NOT EXISTS conversation_history (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Agent 执行记录（每步 LLM/工具调用耗时，已有库升级时补充该列）
+ALTER TABLE conversation_history ADD COLUMN IF NOT EXISTS agent_trace JSONB;
+
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_ch_session_id ON conversation_history(session_id);
 CREATE INDEX IF NOT EXISTS idx_ch_user_id ON conversation_history(user_id);
 CREATE INDEX IF NOT EXISTS idx_ch_created_at ON conversation_history(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_ch_intent ON conversation_history(intent);
+CREATE INDEX IF NOT EXISTS idx_ch_intent_pending ON conversation_history(id) WHERE intent IS NULL;  -- 待后台标注意图的对话
 CREATE INDEX IF NOT EXISTS idx_ch_feedback ON conversation_history(feedback);
 
 -- 用户反馈表
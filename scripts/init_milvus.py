@@ -34,7 +34,7 @@ async def init_milvus_data():
             
             try:
                 # 生成向量
-                embedding = await embedding_service.get_embedding(knowledge_question)
+                embedding = await embedding_service.get_embedding(knowledge_question, priority="background")
                 
                 # 存储到Milvus
                 milvus_id = await milvus_service.insert(knowledge_id, embedding)
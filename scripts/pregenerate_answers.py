@@ -0,0 +1,86 @@
+"""预生成知识库润色答案 - 为已发布的知识生成可直接返回给用户的答案
+
+问题或答案变更后内容哈希不一致，下次运行时重新生成（版本号加1）；
+问答时最佳匹配置信度达到 PREGENERATED_ANSWER_MIN_SCORE 的请求直接返回润色答案，不调用LLM。
+
+用法：
+    python scripts/pregenerate_answers.py                  # 生成缺失或已过期的润色答案
+    python scripts/pregenerate_answers.py --force          # 全部重新生成
+    python scripts/pregenerate_answers.py --category 售后 --limit 100
+"""
+import argparse
+import asyncio
+import sys
+sys.path.insert(0, '.')
+
+from sqlalchemy import select, func
+from app.core.database import AsyncSessionLocal
+from app.models import Knowledge
+from app.services.llm import llm_service
+from loguru import logger
+
+# 同时进行的生成数（实际并发还受调度器background类别限制）
+CONCURRENCY = 4
+
+
+async def load_pending(category: str, limit: int, force: bool) -> list[Knowledge]:
+    """加载需要生成润色答案的已发布知识"""
+    async with AsyncSessionLocal() as db:
+        query = select(Knowledge).where(Knowledge.status == 1).order_by(Knowledge.id)
+        if category:
+            query = query.where(Knowledge.category == category)
+        result = await db.execute(query)
+        knowledge_list = result.scalars().all()
+    if not force:
+        knowledge_list = [k for k in knowledge_list if k.current_polished_answer() is None]
+    return knowledge_list[:limit] if limit else knowledge_list
+
+
+async def polish(knowledge: Knowledge, semaphore: asyncio.Semaphore) -> bool:
+    """生成并保存单条知识的润色答案"""
+    async with semaphore:
+        content_hash = knowledge.content_hash()
+        try:
+            polished = await llm_service.polish_answer(knowledge.question, knowledge.answer)
+        except Exception as e:
+            logger.error(f"生成失败: id={knowledge.id}, {e}")
+            return False
+        if not polished:
+            logger.warning(f"生成结果为空: id={knowledge.id}")
+            return False
+
+        async with AsyncSessionLocal() as db:
+            db_knowledge = await db.get(Knowledge, knowledge.id)
+            if db_knowledge is None or db_knowledge.content_hash() != content_hash:
+                # 生成期间知识被修改或删除，丢弃本次结果，下次运行重新生成
+                logger.warning(f"生成期间知识已变更，跳过: id={knowledge.id}")
+                return False
+            db_knowledge.polished_answer = polished
+            db_knowledge.polished_hash = content_hash
+            db_knowledge.polished_version = (db_knowledge.polished_version or 0) + 1
+            db_knowledge.polished_at = func.now()
+            # 润色答案不属于知识内容变更，保持更新时间不变
+            db_knowledge.updated_at = Knowledge.updated_at
+            await db.commit()
+            version = db_knowledge.polished_version
+        logger.info(f"已生成: id={knowledge.id}, 版本={version}")
+        return True
+
+
+async def main(args):
+    knowledge_list = await load_pending(args.category, args.limit, args.force)
+    logger.info(f"待生成润色答案 {len(knowledge_list)} 条")
+    if not knowledge_list:
+        return
+
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    results = await asyncio.gather(*(polish(k, semaphore) for k in knowledge_list))
+    logger.info(f"完成: 成功 {sum(results)} 条，失败/跳过 {len(results) - sum(results)} 条")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="预生成知识库润色答案")
+    parser.add_argument("--category", default=None, help="只处理指定分类")
+    parser.add_argument("--limit", type=int, default=0, help="最多处理的条数（0为不限）")
+    parser.add_argument("--force", action="store_true", help="忽略已有结果，全部重新生成")
+    asyncio.run(main(parser.parse_args()))
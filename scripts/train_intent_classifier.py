@@ -0,0 +1,170 @@
+"""训练/评估本地意图分类器 - 使用conversation_history中已标注意图的问题
+
+用法：
+    python scripts/train_intent_classifier.py                 # 训练并评估，保存模型
+    python scripts/train_intent_classifier.py --eval-only     # 仅评估已有模型
+    python scripts/train_intent_classifier.py --test-ratio 0.3 --limit 20000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+sys.path.insert(0, '.')
+
+import numpy as np
+from sqlalchemy import select, func
+from app.core.config import get_settings
+from app.core.database import AsyncSessionLocal
+from app.models import Conversation
+from app.services.embedding import embedding_service
+from app.services.intent import CentroidIntentClassifier
+from app.services.llm import INTENT_LABELS
+from loguru import logger
+
+settings = get_settings()
+
+# 每批向量化的问题数
+EMBED_BATCH_SIZE = 64
+
+
+async def load_samples(limit: int) -> tuple[list[str], list[str]]:
+    """加载已标注意图的问题（按问题去重，取最近一次标注）"""
+    async with AsyncSessionLocal() as db:
+        latest = (
+            select(
+                Conversation.user_message,
+                Conversation.intent,
+                func.row_number().over(
+                    partition_by=Conversation.user_message,
+                    order_by=Conversation.created_at.desc()
+                ).label("rn")
+            )
+            .where(Conversation.intent.in_(INTENT_LABELS))
+            .subquery()
+        )
+        result = await db.execute(
+            select(latest.c.user_message, latest.c.intent)
+            .where(latest.c.rn == 1)
+            .limit(limit)
+        )
+        rows = result.all()
+    return [r[0] for r in rows], [r[1] for r in rows]
+
+
+async def embed_all(texts: list[str]) -> np.ndarray:
+    """批量向量化"""
+    vectors = []
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        vectors.extend(await embedding_service.get_embeddings_batch(texts[i:i + EMBED_BATCH_SIZE]))
+        logger.info(f"向量化进度: {min(i + EMBED_BATCH_SIZE, len(texts))}/{len(texts)}")
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def stratified_split(labels: list[str], test_ratio: float, seed: int) -> tuple[list[int], list[int]]:
+    """按类别分层划分训练集/测试集"""
+    rng = random.Random(seed)
+    by_label: dict[str, list[int]] = {}
+    for i, label in enumerate(labels):
+        by_label.setdefault(label, []).append(i)
+    train, test = [], []
+    for indices in by_label.values():
+        rng.shuffle(indices)
+        n_test = int(len(indices) * test_ratio) if len(indices) > 1 else 0
+        test.extend(indices[:n_test])
+        train.extend(indices[n_test:])
+    return train, test
+
+
+def evaluate(classifier: CentroidIntentClassifier, embeddings: np.ndarray, labels: list[str], threshold: float):
+    """输出准确率、各类别精确率/召回率，以及阈值下的本地覆盖率"""
+    if len(labels) == 0:
+        logger.warning("测试集为空，跳过评估")
+        return
+
+    start = time.perf_counter()
+    proba = classifier.predict_proba(embeddings)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    predicted = [classifier.labels[i] for i in proba.argmax(axis=1)]
+    confidence = proba.max(axis=1)
+
+    correct = sum(p == t for p, t in zip(predicted, labels))
+    logger.info(f"样本数={len(labels)}, 准确率={correct / len(labels):.2%}, 平均耗时={elapsed_ms / len(labels):.4f}ms/条")
+
+    for label in classifier.labels:
+        tp = sum(p == label and t == label for p, t in zip(predicted, labels))
+        n_pred = sum(p == label for p in predicted)
+        n_true = sum(t == label for t in labels)
+        precision = tp / n_pred if n_pred else 0.0
+        recall = tp / n_true if n_true else 0.0
+        logger.info(f"  {label}: 精确率={precision:.2%}, 召回率={recall:.2%}, 样本={n_true}")
+
+    covered = confidence >= threshold
+    n_covered = int(covered.sum())
+    if n_covered:
+        covered_correct = sum(
+            p == t for p, t, c in zip(predicted, labels, covered) if c
+        )
+        logger.info(
+            f"阈值={threshold}: 本地处理{n_covered / len(labels):.2%}的请求，"
+            f"其中准确率={covered_correct / n_covered:.2%}，其余回退到LLM"
+        )
+    else:
+        logger.info(f"阈值={threshold}: 没有请求达到本地处理置信度，全部回退到LLM")
+
+
+async def main(args):
+    texts, labels = await load_samples(args.limit)
+    logger.info(f"加载已标注样本 {len(texts)} 条")
+    if not texts:
+        logger.error("没有可用的已标注样本")
+        return
+
+    embeddings = await embed_all(texts)
+
+    if args.eval_only:
+        classifier = CentroidIntentClassifier.load(args.output)
+        evaluate(classifier, embeddings, labels, args.threshold)
+        return
+
+    train_idx, test_idx = stratified_split(labels, args.test_ratio, args.seed)
+    train_labels = [labels[i] for i in train_idx]
+    missing = [
+        label for label in set(train_labels)
+        if train_labels.count(label) < args.min_per_class
+    ]
+    if missing:
+        logger.warning(f"以下类别样本不足{args.min_per_class}条，不参与训练: {missing}")
+        keep = [i for i in train_idx if labels[i] not in missing]
+        train_idx = keep
+        test_idx = [i for i in test_idx if labels[i] not in missing]
+
+    classifier = CentroidIntentClassifier.fit(
+        embeddings[train_idx], [labels[i] for i in train_idx], temperature=args.temperature
+    )
+    logger.info(f"训练完成: 类别样本数={classifier.meta['samples']}")
+
+    evaluate(classifier, embeddings[test_idx], [labels[i] for i in test_idx], args.threshold)
+
+    # 评估后使用全部样本重新训练并保存
+    final = CentroidIntentClassifier.fit(
+        embeddings[train_idx + test_idx],
+        [labels[i] for i in train_idx + test_idx],
+        temperature=args.temperature
+    )
+    final.meta["trained_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    final.save(args.output)
+    logger.info(f"模型已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="训练/评估本地意图分类器")
+    parser.add_argument("--output", default=settings.INTENT_MODEL_PATH, help="模型文件路径")
+    parser.add_argument("--limit", type=int, default=50000, help="最多加载的样本数")
+    parser.add_argument("--test-ratio", type=float, default=0.2, help="测试集比例")
+    parser.add_argument("--min-per-class", type=int, default=5, help="每个类别最少训练样本数")
+    parser.add_argument("--temperature", type=float, default=CentroidIntentClassifier.DEFAULT_TEMPERATURE, help="softmax温度")
+    parser.add_argument("--threshold", type=float, default=settings.INTENT_CONFIDENCE_THRESHOLD, help="评估使用的置信度阈值")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--eval-only", action="store_true", help="仅评估已有模型")
+    asyncio.run(main(parser.parse_args()))